@@ -0,0 +1,64 @@
+"""Benchmark the construction of projection masks and projections."""
+import pytest
+import torch  # type: ignore
+
+from leabra7 import layer as lr
+from leabra7 import net
+from leabra7 import projn as pr
+from leabra7 import rand
+from leabra7 import specs as sp
+
+MASK_SIZES = (100, 1000, 10000)
+PROJN_SIZES = (100, 1000, 3000)
+
+
+@pytest.mark.parametrize("size", MASK_SIZES)
+def test_tile_mask(benchmark, size) -> None:
+    benchmark(pr.tile_mask, size, (True, False, True))
+
+
+@pytest.mark.parametrize("size", MASK_SIZES)
+def test_expand_layer_mask_full(benchmark, size) -> None:
+    mask = pr.tile_mask(size, (True, ))
+    benchmark(pr.expand_layer_mask_full, mask, mask)
+
+
+@pytest.mark.parametrize("size", MASK_SIZES)
+def test_expand_layer_mask_one_to_one(benchmark, size) -> None:
+    mask = pr.tile_mask(size, (True, False))
+    benchmark(pr.expand_layer_mask_one_to_one, mask, mask)
+
+
+@pytest.mark.parametrize("size", MASK_SIZES)
+@pytest.mark.parametrize("sparsity", (0.1, 0.5))
+def test_sparsify(benchmark, size, sparsity) -> None:
+    mask = torch.ones(size, 100, dtype=torch.bool)
+    benchmark(pr.sparsify, sparsity, mask)
+
+
+@pytest.mark.parametrize("size", PROJN_SIZES)
+@pytest.mark.parametrize("projn_type", ("full", "one_to_one"))
+def test_projn_construction(benchmark, size, projn_type) -> None:
+    pre = lr.Layer("lr1", size=size)
+    post = lr.Layer("lr2", size=size)
+    spec = sp.ProjnSpec(projn_type=projn_type, sparsity=0.5)
+    benchmark(pr.Projn, "proj", pre, post, spec)
+
+
+@pytest.mark.parametrize("size", PROJN_SIZES)
+@pytest.mark.parametrize("num_threads", (1, 4))
+def test_fill_masked(benchmark, size, num_threads) -> None:
+    wts = torch.Tensor(size, size)
+    mask = torch.rand(size, size) > 0.5
+    benchmark(pr.fill_masked, wts, mask, rand.Uniform(0.25, 0.75), 2**16,
+              num_threads)
+
+
+@pytest.mark.parametrize("size", PROJN_SIZES)
+@pytest.mark.parametrize("sparsity", (0.1, 0.5, 1.0))
+def test_net_new_projn(benchmark, size, sparsity) -> None:
+    n = net.Net(seed=0)
+    n.new_layer("lr1", size)
+    n.new_layer("lr2", size)
+    spec = sp.ProjnSpec(sparsity=sparsity)
+    benchmark(n.new_projn, "proj", "lr1", "lr2", spec)
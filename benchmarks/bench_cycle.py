@@ -0,0 +1,57 @@
+"""Benchmark network cycles and trials."""
+import numpy as np  # type: ignore
+import pytest
+
+from conftest import build_net
+
+SIZES = (10, 100, 1000)
+INHIBITION_TYPES = ("fffb", "kwta", "kwta_avg", "none")
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("inhibition_type", INHIBITION_TYPES)
+def test_net_cycle(benchmark, size, inhibition_type) -> None:
+    n = build_net(size, inhibition_type=inhibition_type)
+    benchmark(n.cycle)
+
+
+@pytest.mark.parametrize("size", SIZES + (10000, ))
+def test_net_clamp_layer(benchmark, size) -> None:
+    n = build_net(size)
+    acts = np.random.rand(size).astype(np.float32)
+    benchmark(n.clamp_layer, "input", acts)
+
+
+@pytest.mark.parametrize("size", SIZES + (10000, ))
+def test_net_clamp_pattern(benchmark, size) -> None:
+    n = build_net(size)
+    n.register_pattern("input", "a", np.random.rand(size))
+    benchmark(n.clamp_pattern, "input", "a")
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_net_trial(benchmark, size) -> None:
+    n = build_net(size)
+
+    def trial() -> None:
+        n.minus_phase_cycle(num_cycles=50)
+        n.clamp_layer("output", [0, 1])
+        n.plus_phase_cycle(num_cycles=25)
+        n.unclamp_layer("output")
+        n.learn()
+
+    benchmark.pedantic(trial, rounds=5, iterations=1)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_net_run_epoch(benchmark, size) -> None:
+    n = build_net(size)
+    patterns = np.random.rand(10, 2 * size) > 0.5
+
+    def epoch() -> None:
+        n.run_epoch(
+            patterns,
+            input_map={"input": slice(0, size)},
+            target_map={"output": slice(size, 2 * size)})
+
+    benchmark.pedantic(epoch, rounds=3, iterations=1)
@@ -0,0 +1,20 @@
+"""Benchmark the time it takes to import leabra7 in a fresh interpreter."""
+import subprocess
+import sys
+
+
+def import_in_subprocess(module: str) -> None:
+    """Imports a module in a fresh Python interpreter."""
+    subprocess.run(
+        [sys.executable, "-c", "import {0}".format(module)], check=True)
+
+
+def test_import_leabra7(benchmark) -> None:
+    benchmark.pedantic(
+        import_in_subprocess, args=("leabra7", ), rounds=5, iterations=1)
+
+
+def test_import_torch_baseline(benchmark) -> None:
+    # leabra7 cannot import faster than torch, so this is the floor
+    benchmark.pedantic(
+        import_in_subprocess, args=("torch", ), rounds=5, iterations=1)
@@ -0,0 +1,75 @@
+"""Benchmark logger records and log retrieval."""
+import pytest
+
+from leabra7 import log
+from leabra7 import net
+
+from conftest import build_net
+
+SIZES = (10, 100, 1000)
+LAYER_LOG_CONFIGS = {
+    "whole": ("avg_act", "fbi"),
+    "one_part": ("unit_act", ),
+    "all_parts": ("unit_act", "unit_net", "unit_v_m", "unit_adapt"),
+}
+
+
+def find_logger(n: net.Net, name: str) -> log.Logger:
+    """Returns the cycle logger for an object."""
+    return next(i for i in n.loggers
+                if i.target_name == name and i.freq.name == "cycle")
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("config", sorted(LAYER_LOG_CONFIGS))
+def test_layer_logger_record(benchmark, size, config) -> None:
+    n = build_net(size, layer_log_on_cycle=LAYER_LOG_CONFIGS[config])
+    n.cycle()
+    benchmark(find_logger(n, "hidden").record)
+
+
+@pytest.mark.parametrize("size", (10, 100))
+def test_projn_logger_record(benchmark, size) -> None:
+    n = build_net(size, projn_log_on_cycle=("conn_wt", ))
+    n.cycle()
+    benchmark(find_logger(n, "input_to_hidden").record)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("async_logging", (False, True))
+def test_net_cycle_with_logging(benchmark, size, async_logging) -> None:
+    n = build_net(
+        size,
+        layer_log_on_cycle=LAYER_LOG_CONFIGS["all_parts"],
+        async_logging=async_logging)
+    n.cycle()
+    benchmark(n.cycle)
+    n.flush_logs()
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_net_logs(benchmark, size) -> None:
+    n = build_net(size, layer_log_on_cycle=("avg_act", "unit_act"))
+    for _ in range(100):
+        n.cycle()
+    benchmark(n.logs, "cycle", "hidden")
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_net_query_logs(benchmark, size) -> None:
+    n = build_net(size, layer_log_on_cycle=("avg_act", "unit_act"))
+    for _ in range(100):
+        n.cycle()
+    benchmark(n.query_logs, "cycle", "hidden", ["unit_act"], (90, 100))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_net_observe(benchmark, size) -> None:
+    n = build_net(size)
+    benchmark(n.observe, "hidden", "unit_act")
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_net_observe_array(benchmark, size) -> None:
+    n = build_net(size)
+    benchmark(n.observe_array, "hidden", "unit_act")
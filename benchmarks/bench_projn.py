@@ -0,0 +1,26 @@
+"""Benchmark projection flushes and learning."""
+import pytest
+
+from conftest import build_net
+
+# With very small sparse projections some units receive no connections, and
+# their net input scaling is undefined, so we start at 100 units
+SIZES = (100, 1000)
+SPARSITIES = (0.1, 0.5, 1.0)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("sparsity", SPARSITIES)
+def test_projn_flush(benchmark, size, sparsity) -> None:
+    n = build_net(size, sparsity=sparsity)
+    n.cycle()
+    benchmark(n.projns["input_to_hidden"].flush)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("sparsity", SPARSITIES)
+def test_projn_learn(benchmark, size, sparsity) -> None:
+    n = build_net(size, sparsity=sparsity)
+    n.minus_phase_cycle(num_cycles=5)
+    n.plus_phase_cycle(num_cycles=5)
+    benchmark(n.projns["input_to_hidden"].learn)
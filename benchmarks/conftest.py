@@ -0,0 +1,40 @@
+"""Shared helpers for the leabra7 benchmarks."""
+from typing import Iterable
+
+from leabra7 import net
+from leabra7 import specs as sp
+
+
+def build_net(size: int,
+              sparsity: float = 1.0,
+              inhibition_type: str = "fffb",
+              layer_log_on_cycle: Iterable[str] = (),
+              projn_log_on_cycle: Iterable[str] = (),
+              async_logging: bool = False) -> net.Net:
+    """Builds a three-layer network with an input and an output layer.
+
+    Args:
+        size: The number of units in each layer.
+        sparsity: The sparsity of each projection.
+        inhibition_type: The inhibition type of each layer.
+        layer_log_on_cycle: The attrs to log every cycle on each layer.
+        projn_log_on_cycle: The attrs to log every cycle on each projection.
+        async_logging: Whether to write log records on a background thread.
+
+    Returns:
+        A seeded network with layers "input", "hidden" and "output", and
+        projections "input_to_hidden" and "hidden_to_output". The input layer
+        is clamped.
+
+    """
+    n = net.Net(seed=0, async_logging=async_logging)
+    layer_spec = sp.LayerSpec(
+        inhibition_type=inhibition_type, log_on_cycle=layer_log_on_cycle)
+    projn_spec = sp.ProjnSpec(
+        sparsity=sparsity, log_on_cycle=projn_log_on_cycle)
+    for name in ("input", "hidden", "output"):
+        n.new_layer(name, size, layer_spec)
+    n.new_projn("input_to_hidden", "input", "hidden", projn_spec)
+    n.new_projn("hidden_to_output", "hidden", "output", projn_spec)
+    n.clamp_layer("input", [1, 0])
+    return n
@@ -1,6 +1,7 @@
 """Implements the LEABRA algorithm, v7.0"""
 
 from leabra7.net import Net
+from leabra7.specs import EpochSpec
 from leabra7.specs import LayerSpec
 from leabra7.specs import ProjnSpec
 from leabra7.specs import UnitSpec
@@ -0,0 +1,431 @@
+"""Buffers, background writer and clock used by loggers."""
+import bisect
+import collections
+import queue
+import threading
+import weakref
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+import numpy as np  # type: ignore
+import torch  # type: ignore
+
+from leabra7 import events
+
+# Pandas is slow to import, and it is only needed once logs are requested, so
+# every function in this module imports it locally
+if TYPE_CHECKING:
+    import pandas as pd  # type: ignore
+
+
+def time_slice(times: Sequence[int], start: Optional[int],
+               stop: Optional[int]) -> Tuple[int, int]:
+    """Finds the records within a time range.
+
+    Args:
+      times: The sorted times of the records.
+      start: The first time in the range, or `None` for no lower bound.
+      stop: The time after the end of the range, or `None` for no upper
+        bound.
+
+    Returns:
+      The indices of the first record in the range, and of the first record
+      after it.
+
+    """
+    lo = 0 if start is None else bisect.bisect_left(times, start)
+    hi = len(times) if stop is None else bisect.bisect_left(times, stop)
+    return lo, max(lo, hi)
+
+
+class DeltaFrameBuffer:
+    """A buffer of dataframe records that stores most records as deltas.
+
+    Every `keyframe_interval` records, the full record is stored (a
+    keyframe). In between, only the rows with a value that changed by more
+    than `tol` since it was last stored are kept. Records are reconstructed
+    when the buffer is converted to a dataframe, so each reconstructed value
+    is within `tol` of the recorded one (and exact if `tol` is zero). Within
+    a delta, only the columns that changed are stored.
+
+    This suits records with the same rows in the same order every time, like
+    the weights of a projection, most of which barely change between records.
+
+    Args:
+      keyframe_interval: The number of records between keyframes.
+      tol: The largest change in a value that is not stored.
+
+    """
+
+    def __init__(self, keyframe_interval: int, tol: float) -> None:
+        self.time = 0
+        self.keyframe_interval = keyframe_interval
+        self.tol = tol
+        # Tuples of (time, positions, rows). Keyframes have no positions.
+        self.buffer: List[Tuple[int, Optional[np.ndarray],
+                                "pd.DataFrame"]] = []
+        # The time of each buffered record, and the indices of the keyframes
+        self.times: List[int] = []
+        self._keyframes: List[int] = []
+        # The values of the last keyframe, updated with each stored delta
+        self._reference: Optional[np.ndarray] = None
+        self._columns: List[str] = []
+        self._since_keyframe = 0
+
+    def append(self, record: "pd.DataFrame") -> None:
+        """Appends a record to the buffer.
+
+        Args:
+            record: A dataframe containing some rows in the output log,
+                for a single time step.
+
+        """
+        values = record.to_numpy(dtype=np.float64)
+        if (self._reference is None
+                or self._since_keyframe >= self.keyframe_interval
+                or list(record.columns) != self._columns
+                or values.shape != self._reference.shape):
+            self._keyframes.append(len(self.buffer))
+            self.buffer.append((self.time, None, record.copy()))
+            # to_numpy() can return a view of the record, which must not be
+            # modified
+            self._reference = values.copy()
+            self._columns = list(record.columns)
+            self._since_keyframe = 1
+        else:
+            changed = ((np.abs(values - self._reference) > self.tol) |
+                       (np.isnan(values) != np.isnan(self._reference)))
+            positions = np.flatnonzero(changed.any(axis=1))
+            # Only the columns that changed are stored (e.g. not the indices)
+            columns = np.flatnonzero(changed.any(axis=0))
+            self.buffer.append((self.time, positions,
+                                record.iloc[positions, columns].copy()))
+            stored = np.ix_(positions, columns)
+            self._reference[stored] = values[stored]
+            self._since_keyframe += 1
+        self.times.append(self.time)
+        self.time += 1
+
+    def increment_time(self) -> None:
+        """Increments the time counter."""
+        self.time += 1
+
+    def nbytes(self) -> int:
+        """Returns the number of bytes held by the buffered records."""
+        total = 0
+        for _, positions, rows in self.buffer:
+            total += int(rows.memory_usage(index=True, deep=True).sum())
+            if positions is not None:
+                total += positions.nbytes
+        return total
+
+    def to_df(self, start: Optional[int] = None,
+              stop: Optional[int] = None) -> "pd.DataFrame":
+        """Returns a DataFrame containing the reconstructed records.
+
+        Only the records from the last keyframe before the time range are
+        reconstructed.
+
+        Args:
+          start: If given, records before this time are left out.
+          stop: If given, records at or after this time are left out.
+
+        """
+        import pandas as pd  # type: ignore
+        lo, hi = time_slice(self.times, start, stop)
+        if lo == hi:
+            return pd.DataFrame()
+        first = self._keyframes[bisect.bisect_right(self._keyframes, lo) - 1]
+        frames = []
+        current: Dict[str, np.ndarray] = {}
+        for i in range(first, hi):
+            time, positions, rows = self.buffer[i]
+            if positions is None:
+                current = {c: rows[c].to_numpy().copy() for c in rows}
+            else:
+                if i > lo:
+                    # Copy, since the previous frame shares the arrays
+                    current = {c: v.copy() for c, v in current.items()}
+                for c in rows:
+                    current[c][positions] = rows[c].to_numpy()
+            if i < lo:
+                continue
+            frame = pd.DataFrame(current)
+            frame["time"] = time
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+
+class RingFrameBuffer:
+    """A fixed-capacity buffer that keeps only the most recent records.
+
+    The storage is allocated on the first record and then overwritten in
+    place, so memory use stays constant however many records are appended.
+    Every record must have the same columns and number of rows.
+
+    Args:
+      capacity: The number of records to keep.
+
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.time = 0
+        self.capacity = capacity
+        # One array per column, with a row for each slot in the ring
+        self._data: Dict[str, np.ndarray] = {}
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._num_rows = 0
+        # The slot to overwrite next, and the number of filled slots
+        self._next = 0
+        self._size = 0
+
+    def append(self, record: "pd.DataFrame") -> None:
+        """Appends a record, overwriting the oldest one if the buffer is full.
+
+        Args:
+            record: A dataframe containing some rows in the output log,
+                for a single time step.
+
+        Raises:
+            ValueError: If the record does not have the same columns and
+                number of rows as the first record.
+
+        """
+        if self._size == 0:
+            self._num_rows = len(record)
+            self._data = {
+                c: np.empty((self.capacity, self._num_rows),
+                            dtype=record[c].dtype)
+                for c in record.columns
+            }
+        elif (len(record) != self._num_rows
+              or list(record.columns) != list(self._data)):
+            raise ValueError("Every record in a ring buffer must have the "
+                             "same columns and number of rows.")
+        for c, column in self._data.items():
+            column[self._next] = record[c].to_numpy()
+        self._times[self._next] = self.time
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.time += 1
+
+    def increment_time(self) -> None:
+        """Increments the time counter."""
+        self.time += 1
+
+    def oldest_time(self) -> int:
+        """Returns the time of the oldest kept record.
+
+        If the buffer is empty, this is the time of the next record.
+
+        """
+        if self._size == 0:
+            return self.time
+        return int(self._times[(self._next - self._size) % self.capacity])
+
+    def nbytes(self) -> int:
+        """Returns the number of bytes held by the buffer."""
+        return self._times.nbytes + sum(
+            column.nbytes for column in self._data.values())
+
+    def to_df(self, start: Optional[int] = None,
+              stop: Optional[int] = None) -> "pd.DataFrame":
+        """Returns a DataFrame containing the kept records, oldest first.
+
+        Args:
+          start: If given, records before this time are left out.
+          stop: If given, records at or after this time are left out.
+
+        """
+        import pandas as pd  # type: ignore
+        slots = (self._next - self._size + np.arange(self._size)) % (
+            self.capacity)
+        if start is not None:
+            slots = slots[self._times[slots] >= start]
+        if stop is not None:
+            slots = slots[self._times[slots] < stop]
+        data = {c: column[slots].reshape(-1)
+                for c, column in self._data.items()}
+        data["time"] = np.repeat(self._times[slots], self._num_rows)
+        return pd.DataFrame(data)
+
+
+class SnapshotPool:
+    """A pool of tensors to copy snapshots into, reused once written.
+
+    Taking a snapshot then rarely needs to allocate: after the first few
+    records, each copy lands in a tensor released by an earlier record.
+
+    """
+
+    def __init__(self) -> None:
+        self._free: Dict[Tuple[Any, Any],
+                         collections.deque] = collections.defaultdict(
+                             collections.deque)
+
+    def copy(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Copies a tensor into a pooled tensor of the same shape and type."""
+        free = self._free[(tensor.shape, tensor.dtype)]
+        try:
+            pooled = free.pop()
+        except IndexError:
+            return tensor.clone()
+        return pooled.copy_(tensor)
+
+    def release(self, tensor: torch.Tensor) -> None:
+        """Returns a tensor obtained from `copy()` to the pool."""
+        self._free[(tensor.shape, tensor.dtype)].append(tensor)
+
+    def nbytes(self) -> int:
+        """Returns the number of bytes held by the free tensors."""
+        return sum(t.numel() * t.element_size()
+                   for free in self._free.values() for t in free)
+
+
+class LogWriter:
+    """Writes logger records on a background thread.
+
+    Tasks run in the order they were submitted. If the worker falls behind by
+    more than `max_queue` tasks, `submit()` blocks until it catches up. An
+    exception raised by a task is re-raised by the next call to `submit()` or
+    `flush()`.
+
+    The worker thread is started on the first submission, and stopped by
+    `close()` or when the writer is garbage collected. Pickling a writer
+    flushes it, and the unpickled writer starts its own thread.
+
+    Args:
+      max_queue: The maximum number of tasks waiting to run.
+
+    Raises:
+      ValueError: If `max_queue` is less than 1.
+
+    """
+
+    def __init__(self, max_queue: int = 64) -> None:
+        if max_queue < 1:
+            raise ValueError("max_queue must be at least 1.")
+        self.max_queue = max_queue
+        self.pool = SnapshotPool()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        # Sends the stop sentinel (None) to the worker, at most once
+        self._stop: Optional[weakref.finalize] = None
+        self._error: Optional[BaseException] = None
+
+    @staticmethod
+    def _work(tasks: queue.Queue,
+              writer_ref: "weakref.ReferenceType[LogWriter]") -> None:
+        """Runs the tasks of a writer until it gets the stop sentinel.
+
+        The worker only holds a weak reference to the writer while it waits,
+        so an unused writer can be collected, which stops the worker.
+
+        """
+        while True:
+            task = tasks.get()
+            if task is None:
+                tasks.task_done()
+                return
+            writer = writer_ref()
+            # pylint: disable=W0212
+            if writer is not None and writer._error is None:
+                fn, args = task
+                try:
+                    fn(*args)
+                except Exception as e:  # pylint: disable=W0703
+                    writer._error = e
+            # Drops the references, so they do not keep the writer alive
+            task = fn = args = writer = None
+            tasks.task_done()
+
+    def _raise_error(self) -> None:
+        """Re-raises the exception of a failed task, if any."""
+        error = self._error
+        if error is not None:
+            self._error = None
+            raise error
+
+    def submit(self, fn: Callable[..., None], *args: Any) -> None:
+        """Queues a task to run on the worker thread.
+
+        Args:
+          fn: The function to run.
+          *args: The arguments to pass to the function.
+
+        """
+        self._raise_error()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=LogWriter._work,
+                args=(self._queue, weakref.ref(self)),
+                daemon=True)
+            self._thread.start()
+            self._stop = weakref.finalize(self, self._queue.put, None)
+        self._queue.put((fn, args))
+
+    def flush(self) -> None:
+        """Blocks until every submitted task has run."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """Runs the pending tasks, then stops the worker thread.
+
+        Submitting another task starts a new worker thread.
+
+        """
+        if self._thread is not None:
+            assert self._stop is not None
+            self._stop()
+            self._thread.join()
+            self._thread = None
+            self._stop = None
+        self._raise_error()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        self.flush()
+        return {"max_queue": self.max_queue}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["max_queue"])  # type: ignore
+
+
+class Clock(events.EventListenerMixin):
+    """Counts the cycles, trials, epochs and batches run by a network.
+
+    Loggers stamp each record with these counts, so records taken at
+    different frequencies share the same time indices. The network updates
+    the clock after its loggers handle an event, so the stamps count the
+    periods that ended before the event that triggered the record. A
+    record's counter for its own frequency is therefore the zero-based index
+    of the period it records.
+
+    Attrs:
+      counts (Dict[str, int]): The number of each period ended, keyed by the
+        names in `COUNTERS`. Trials end with `events.EndTrial`, after the
+        plus phase.
+
+    """
+
+    COUNTERS = ("cycle", "trial", "epoch", "batch")
+
+    def __init__(self) -> None:
+        self.counts: Dict[str, int] = dict.fromkeys(self.COUNTERS, 0)
+
+    def handle(self, event: events.Event) -> None:
+        """Overrides `events.EventListnerMixin.handle()`."""
+        if isinstance(event, events.Cycle):
+            self.counts["cycle"] += 1
+        elif isinstance(event, events.EndTrial):
+            self.counts["trial"] += 1
+        elif isinstance(event, events.EndEpoch):
+            self.counts["epoch"] += 1
+        elif isinstance(event, events.EndBatch):
+            self.counts["batch"] += 1
@@ -0,0 +1,224 @@
+"""A cache of settled trial states, to skip rerunning deterministic trials."""
+import collections
+import hashlib
+from typing import Any
+from typing import Dict
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import torch  # type: ignore
+
+from leabra7 import layer
+from leabra7 import projn
+from leabra7 import unit
+
+# The state of each layer (see Layer.save_state()), keyed by layer name
+TrialStates = Dict[str, layer.LayerState]
+
+
+class SettleResult(NamedTuple):
+    """What a trial did to the layers, as stored in the settle cache.
+
+    Attrs:
+      states: The state of each layer at the end of the trial, without the
+        learning averages.
+      avgs_updates: The update of the cycle learning averages of each layer
+        (see `end_cycle_averages_update()`).
+      num_cycles: The number of cycles run.
+
+    """
+    states: TrialStates
+    avgs_updates: Dict[str, Tuple[torch.Tensor, torch.Tensor]]
+    num_cycles: int
+
+
+def _update_hash(h: Any, value: Any) -> None:
+    """Feeds a value (e.g. a layer state) to a hash object."""
+    if isinstance(value, dict):
+        for k in sorted(value):
+            h.update(repr(k).encode())
+            _update_hash(h, value[k])
+    elif isinstance(value, torch.Tensor):
+        h.update(repr((value.dtype, tuple(value.shape))).encode())
+        h.update(value.contiguous().numpy().tobytes())
+    else:
+        h.update(repr(value).encode())
+
+
+def settle_key(layers: Mapping[str, layer.Layer],
+               projns: Mapping[str, projn.Projn],
+               inputs: Mapping[str, torch.Tensor],
+               targets: Mapping[str, torch.Tensor], minus_cycles: int,
+               plus_cycles: int) -> bytes:
+    """Computes the cache key of a trial.
+
+    The key covers everything the settling of a trial depends on: the weight
+    version and spec of every projection, the spec and starting activation
+    state of every layer, the clamped patterns, and the number of cycles. The
+    learning averages do not affect settling, so they are not part of the
+    key.
+
+    Args:
+      layers: The layers of the network.
+      projns: The projections of the network.
+      inputs: The patterns clamped during the whole trial.
+      targets: The patterns clamped during the plus phase.
+      minus_cycles: The number of minus phase cycles.
+      plus_cycles: The number of plus phase cycles.
+
+    Returns:
+      A digest of the trial.
+
+    """
+    h = hashlib.blake2b(digest_size=20)
+    _update_hash(h, (minus_cycles, plus_cycles))
+    for name in sorted(projns):
+        _update_hash(h, (name, projns[name].wt_version))
+        _update_hash(h, projns[name].spec.param_values())
+    for name in sorted(layers):
+        lr = layers[name]
+        _update_hash(h, name)
+        _update_hash(h, lr.spec.param_values())
+        state = {attr: getattr(lr, attr) for attr in lr.activation_attrs}
+        if not lr.clamped:
+            # The clamped activations only matter while the layer is clamped
+            del state["act_ext"]
+        _update_hash(h, state)
+        _update_hash(h, {attr: getattr(lr.units, attr)
+                         for attr in lr.units.activation_attrs})
+    _update_hash(h, dict(inputs))
+    h.update(b"targets")
+    _update_hash(h, dict(targets))
+    return h.digest()
+
+
+def start_cycle_averages_update(units: unit.UnitGroup) -> torch.Tensor:
+    """Starts recording the update of the cycle learning averages of a group.
+
+    The cycle learning averages (avg_ss, avg_s and avg_m) integrate linearly,
+    so after any number of cycles their values are an affine function of
+    their starting values. `end_cycle_averages_update()` returns that
+    function, which `apply_cycle_averages_update()` can replay from other
+    starting values, without running the cycles.
+
+    Args:
+      units: The unit group.
+
+    Returns:
+      A 3 x size tensor with the current avg_ss, avg_s and avg_m, to pass to
+      `end_cycle_averages_update()`.
+
+    """
+    units.avgs_probe = torch.eye(3)
+    return torch.stack((units.avg_ss, units.avg_s, units.avg_m))
+
+
+def end_cycle_averages_update(
+        units: unit.UnitGroup,
+        start: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Stops recording the update of the cycle learning averages of a group.
+
+    Args:
+      units: The unit group.
+      start: The tensor returned by `start_cycle_averages_update()`.
+
+    Returns:
+      A 3 x 3 matrix and a 3 x size offset, such that the current averages
+      are `matrix @ start + offset`.
+
+    """
+    matrix = units.avgs_probe
+    assert matrix is not None
+    units.avgs_probe = None
+    end = torch.stack((units.avg_ss, units.avg_s, units.avg_m))
+    return matrix, end - matrix @ start
+
+
+def apply_cycle_averages_update(units: unit.UnitGroup, matrix: torch.Tensor,
+                                offset: torch.Tensor) -> None:
+    """Applies an update from `end_cycle_averages_update()` to a group.
+
+    Args:
+      units: The unit group.
+      matrix: The 3 x 3 matrix of the update.
+      offset: The 3 x size offset of the update.
+
+    """
+    avgs = matrix @ torch.stack(
+        (units.avg_ss, units.avg_s, units.avg_m)) + offset
+    units.avg_ss.copy_(avgs[0])
+    units.avg_s.copy_(avgs[1])
+    units.avg_m.copy_(avgs[2])
+
+
+def states_nbytes(value: Any) -> int:
+    """Returns the number of bytes held by the tensors of (nested) states."""
+    if isinstance(value, dict):
+        return sum(states_nbytes(v) for v in value.values())
+    if isinstance(value, tuple):
+        return sum(states_nbytes(v) for v in value)
+    if isinstance(value, torch.Tensor):
+        return value.element_size() * value.nelement()
+    return 0
+
+
+class SettleCache:
+    """A least recently used cache of the results of trials.
+
+    Args:
+      max_entries: The maximum number of trials to keep.
+
+    Raises:
+      ValueError: If `max_entries` is less than 1.
+
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.max_entries = max_entries
+        # Ordered from least to most recently used
+        self.entries: "collections.OrderedDict[bytes, SettleResult]" = (
+            collections.OrderedDict())
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> Optional[SettleResult]:
+        """Returns the result stored for a trial, or `None` if there is none.
+
+        Args:
+          key: The key of the trial, from `settle_key()`.
+
+        """
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: bytes, result: SettleResult) -> None:
+        """Stores the result of a trial.
+
+        If the cache is full, the least recently used trial is evicted.
+
+        Args:
+          key: The key of the trial, from `settle_key()`.
+          result: The result of the trial.
+
+        """
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes every stored trial."""
+        self.entries.clear()
+
+    def nbytes(self) -> int:
+        """Returns the number of bytes held by the stored tensors."""
+        return states_nbytes(self.entries)
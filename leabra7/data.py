@@ -0,0 +1,143 @@
+"""Tools to feed datasets of patterns to the network."""
+import queue
+import threading
+from typing import Any
+from typing import Callable
+from typing import Generator
+from typing import Iterable
+from typing import Iterator
+from typing import TypeVar
+
+import numpy as np  # type: ignore
+import torch  # type: ignore
+
+T = TypeVar('T')
+U = TypeVar('U')
+
+
+def is_indexable(dataset: Any) -> bool:
+    """Checks if a dataset supports random access (e.g. arrays or memmaps)."""
+    return hasattr(dataset, "__len__") and hasattr(dataset, "__getitem__")
+
+
+def iter_rows(dataset: Any, shuffle: bool,
+              gen: torch.Generator = None) -> Iterator[Any]:
+    """Iterates over the rows of a dataset.
+
+    Args:
+      dataset: The dataset. Indexable datasets (e.g. numpy arrays or
+        memmaps) are read one row at a time, so they never need to fit in
+        memory. Any other iterable (e.g. a generator) is consumed in order.
+      shuffle: Whether to visit the rows in a random order.
+      gen: The generator to use for shuffling. If it is `None`, torch's
+        global generator is used.
+
+    Raises:
+      ValueError: If `shuffle` is True but the dataset is not indexable.
+
+    """
+    if not is_indexable(dataset):
+        if shuffle:
+            raise ValueError("Only datasets with random access (like arrays "
+                             "or memmaps) can be shuffled.")
+        yield from dataset
+        return
+
+    if shuffle:
+        order = torch.randperm(len(dataset), generator=gen).tolist()
+    else:
+        order = list(range(len(dataset)))
+    for i in order:
+        yield dataset[i]
+
+
+def prepare_pattern(row: Any, selector: Any, size: int,
+                    clamp_max: float) -> torch.Tensor:
+    """Prepares part of a dataset row to be clamped to a layer.
+
+    Args:
+      row: The dataset row.
+      selector: A numpy index (e.g. a slice or a list of column indices) that
+        selects the activations for the layer from the row.
+      size: The number of units in the layer.
+      clamp_max: The layer's maximum clamp value.
+
+    Returns:
+      A tensor of the selected activations, tiled to the layer size and
+      clipped to [0, clamp_max].
+
+    Raises:
+      ValueError: If the selection is empty, or if any selected value is
+        outside the range [0, 1].
+
+    """
+    acts = np.asarray(row, dtype=np.float32)[selector].reshape(-1)
+    if acts.size == 0:
+        raise ValueError("The pattern selector selected no values.")
+    if ((acts < 0) | (acts > 1)).any():
+        raise ValueError("All values of acts must be in [0, 1].")
+    return torch.from_numpy(np.clip(np.resize(acts, size), 0.0, clamp_max))
+
+
+class _Failure:
+    """Wraps an exception raised in a prefetching thread."""
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+_END = object()
+
+
+def prefetch(items: Iterable[T], prepare: Callable[[T], U],
+             depth: int) -> Generator[U, None, None]:
+    """Prepares items on a background thread, ahead of their consumption.
+
+    Exceptions raised while iterating over or preparing the items are
+    re-raised in the consuming thread. Close the returned generator (e.g. with
+    `contextlib.closing()`) to stop the background thread early.
+
+    Args:
+      items: The items to prepare.
+      prepare: The function that prepares each item.
+      depth: The maximum number of prepared items waiting to be consumed.
+
+    Yields:
+      The prepared items, in order.
+
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def work() -> None:
+        try:
+            for item in items:
+                if not put(prepare(item)):
+                    return
+        except Exception as e:  # pylint: disable=W0703
+            put(_Failure(e))
+            return
+        put(_END)
+
+    worker = threading.Thread(target=work, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        worker.join()
@@ -3,8 +3,17 @@ import abc
 import inspect
 from typing import Any
 from typing import Dict
+from typing import Hashable
+from typing import Optional
 from typing import Sequence
+from typing import Tuple
 from typing import Type
+from typing import Union
+
+import numpy as np  # type: ignore
+import torch  # type: ignore
+
+from leabra7 import utils
 
 
 class Event():
@@ -17,6 +26,10 @@ class Event():
     pass
 
 
+# An event type, or a tuple of event types, as accepted by isinstance()
+EventTypes = Union[Type[Event], Tuple[Type[Event], ...]]
+
+
 class Cycle(Event):
     """The event that cycles the network."""
     pass
@@ -92,8 +105,13 @@ class HardClamp(Event):
 
     Args:
       layer_name: The name of the layer to hard clamp.
-      acts: A sequence of the activations to clamp the layer to. If there are
-        fewer values than the number of units in the layer, it will be tiled.
+      acts: The activations to clamp the layer to, as a sequence, a numpy
+        array, or a tensor. Float32 arrays and tensors are used without
+        copying. If there are fewer values than the number of units in the
+        layer, it will be tiled.
+      prepared: If true, `acts` is a tensor that was already checked, tiled
+        to the layer size and clipped (see `data.prepare_pattern()`). The
+        layer then uses it as is, without copying it.
       name: The name of the node.
 
     Raises:
@@ -101,11 +119,30 @@ class HardClamp(Event):
 
     """
 
-    def __init__(self, layer_name: str, acts: Sequence[float]) -> None:
+    def __init__(self,
+                 layer_name: str,
+                 acts: Union[Sequence[float], np.ndarray, torch.Tensor],
+                 prepared: bool = False) -> None:
         self.layer_name = layer_name
-        if not all(0 <= i <= 1 for i in acts):
-            raise ValueError("All values of acts must be in [0, 1].")
-        self.acts = acts
+        self.prepared = prepared
+        if prepared:
+            self.acts = acts
+        else:
+            self.acts = utils.as_acts_tensor(acts)
+
+
+class ClampPattern(Event):
+    """The event that hard clamps a layer to a registered pattern.
+
+    Args:
+      layer_name: The name of the layer to hard clamp.
+      key: The key of the pattern registered on the layer.
+
+    """
+
+    def __init__(self, layer_name: str, key: Hashable) -> None:
+        self.layer_name = layer_name
+        self.key = key
 
 
 class Unclamp(Event):
@@ -129,33 +166,97 @@ class Learn(Event):
 class Frequency():
     """Defines event frequencies.
 
+    Besides the built-in frequencies below, you can define your own before
+    creating the network's objects, and log attributes at them with the
+    `log_on_custom` spec parameter. For example, to log every tenth cycle:
+
+        Frequency(name="cycle_10", end_event_type=Cycle, stride=10)
+
+    or the mean over the cycles of each trial:
+
+        Frequency(name="trial_mean", end_event_type=EndPlusPhase,
+                  aggregate="mean")
+
     Args:
       name: The name of the frequency.
-      end_event_type: The event that marks the end of the frequency period.
+      end_event_type: The event that marks the end of the frequency period,
+        or a tuple of such events (e.g. `(EndMinusPhase, EndPlusPhase)` to
+        record at the last cycle of each phase).
+      stride: Records at the end of every `stride` periods.
+      aggregate: If None, records the attribute values at the end of the
+        period. Otherwise, one of "mean", "min", or "max", to record that
+        aggregate of the values sampled since the last record.
+      sample_event_type: The event at which values are sampled for the
+        aggregate.
 
     Raises:
-      TypeError: if end_event_type is not a type (i.e. class variable)
+      TypeError: if end_event_type or sample_event_type is not a type (i.e.
+        class variable)
+      ValueError: if stride is less than one, or aggregate is invalid.
 
     """
     # Stores a reference to each created frequency object, keyed by name
     registry: Dict[str, "Frequency"] = {}
 
     name: str
-    end_event_type: Type[Event]
-
-    def __init__(self, name: str, end_event_type: Type[Event]) -> None:
-        if not inspect.isclass(end_event_type):
+    end_event_type: EventTypes
+    stride: int
+    aggregate: Optional[str]
+    sample_event_type: Type[Event]
+
+    def __init__(self,
+                 name: str,
+                 end_event_type: EventTypes,
+                 stride: int = 1,
+                 aggregate: str = None,
+                 sample_event_type: Type[Event] = Cycle) -> None:
+        end_event_types = end_event_type
+        if not isinstance(end_event_types, tuple):
+            end_event_types = (end_event_types, )
+        if not all(inspect.isclass(i) for i in end_event_types):
             raise TypeError("end_event_type must be a class variable.")
+        if not inspect.isclass(sample_event_type):
+            raise TypeError("sample_event_type must be a class variable.")
+        if stride < 1:
+            raise ValueError("stride must be at least 1.")
+        if aggregate not in (None, "mean", "min", "max"):
+            raise ValueError("aggregate must be one of None, \"mean\", "
+                             "\"min\", or \"max\".")
         self.name = name
         self.end_event_type = end_event_type
+        self.stride = stride
+        self.aggregate = aggregate
+        self.sample_event_type = sample_event_type
         Frequency.registry[name] = self
 
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, Frequency):
             return (self.name == other.name
-                    and self.end_event_type == other.end_event_type)
+                    and self.end_event_type == other.end_event_type
+                    and self.stride == other.stride
+                    and self.aggregate == other.aggregate
+                    and self.sample_event_type == other.sample_event_type)
         return False
 
+    @classmethod
+    def unregister(cls, freq_name: str) -> None:
+        """Removes a user-defined frequency from the registry.
+
+        Objects created afterwards can no longer log at the frequency.
+
+        Args:
+          freq_name: The name of the frequency.
+
+        Raises:
+          ValueError: If no frequency exists with name `freq_name`, or if it
+            is a built-in frequency.
+
+        """
+        if freq_name in _BUILTIN_FREQ_NAMES:
+            raise ValueError(
+                "{0} is a built-in frequency.".format(freq_name))
+        del cls.registry[cls.from_name(freq_name).name]
+
     @classmethod
     def names(cls) -> Sequence[str]:
         """Returns the names of all defined frequencies."""
@@ -183,6 +284,7 @@ CycleFreq = Frequency(name="cycle", end_event_type=Cycle)
 TrialFreq = Frequency(name="trial", end_event_type=EndPlusPhase)
 EpochFreq = Frequency(name="epoch", end_event_type=EndEpoch)
 BatchFreq = Frequency(name="batch", end_event_type=EndBatch)
+_BUILTIN_FREQ_NAMES = ("cycle", "trial", "epoch", "batch")
 
 
 class EventListenerMixin(metaclass=abc.ABCMeta):
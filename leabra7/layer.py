@@ -1,8 +1,16 @@
 """A layer, or group, of units."""
-import itertools
+import collections
+import math
+from typing import Any
+from typing import Dict
+from typing import Hashable
 from typing import List
-from typing import Iterable
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
 
+import numpy as np  # type: ignore
 import torch  # type: ignore
 
 from leabra7 import log
@@ -11,6 +19,11 @@ from leabra7 import events
 from leabra7 import unit
 from leabra7 import utils
 
+# A prepared clamp pattern: the clamped activations and membrane potentials
+Pattern = Tuple[torch.Tensor, torch.Tensor]
+# A copy of the dynamic state of a layer (see Layer.save_state())
+LayerState = Dict[str, Any]
+
 
 def _parse_unit_attr(attr: str) -> str:
     """Removes the unit_ prefix from a unit attribute.
@@ -34,6 +47,95 @@ def _parse_unit_attr(attr: str) -> str:
     return parts[1]
 
 
+def _copy_state_value(value: Any) -> Any:
+    """Copies a state value, so later updates do not modify the copy."""
+    if isinstance(value, torch.Tensor):
+        return value.clone()
+    return value
+
+
+def _log_index(log_units: Optional[Sequence[Union[int, bool]]],
+               size: int) -> Optional[torch.Tensor]:
+    """Converts the log_units spec parameter to a tensor of unit indices.
+
+    Args:
+        log_units: A sequence of unit indices, a boolean mask, or None.
+        size: The number of units in the layer.
+
+    Returns:
+        The indices of the units to log, or None to log every unit.
+
+    Raises:
+        ValueError: If a mask does not have one element per unit, or if an
+            index is not smaller than the number of units.
+
+    """
+    if log_units is None:
+        return None
+    units = np.asarray(log_units)
+    if units.dtype.kind == "b":
+        if len(units) != size:
+            raise ValueError("A log_units mask must have one element per "
+                             "unit.")
+        return torch.from_numpy(np.flatnonzero(units))
+    index = torch.from_numpy(units.astype(np.int64).reshape(-1))
+    if (index >= size).any():
+        raise ValueError("log_units contains an index that is not smaller "
+                         "than the layer size {0}.".format(size))
+    return index
+
+
+def _tile_and_clip(act_ext: Union[Sequence[float], np.ndarray, torch.Tensor],
+                   size: int, clamp_max: float) -> torch.Tensor:
+    """Tiles and clips activations to clamp a layer to.
+
+    Args:
+        act_ext: The activations. See `Layer.hard_clamp()`.
+        size: The number of units in the layer.
+        clamp_max: The layer's maximum clamp value.
+
+    Returns:
+        A new tensor with one clipped activation per unit.
+
+    Raises:
+        ValueError: If `act_ext` is empty.
+
+    """
+    acts = torch.as_tensor(act_ext, dtype=torch.float32).reshape(-1)
+    if acts.numel() == 0:
+        raise ValueError("Cannot clamp a layer to an empty pattern.")
+    if acts.numel() < size:
+        acts = acts.repeat(-(-size // acts.numel()))
+    # clamp() returns a new tensor, so the caller's data is never aliased
+    return acts[:size].clamp(0.0, clamp_max)
+
+
+def clamp_distance(lr: "Layer", state: LayerState,
+                   act_ext: Union[Sequence[float], np.ndarray,
+                                  torch.Tensor]) -> float:
+    """Compares a pattern to the one clamped in a saved state of a layer.
+
+    Args:
+        lr: The layer.
+        state: A state returned by `lr.save_state()`.
+        act_ext: The activations. See `Layer.hard_clamp()`.
+
+    Returns:
+        The squared euclidean distance between the tiled and clipped
+        activations and the clamped activations of the state, or infinity if
+        the layer was not clamped in the state.
+
+    Raises:
+        ValueError: If `act_ext` is empty.
+
+    """
+    if not state["clamped"]:
+        return math.inf
+    acts = _tile_and_clip(act_ext, lr.size, lr.spec.clamp_max)
+    diff = acts - state["act_ext"]
+    return torch.sum(diff * diff).item()
+
+
 class Layer(log.ObservableMixin, events.EventListenerMixin):
     """A layer of units (neurons).
 
@@ -44,6 +146,15 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
             be used.
 
     """
+    # The attributes, besides the units, that settling depends on
+    activation_attrs = ("act_ext", "input_buffer", "fbi", "gc_i", "clamped",
+                        "wt_scale_rel_sum")
+    # The attributes that make up the dynamic state, besides the learning
+    # averages
+    state_attrs = activation_attrs + ("acts_p", "acts_m", "cos_diff", "sse",
+                                      "cnt_err", "err")
+    # The learning averages
+    learning_attrs = ("cos_diff_avg", )
 
     def __init__(self, name: str, size: int,
                  spec: specs.LayerSpec = None) -> None:
@@ -56,6 +167,15 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
             self._spec = spec
 
         self.units = unit.UnitGroup(size=size, spec=self.spec.unit_spec)
+        # The indices of the units whose parts attributes are observed, or
+        # None to observe every unit
+        self.log_index = _log_index(self.spec.log_units, size)
+        # The unit column of the observations from parts_obs_from_tensor()
+        if self.log_index is None:
+            self._unit_index = np.arange(self.size)
+        else:
+            self._unit_index = self.log_index.numpy().copy()
+        self._unit_index.flags.writeable = False
 
         # Feedback inhibition
         self.fbi = 0.0
@@ -70,6 +190,10 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
 
         # Desired clamping values
         self.act_ext = torch.Tensor(self.size).zero_()
+        # Registered clamp patterns, as (act_ext, v_m) tuples, ordered from
+        # least to most recently used
+        self.patterns: "collections.OrderedDict[Hashable, Pattern]" = (
+            collections.OrderedDict())
         # Last plus phase activation
         self.acts_p = torch.Tensor(self.size).zero_()
         # Last minus phase activation
@@ -78,6 +202,13 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
         self.cos_diff = 0.0
         # Cosine similiarity between acts_p and acts_m, integrated over trials
         self.cos_diff_avg = 0.0
+        # Sum squared error of acts_m, with acts_p as the target
+        self.sse = 0.0
+        # Number of units whose acts_p and acts_m differ by more than
+        # spec.err_tol
+        self.cnt_err = 0
+        # 1 if any unit was in error in the last trial, else 0
+        self.err = 0.0
 
         # The following two buffers are filled every time self.add_input() is
         # called, and reset at the end of self.activation_cycle()
@@ -95,7 +226,10 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
         # When adding any loggable attribute or property to these lists, update
         # specs.LayerSpec._valid_log_on_cycle (we represent in two places to
         # avoid a circular dependency)
-        whole_attrs: List[str] = ["avg_act", "avg_net", "cos_diff_avg", "fbi"]
+        whole_attrs: List[str] = [
+            "avg_act", "avg_net", "cos_diff_avg", "fbi", "cos_diff", "sse",
+            "cnt_err", "err"
+        ]
         parts_attrs: List[str] = [
             "unit_net", "unit_net_raw", "unit_gc_i", "unit_act", "unit_i_net",
             "unit_i_net_r", "unit_v_m", "unit_v_m_eq", "unit_adapt",
@@ -137,7 +271,7 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
         self.input_buffer += inpt * wt_scale_rel
         self.wt_scale_rel_sum += wt_scale_rel
 
-    def update_net(self) -> None:
+    def _update_net(self) -> None:
         """Updates the net input of the layer's units."""
         # self.wt_scale_rel_sum could be zero if there are no inbound
         # projections, or if the projections have not been flushed yet
@@ -149,16 +283,22 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
         self.units.add_input(self.input_buffer)
         self.units.update_net()
 
-    def calc_fffb_inhibition(self) -> None:
+    def _calc_fffb_inhibition(self) -> None:
         """Calculates feedforward-feedback inhibition for the layer."""
         # Feedforward inhibition
         ffi = self.spec.ff * max(self.avg_net - self.spec.ff0, 0)
         # Feedback inhibition
-        self.fbi += self.spec.fb_dt * (self.spec.fb * self.avg_act - self.fbi)
+        fb_rate = self.spec.fb_dt
+        if self.units.spec.adaptive_integ:
+            fb_rate = min(1.0, self.units.integ_scale * fb_rate)
+        d_fbi = fb_rate * (self.spec.fb * self.avg_act - self.fbi)
+        self.fbi += d_fbi
+        if self.units.spec.adaptive_integ:
+            self.units.inhib_change = abs(d_fbi)
         # Global inhibition
         self.gc_i = self.spec.gi * (ffi * self.fbi)
 
-    def calc_kwta_inhibition(self) -> None:
+    def _calc_kwta_inhibition(self) -> None:
         """Calculates k-winner-take-all inhibition for the layer."""
         if self.k == self.size:
             self.gc_i = 0
@@ -168,7 +308,7 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
         g_i_thr_k = self.units.g_i_thr(top_m_units[-2])
         self.gc_i = g_i_thr_m + self.spec.kwta_pt * (g_i_thr_k - g_i_thr_m)
 
-    def calc_kwta_avg_inhibition(self) -> None:
+    def _calc_kwta_avg_inhibition(self) -> None:
         """Calculates k-winner-take-all average inhibition for the layer."""
         if self.k == self.size:
             self.gc_i = 0
@@ -178,22 +318,22 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
         g_i_thr_n_k = torch.mean(g_i_thr[self.k:])
         self.gc_i = g_i_thr_n_k + self.spec.kwta_pt * (g_i_thr_k - g_i_thr_n_k)
 
-    def update_inhibition(self) -> None:
+    def _update_inhibition(self) -> None:
         """Updates the inhibition for the layer's units."""
         if self.spec.inhibition_type == "fffb":
-            self.calc_fffb_inhibition()
+            self._calc_fffb_inhibition()
         elif self.spec.inhibition_type == "kwta":
-            self.calc_kwta_inhibition()
+            self._calc_kwta_inhibition()
         elif self.spec.inhibition_type == "kwta_avg":
-            self.calc_kwta_avg_inhibition()
+            self._calc_kwta_avg_inhibition()
 
         self.units.update_inhibition(torch.Tensor(self.size).fill_(self.gc_i))
 
     def activation_cycle(self) -> None:
         """Runs one complete activation cycle of the layer."""
         if not self.clamped:
-            self.update_net()
-            self.update_inhibition()
+            self._update_net()
+            self._update_inhibition()
             self.units.update_membrane_potential()
             self.units.update_activation()
 
@@ -201,13 +341,18 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
         self.input_buffer.zero_()
         self.wt_scale_rel_sum = 0
 
-    def update_trial_learning_averages(self) -> None:
-        """Updates the learning averages computed at the end of each trial."""
+    def _update_trial_learning_averages(self) -> None:
+        """Updates the learning averages and error metrics of the trial."""
         cos_diff = torch.nn.functional.cosine_similarity(
-            self.acts_p, self.acts_m, dim=0)
+            self.acts_p, self.acts_m, dim=0).item()
         self.cos_diff = utils.clip_float(low=0.01, high=0.99, x=cos_diff)
         self.cos_diff_avg += self.spec.avg_dt * (cos_diff - self.cos_diff_avg)
 
+        diff = torch.abs(self.acts_p - self.acts_m)
+        self.sse = float(torch.sum(diff**2))
+        self.cnt_err = int(torch.sum(diff > self.spec.err_tol))
+        self.err = float(self.cnt_err > 0)
+
         acts_p_avg_eff = self.acts_p.mean().item()
         self.units.update_trial_learning_averages(acts_p_avg_eff)
 
@@ -226,45 +371,226 @@ class Layer(log.ObservableMixin, events.EventListenerMixin):
         """The long learning average for each unit."""
         return self.units.avg_l
 
-    def hard_clamp(self, act_ext: Iterable[float]) -> None:
+    def _prepare_clamp(self, act_ext: Union[Sequence[float], np.ndarray,
+                                            torch.Tensor]) -> torch.Tensor:
+        """Tiles and clips activations to clamp the layer to.
+
+        Args:
+            act_ext: The activations. See `hard_clamp()`.
+
+        Returns:
+            A new tensor with one clipped activation per unit.
+
+        Raises:
+            ValueError: If `act_ext` is empty.
+
+        """
+        return _tile_and_clip(act_ext, self.size, self.spec.clamp_max)
+
+    def hard_clamp(self,
+                   act_ext: Union[Sequence[float], np.ndarray, torch.Tensor],
+                   prepared: bool = False) -> None:
         """Forces the layer's activations.
 
         After forcing, the layer's activations will be set to the values
         contained in `acts` and will not change from cycle to cycle.
 
         Args:
-            act_ext: An iterable containing the activations that the layer's
-                units will be clamped to. If its length is less than the number
-                of units in the layer, it will be tiled. If its length is
-                greater, the extra values will be ignored.
+            act_ext: A sequence, numpy array, or tensor containing the
+                activations that the layer's units will be clamped to. If its
+                length is less than the number of units in the layer, it will
+                be tiled. If its length is greater, the extra values will be
+                ignored.
+            prepared: If true, `act_ext` is a tensor already tiled to the
+                layer size and clipped (see `data.prepare_pattern()`), which
+                the layer keeps without copying it.
+
+        Raises:
+            ValueError: If `act_ext` is empty.
 
         """
+        if prepared:
+            assert isinstance(act_ext, torch.Tensor)
+            self.act_ext = act_ext
+        else:
+            self.act_ext = self._prepare_clamp(act_ext)
         self.clamped = True
         self.hidden = False
-        trimmed = utils.clip_iterable(0.0, self.spec.clamp_max, act_ext)
-        self.act_ext = torch.Tensor(
-            list(itertools.islice(itertools.cycle(trimmed), self.size)))
         self.units.hard_clamp(self.act_ext)
 
-    def unclamp(self) -> None:
+    def register_pattern(self, key: Hashable,
+                         act_ext: Union[Sequence[float], np.ndarray,
+                                        torch.Tensor]) -> None:
+        """Prepares a pattern once, so it can be clamped repeatedly.
+
+        The pattern is tiled and clipped with the current spec. If the cache
+        is full, the least recently used pattern is evicted.
+
+        Args:
+            key: The key of the pattern. Registering a key again replaces its
+                pattern.
+            act_ext: The activations. See `hard_clamp()`.
+
+        Raises:
+            ValueError: If `act_ext` is empty.
+
+        """
+        acts = self._prepare_clamp(act_ext)
+        self.patterns[key] = (acts, unit.clamped_v_m(self.units.spec, acts))
+        self.patterns.move_to_end(key)
+        while len(self.patterns) > self.spec.pattern_cache_size:
+            self.patterns.popitem(last=False)
+
+    def _clamp_pattern(self, key: Hashable) -> None:
+        """Forces the layer's activations to a registered pattern.
+
+        The prepared values are copied into the layer's existing tensors.
+
+        Args:
+            key: The key of the pattern.
+
+        Raises:
+            ValueError: If no pattern is registered with the key (e.g. because
+                it was evicted).
+
+        """
+        if key not in self.patterns:
+            raise ValueError(
+                "No pattern registered with key {0}.".format(key))
+        self.patterns.move_to_end(key)
+        acts, v_m = self.patterns[key]
+        self.clamped = True
+        self.hidden = False
+        self.act_ext.copy_(acts)
+        self.units.hard_clamp_prepared(acts, v_m)
+
+    def _unclamp(self) -> None:
         """Unclamps the layer."""
         self.clamped = False
 
+    def save_state(self, learning: bool = True) -> LayerState:
+        """Returns a copy of the dynamic state of the layer and its units.
+
+        Args:
+            learning: Whether to include the learning averages.
+
+        """
+        attrs: Tuple[str, ...] = self.state_attrs
+        if learning:
+            attrs += self.learning_attrs
+        state = {
+            attr: _copy_state_value(getattr(self, attr))
+            for attr in attrs
+        }
+        state["units"] = self.units.save_state(learning)
+        return state
+
+    def load_state(self, state: LayerState, keep_clamp: bool = False) -> None:
+        """Restores a state returned by `save_state()`.
+
+        The state is copied, so it can be loaded again later. The learning
+        averages are only restored if the state includes them.
+
+        Args:
+            state: The state.
+            keep_clamp: Whether to keep the current clamp of the layer,
+                instead of the one in the state. If the layer is clamped, its
+                units are set to the clamped activations.
+
+        """
+        clamped, act_ext = self.clamped, self.act_ext
+        for attr, value in state.items():
+            if attr != "units":
+                setattr(self, attr, _copy_state_value(value))
+        self.units.load_state(state["units"])
+        if keep_clamp:
+            self.clamped, self.act_ext = clamped, act_ext
+            if self.clamped:
+                self.units.hard_clamp(self.act_ext)
+
+    def reset_state(self) -> None:
+        """Resets the activation state of the layer and its units.
+
+        The inhibition, the pending inputs and the unit activations are set to
+        their initial values, so the next trial settles independently of the
+        previous one. The learning averages and the last phase activations
+        are kept, and a clamped layer stays clamped.
+
+        """
+        self.fbi = 0.0
+        self.gc_i = 0.0
+        # Drops the inputs the projections sent during the previous cycle
+        self.input_buffer = torch.Tensor(self.size).zero_()
+        self.wt_scale_rel_sum = 0.0
+        self.units.reset_state()
+        if self.clamped:
+            self.units.hard_clamp(self.act_ext)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the number of bytes held by the layer's tensors.
+
+        Returns:
+          A dict with the bytes of the unit state ("units"), of the
+          layer's own buffers ("buffers"), and of the registered clamp
+          patterns ("patterns").
+
+        """
+        return {
+            "units": utils.tensor_nbytes(self.units),
+            "buffers": utils.tensor_nbytes(self),
+            "patterns": sum(
+                t.element_size() * t.nelement()
+                for pattern in self.patterns.values() for t in pattern)
+        }
+
     def observe_parts_attr(self, attr: str) -> log.PartsObs:
         if attr not in self.parts_attrs:
             raise ValueError("{0} is not a valid parts attr.".format(attr))
         parsed = _parse_unit_attr(attr)
-        return self.units.observe(parsed)
+        if self.log_index is None:
+            return self.units.observe(parsed)
+        return self.parts_obs_from_tensor(attr,
+                                          self.observe_parts_tensor(attr))
+
+    def parts_column(self, attr: str) -> str:
+        """Overrides `log.ObservableMixin.parts_column()`."""
+        return _parse_unit_attr(attr)
+
+    def observe_parts_tensor(self, attr: str) -> torch.Tensor:
+        """Overrides `log.ObservableMixin.observe_parts_tensor()`.
+
+        Only the units selected by `spec.log_units` are observed.
+
+        """
+        if attr not in self.parts_attrs:
+            raise ValueError("{0} is not a valid parts attr.".format(attr))
+        tensor = self.units.observe_tensor(_parse_unit_attr(attr))
+        if self.log_index is None:
+            return tensor
+        return tensor[self.log_index]
+
+    def parts_obs_from_tensor(self, attr: str,
+                              values: torch.Tensor) -> log.PartsObs:
+        """Overrides `log.ObservableMixin.parts_obs_from_tensor()`."""
+        if attr not in self.parts_attrs:
+            raise ValueError("{0} is not a valid parts attr.".format(attr))
+        return {
+            "unit": self._unit_index,
+            _parse_unit_attr(attr): values.numpy().astype(np.float64)
+        }
 
     def handle(self, event: events.Event) -> None:
         if isinstance(event, events.HardClamp):
             if event.layer_name == self.name:
-                self.hard_clamp(event.acts)
+                self.hard_clamp(event.acts, event.prepared)
+        elif isinstance(event, events.ClampPattern):
+            if event.layer_name == self.name:
+                self._clamp_pattern(event.key)
         elif isinstance(event, events.EndPlusPhase):
             self.acts_p.copy_(self.units.act)
-            self.update_trial_learning_averages()
+            self._update_trial_learning_averages()
         elif isinstance(event, events.EndMinusPhase):
             self.acts_m.copy_(self.units.act)
         elif isinstance(event, events.Unclamp):
             if event.layer_name == self.name:
-                self.unclamp()
+                self._unclamp()
@@ -1,18 +1,30 @@
 """Tools to log data from the network."""
 import abc
+import array
 import collections
+import threading
 from typing import Any
 from typing import Dict
 from typing import Iterable
 from typing import List
 from typing import NamedTuple
+from typing import Optional
 from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
 
-import pandas as pd  # type: ignore
+import numpy as np  # type: ignore
+import torch  # type: ignore
 
+from leabra7 import buffers
 from leabra7 import events
 from leabra7 import specs
 
+# Pandas is slow to import, and it is only needed once logs or observations are
+# requested, so every function in this module imports it locally
+if TYPE_CHECKING:
+    import pandas as pd  # type: ignore
+
 WholeObs = Tuple[str, Any]
 """The observation of an entire object.
 
@@ -23,9 +35,11 @@ Example:
 
 """
 
-PartsObs = Dict[str, List[Any]]
+PartsObs = Dict[str, Union[List[Any], np.ndarray]]
 """An observation of the parts of an object, e.g. the units of a layer.
 
+Each value is a list or a one dimensional numpy array.
+
 Example:
 
 - An observation of the activation in one unit of a layer
@@ -34,6 +48,14 @@ Example:
 """
 
 
+TimeRange = Tuple[Optional[int], Optional[int]]
+"""A range of record times: the first time, and the time after the last.
+
+Either end can be `None` to leave the range open on that side.
+
+"""
+
+
 class DataFrameBuffer:
     """A buffer of dataframe records.
 
@@ -43,9 +65,11 @@ class DataFrameBuffer:
 
     def __init__(self) -> None:
         self.time = 0
-        self.buffer: List[pd.DataFrame] = []
+        self.buffer: List["pd.DataFrame"] = []
+        # The time of each buffered record
+        self.times: List[int] = []
 
-    def append(self, record: pd.DataFrame) -> None:
+    def append(self, record: "pd.DataFrame") -> None:
         """Appends a record to the dataframe buffer.
 
         A "time" column is added to each record.
@@ -55,18 +79,36 @@ class DataFrameBuffer:
                 for a single time step.
 
         """
-        df: pd.DataFrame = record.copy()
+        df = record.copy()
         df["time"] = self.time
         self.buffer.append(df)
+        self.times.append(self.time)
         self.time += 1
 
     def increment_time(self) -> None:
         """Increments the time counter."""
         self.time += 1
 
-    def to_df(self) -> pd.DataFrame:
-        """Returns a DataFrame containing the data in the buffer."""
-        return pd.concat(self.buffer, ignore_index=True)
+    def nbytes(self) -> int:
+        """Returns the number of bytes held by the buffered records."""
+        return sum(
+            int(df.memory_usage(index=True, deep=True).sum())
+            for df in self.buffer)
+
+    def to_df(self, start: Optional[int] = None,
+              stop: Optional[int] = None) -> "pd.DataFrame":
+        """Returns a DataFrame containing the data in the buffer.
+
+        Args:
+          start: If given, records before this time are left out.
+          stop: If given, records at or after this time are left out.
+
+        """
+        import pandas as pd  # type: ignore
+        lo, hi = buffers.time_slice(self.times, start, stop)
+        if lo == hi:
+            return pd.DataFrame()
+        return pd.concat(self.buffer[lo:hi], ignore_index=True)
 
 
 class ObservableMixin(metaclass=abc.ABCMeta):
@@ -155,6 +197,15 @@ class ObservableMixin(metaclass=abc.ABCMeta):
             raise ValueError("{0} is not a whole attr.".format(attr))
         return (attr, getattr(self, attr))
 
+    def parts_column(self, attr: str) -> str:
+        """Returns the name of the log column holding a parts attribute.
+
+        Args:
+          attr: The parts attribute.
+
+        """
+        return attr
+
     @abc.abstractmethod
     def observe_parts_attr(self, attr: str) -> PartsObs:
         """Observes a parts attribute.
@@ -163,15 +214,86 @@ class ObservableMixin(metaclass=abc.ABCMeta):
           attr: The attribute to observe.
 
         Returns:
-          A PartsObs (`Dict[str, List[any]]`) containing the attribute name and
-          the values of the attribute for each part.
+          A PartsObs containing the attribute name and the values of the
+          attribute for each part.
+
+        Raises:
+          ValueError: If the attr is not a parts attribute.
+
+        """
+
+    @abc.abstractmethod
+    def observe_parts_tensor(self, attr: str) -> torch.Tensor:
+        """Observes a parts attribute as a tensor.
+
+        Args:
+          attr: The attribute to observe.
+
+        Returns:
+          A one dimensional tensor with the value of the attribute for each
+          part, in the same order as `observe_parts_attr()`. It may share
+          storage with the object, so it must not be modified.
 
         Raises:
           ValueError: If the attr is not a parts attribute.
 
         """
 
-    def observe(self, attr: str) -> pd.DataFrame:
+    @abc.abstractmethod
+    def parts_obs_from_tensor(self, attr: str,
+                              values: torch.Tensor) -> PartsObs:
+        """Builds a parts observation from values for each part.
+
+        This is used to log values computed from observations, like
+        aggregates.
+
+        Args:
+          attr: The attribute the values are for.
+          values: A tensor with a value for each part, in the same order as
+            `observe_parts_tensor()`.
+
+        Returns:
+          A PartsObs like the one `observe_parts_attr()` returns, but with
+          `values` in place of the current value of the attribute.
+
+        Raises:
+          ValueError: If the attr is not a parts attribute.
+
+        """
+
+    def observe_array(self, attr: str, as_tensor: bool = False
+                      ) -> Union[np.ndarray, torch.Tensor]:
+        """Observes an attribute, returning an array.
+
+        This supports the Net.observe_array() method. Unlike `observe()`, it
+        does not convert the values to Python objects or use pandas.
+
+        Args:
+          attr: The attribute to observe.
+          as_tensor: If true, returns a tensor clone of the values. Otherwise,
+            returns a read-only numpy view of them, which may change as the
+            network runs.
+
+        Returns:
+          The observation. Whole attributes are zero dimensional, and parts
+          attributes have one value for each part.
+
+        Raises:
+          ValueError: If the attr is not observable.
+
+        """
+        self.validate_attr(attr)
+        if attr in self.parts_attrs:
+            tensor = self.observe_parts_tensor(attr)
+        else:
+            tensor = torch.as_tensor(self.observe_whole_attr(attr)[1])
+        if as_tensor:
+            return tensor.clone()
+        values = tensor.numpy()
+        values.flags.writeable = False
+        return values
+
+    def observe(self, attr: str) -> "pd.DataFrame":
         """Observes an attribute, returning a dataframe.
 
         This supports the Net.observe() method.
@@ -186,6 +308,7 @@ class ObservableMixin(metaclass=abc.ABCMeta):
           ValueError: If the attr is not observable.
 
         """
+        import pandas as pd  # type: ignore
         self.validate_attr(attr)
         if attr in self.parts_attrs:
             return pd.DataFrame(self.observe_parts_attr(attr))
@@ -193,7 +316,8 @@ class ObservableMixin(metaclass=abc.ABCMeta):
         return pd.DataFrame({name: (val, )})
 
 
-def merge_parts_observations(observations: Iterable[PartsObs]) -> pd.DataFrame:
+def merge_parts_observations(
+        observations: Iterable[PartsObs]) -> "pd.DataFrame":
     """Merges parts observations together into a dataframe.
 
     This dataframe can then be appended to the parts log dataframe. If
@@ -209,10 +333,12 @@ def merge_parts_observations(observations: Iterable[PartsObs]) -> pd.DataFrame:
       A dataframe containing the merged observations.
 
     """
+    import pandas as pd  # type: ignore
     return pd.DataFrame(data=dict(collections.ChainMap(*observations)))
 
 
-def merge_whole_observations(observations: Iterable[WholeObs]) -> pd.DataFrame:
+def merge_whole_observations(
+        observations: Iterable[WholeObs]) -> "pd.DataFrame":
     """Merges whole observations together into a dataframe.
 
     This dataframe can then be appended to the whole log dataframe.
@@ -224,9 +350,15 @@ def merge_whole_observations(observations: Iterable[WholeObs]) -> pd.DataFrame:
       A dataframe containing the merged observations.
 
     """
+    import pandas as pd  # type: ignore
     return pd.DataFrame(dict(observations), index=[0])
 
 
+Buffer = Union[DataFrameBuffer, buffers.DeltaFrameBuffer,
+               buffers.RingFrameBuffer]
+"""Any of the buffers that a logger can record to."""
+
+
 class Logs(NamedTuple):
     """A container for the logs collected on an object.
 
@@ -239,8 +371,98 @@ class Logs(NamedTuple):
         layer object are "unit_act" or "unit_net".
 
     """
-    whole: pd.DataFrame
-    parts: pd.DataFrame
+    whole: "pd.DataFrame"
+    parts: "pd.DataFrame"
+
+
+class Aggregator:
+    """Aggregates the attributes of an object over a window of samples.
+
+    Args:
+      target: The object to sample.
+      whole_attrs: The whole attributes to aggregate.
+      parts_attrs: The parts attributes to aggregate.
+      how: The aggregate to compute. One of "mean", "min", or "max".
+
+    """
+
+    def __init__(self, target: ObservableMixin, whole_attrs: List[str],
+                 parts_attrs: List[str], how: str) -> None:
+        self.target = target
+        self.whole_attrs = whole_attrs
+        self.parts_attrs = parts_attrs
+        self.how = how
+        self.num_samples = 0
+        self._whole: Dict[str, float] = {}
+        self._parts: Dict[str, torch.Tensor] = {}
+
+    def sample(self) -> None:
+        """Adds the current attribute values to the window."""
+        for attr in self.whole_attrs:
+            value = float(self.target.observe_whole_attr(attr)[1])
+            if self.num_samples == 0:
+                self._whole[attr] = value
+            elif self.how == "mean":
+                self._whole[attr] += value
+            elif self.how == "min":
+                self._whole[attr] = min(self._whole[attr], value)
+            else:
+                self._whole[attr] = max(self._whole[attr], value)
+        for attr in self.parts_attrs:
+            tensor = self.target.observe_parts_tensor(attr)
+            if self.num_samples == 0:
+                self._parts[attr] = tensor.clone()
+            elif self.how == "mean":
+                self._parts[attr] += tensor
+            elif self.how == "min":
+                torch.min(self._parts[attr], tensor, out=self._parts[attr])
+            else:
+                torch.max(self._parts[attr], tensor, out=self._parts[attr])
+        self.num_samples += 1
+
+    def whole_observations(self) -> List[WholeObs]:
+        """Returns the aggregated whole attributes."""
+        if self.how == "mean":
+            return [(attr, value / self.num_samples)
+                    for attr, value in self._whole.items()]
+        return list(self._whole.items())
+
+    def parts_tensors(self) -> Dict[str, torch.Tensor]:
+        """Returns the aggregated parts attribute values."""
+        if self.how == "mean":
+            return {
+                attr: tensor / self.num_samples
+                for attr, tensor in self._parts.items()
+            }
+        return dict(self._parts)
+
+    def parts_observations(self) -> List[PartsObs]:
+        """Returns the aggregated parts attributes."""
+        return [
+            self.target.parts_obs_from_tensor(attr, tensor)
+            for attr, tensor in self.parts_tensors().items()
+        ]
+
+    def reset(self) -> None:
+        """Empties the window."""
+        self.num_samples = 0
+        self._whole = {}
+        self._parts = {}
+
+
+class Snapshot(NamedTuple):
+    """The values of a logger's attributes at one record.
+
+    Attributes:
+      whole (List[WholeObs]): The whole attribute observations.
+      parts (Dict[str, torch.Tensor]): The values of each parts attribute.
+      pooled (List[torch.Tensor]): The tensors in `parts` that were taken
+        from a `buffers.SnapshotPool`, and must be released once written.
+
+    """
+    whole: List[WholeObs]
+    parts: Dict[str, torch.Tensor]
+    pooled: List[torch.Tensor]
 
 
 class Logger(events.EventListenerMixin):
@@ -251,6 +473,11 @@ class Logger(events.EventListenerMixin):
             from `ObservableMixin`.
         attrs: A list of attribute names to log.
         freq: The frequency at which this logger should record.
+        writer: If given, records are written to the buffers by this writer's
+            background thread. The simulation thread then only copies the
+            values to record into snapshot tensors.
+        clock: If given, each record is stamped with the clock's counts,
+            which can then be queried with `query()`.
 
     Attrs:
         name (str): The name of the target object.
@@ -261,31 +488,183 @@ class Logger(events.EventListenerMixin):
     """
 
     def __init__(self, target: ObservableMixin, attrs: Iterable[str],
-                 freq: events.Frequency) -> None:
+                 freq: events.Frequency,
+                 writer: Optional[buffers.LogWriter] = None,
+                 clock: Optional[buffers.Clock] = None) -> None:
         self.target = target
         self.target_name = target.name
         self.whole_attrs = [i for i in attrs if i in target.whole_attrs]
         self.parts_attrs = [i for i in attrs if i in target.parts_attrs]
-        self.whole_buffer = DataFrameBuffer()
-        self.parts_buffer = DataFrameBuffer()
+        self.whole_buffer: Buffer
+        self.parts_buffer: Buffer
+        if target.spec.log_ring_size > 0:
+            ring_size = target.spec.log_ring_size
+            self.whole_buffer = buffers.RingFrameBuffer(ring_size)
+            self.parts_buffer = buffers.RingFrameBuffer(ring_size)
+        elif target.spec.log_keyframe_interval > 1:
+            self.whole_buffer = DataFrameBuffer()
+            self.parts_buffer = buffers.DeltaFrameBuffer(
+                target.spec.log_keyframe_interval, target.spec.log_delta_tol)
+        else:
+            self.whole_buffer = DataFrameBuffer()
+            self.parts_buffer = DataFrameBuffer()
         self.paused = False
         self.freq = freq
+        # The number of frequency periods that have ended
+        self.num_periods = 0
+        self.aggregator: Optional[Aggregator] = None
+        if freq.aggregate is not None:
+            self.aggregator = Aggregator(target, self.whole_attrs,
+                                         self.parts_attrs, freq.aggregate)
+        self.writer = writer
+        self.clock = clock
+        # The clock counts at each record time, starting at time
+        # self.stamps_offset (ring buffers drop the oldest stamps), stored as
+        # 64 bit integers
+        self.stamps: Dict[str, array.array] = {
+            c: array.array("q")
+            for c in buffers.Clock.COUNTERS
+        }
+        self.stamps_offset = 0
+        # Guards the stamps, which the writer's thread trims
+        self._stamps_lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_stamps_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._stamps_lock = threading.Lock()
 
     def record(self) -> None:
-        """Records the attributes to an internal buffer."""
+        """Records the attributes to an internal buffer.
+
+        If the frequency aggregates, the aggregates of the samples since the
+        last record are recorded instead of the current values (unless there
+        were no samples), and the samples are cleared.
+
+        With a writer, only a snapshot of the values is taken here, and the
+        buffers are updated on the writer's thread.
+
+        """
+        if self.clock is not None:
+            self._stamp()
+
+        if self.writer is not None:
+            self.writer.submit(self._write, self._snapshot())
+            return
+
         if self.paused:
+            self.whole_buffer.increment_time()
+            self.parts_buffer.increment_time()
+            if self.aggregator is not None:
+                self.aggregator.reset()
+            return
+
+        if self.aggregator is not None and self.aggregator.num_samples > 0:
+            whole_observations = self.aggregator.whole_observations()
+            parts_observations = self.aggregator.parts_observations()
+            self.aggregator.reset()
+        else:
+            whole_observations = [
+                self.target.observe_whole_attr(a) for a in self.whole_attrs
+            ]
+            parts_observations = [
+                self.target.observe_parts_attr(a) for a in self.parts_attrs
+            ]
+        self.whole_buffer.append(merge_whole_observations(whole_observations))
+        self.parts_buffer.append(merge_parts_observations(parts_observations))
+        self._trim_stamps()
+
+    def _stamp(self) -> None:
+        """Stamps the current record time with the clock's counts."""
+        assert self.clock is not None
+        with self._stamps_lock:
+            for counter, stamps in self.stamps.items():
+                stamps.append(self.clock.counts[counter])
+
+    def _trim_stamps(self) -> None:
+        """Drops the stamps of records that ring buffers no longer hold."""
+        capacity = self.target.spec.log_ring_size
+        # Trimming in batches keeps the amortized cost constant
+        if (self.clock is None or capacity == 0
+                or len(self.stamps["cycle"]) < 2 * capacity):
+            return
+        assert isinstance(self.whole_buffer, buffers.RingFrameBuffer)
+        assert isinstance(self.parts_buffer, buffers.RingFrameBuffer)
+        excess = min(self.whole_buffer.oldest_time(),
+                     self.parts_buffer.oldest_time()) - self.stamps_offset
+        if excess > 0:
+            with self._stamps_lock:
+                for stamps in self.stamps.values():
+                    del stamps[:excess]
+                self.stamps_offset += excess
+
+    def _snapshot(self) -> Optional[Snapshot]:
+        """Copies the values to record, or returns `None` if paused."""
+        assert self.writer is not None
+        if self.paused:
+            if self.aggregator is not None:
+                self.aggregator.reset()
+            return None
+
+        pooled: List[torch.Tensor] = []
+        if self.aggregator is not None and self.aggregator.num_samples > 0:
+            # The aggregates are fresh tensors, so they need no copy
+            whole = self.aggregator.whole_observations()
+            parts = self.aggregator.parts_tensors()
+            self.aggregator.reset()
+        else:
+            whole = [
+                self.target.observe_whole_attr(a) for a in self.whole_attrs
+            ]
+            parts = {}
+            for attr in self.parts_attrs:
+                parts[attr] = self.writer.pool.copy(
+                    self.target.observe_parts_tensor(attr))
+                pooled.append(parts[attr])
+        return Snapshot(whole, parts, pooled)
+
+    def _write(self, snapshot: Optional[Snapshot]) -> None:
+        """Writes a snapshot to the buffers."""
+        assert self.writer is not None
+        if snapshot is None:
             self.whole_buffer.increment_time()
             self.parts_buffer.increment_time()
             return
 
-        whole_observations = [
-            self.target.observe_whole_attr(a) for a in self.whole_attrs
-        ]
         parts_observations = [
-            self.target.observe_parts_attr(a) for a in self.parts_attrs
+            self.target.parts_obs_from_tensor(attr, tensor)
+            for attr, tensor in snapshot.parts.items()
         ]
-        self.whole_buffer.append(merge_whole_observations(whole_observations))
+        for tensor in snapshot.pooled:
+            self.writer.pool.release(tensor)
+        self.whole_buffer.append(merge_whole_observations(snapshot.whole))
         self.parts_buffer.append(merge_parts_observations(parts_observations))
+        self._trim_stamps()
+
+    def flush(self) -> None:
+        """Blocks until all records have been written to the buffers."""
+        if self.writer is not None:
+            self.writer.flush()
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the number of bytes held by the logger's buffers.
+
+        Returns:
+          A dict with the bytes of the whole attrs buffer ("whole_buffer"),
+          the parts attrs buffer ("parts_buffer"), and the clock stamps of
+          the records ("stamps").
+
+        """
+        self.flush()
+        return {
+            "whole_buffer": self.whole_buffer.nbytes(),
+            "parts_buffer": self.parts_buffer.nbytes(),
+            "stamps": sum(i.itemsize * len(i) for i in self.stamps.values())
+        }
 
     def to_logs(self) -> Logs:
         """Converts the internal buffer to a Logs object.
@@ -294,13 +673,116 @@ class Logger(events.EventListenerMixin):
           A Logs object containing the contents of the internal buffers.
 
         """
+        self.flush()
         return Logs(
             whole=self.whole_buffer.to_df(), parts=self.parts_buffer.to_df())
 
+    def whole_logs(self, start: Optional[int] = None) -> "pd.DataFrame":
+        """Converts the whole attrs buffer to a DataFrame.
+
+        Unlike `to_logs()`, the parts logs are not built.
+
+        Args:
+          start: If given, only the records from this time on are built.
+
+        Returns:
+          A DataFrame with the whole attrs records.
+
+        """
+        self.flush()
+        return self.whole_buffer.to_df(start)
+
+    def _add_stamps(self, df: "pd.DataFrame") -> None:
+        """Adds a column with the clock count at each row's time."""
+        if df.empty:
+            for counter in buffers.Clock.COUNTERS:
+                df[counter] = np.zeros(0, dtype=np.int64)
+            return
+        times = df["time"].to_numpy() - self.stamps_offset
+        first = int(times.min())
+        for counter, stamps in self.stamps.items():
+            window = np.asarray(stamps[first:int(times.max()) + 1])
+            df[counter] = window[times - first]
+
+    def query(self,
+              attrs: Iterable[str],
+              time_range: TimeRange = (None, None),
+              index: str = "time",
+              units: Optional[Iterable[int]] = None) -> Logs:
+        """Retrieves a slice of the logs.
+
+        Only the records within the time range are built, so this is cheaper
+        than `to_logs()` when the range is small. If the logger has a clock,
+        each row also gets "cycle", "trial", "epoch", and "batch" columns,
+        with the clock counts when it was recorded.
+
+        Args:
+          attrs: The attributes to retrieve.
+          time_range: The first time to retrieve, and the time after the last
+            one. Either can be `None` to leave the range open on that side.
+          index: What the time range is measured in. Either "time" for the
+            logger's own record times, or one of the clock counters.
+          units: If given, only the parts rows of these units are retrieved.
+
+        Returns:
+          A Logs object with the requested columns, plus the time and part
+          index columns.
+
+        Raises:
+          ValueError: If an attribute is not logged by this logger, if the
+            index is invalid, or if `units` is given but the parts logs have
+            no "unit" column.
+
+        """
+        attrs = list(attrs)
+        for attr in attrs:
+            if attr not in self.whole_attrs and attr not in self.parts_attrs:
+                raise ValueError("{0} is not logged at frequency {1}.".format(
+                    attr, self.freq.name))
+        if index not in ("time", ) + (buffers.Clock.COUNTERS
+                                      if self.clock is not None else ()):
+            raise ValueError("Cannot index logs by {0}.".format(index))
+
+        self.flush()
+        start, stop = time_range
+        if index != "time":
+            lo, hi = buffers.time_slice(self.stamps[index], start, stop)
+            start, stop = lo + self.stamps_offset, hi + self.stamps_offset
+
+        whole = self.whole_buffer.to_df(start, stop)
+        whole_columns = [a for a in self.whole_attrs if a in attrs]
+        whole = whole.reindex(columns=whole_columns + ["time"])
+
+        parts = self.parts_buffer.to_df(start, stop)
+        logged = [self.target.parts_column(a) for a in self.parts_attrs]
+        requested = [
+            self.target.parts_column(a) for a in self.parts_attrs
+            if a in attrs
+        ]
+        parts = parts[[
+            c for c in parts.columns if c not in logged or c in requested
+        ]]
+        if units is not None and not parts.empty:
+            if "unit" not in parts.columns:
+                raise ValueError("The parts logs of {0} have no units.".format(
+                    self.target_name))
+            parts = parts[parts["unit"].isin(list(units))]
+        parts = parts.reset_index(drop=True)
+
+        if self.clock is not None:
+            self._add_stamps(whole)
+            self._add_stamps(parts)
+        return Logs(whole=whole, parts=parts)
+
     def handle(self, event: events.Event) -> None:
         """Overrides `events.EventListnerMixin.handle()`."""
+        if (self.aggregator is not None and not self.paused
+                and isinstance(event, self.freq.sample_event_type)):
+            self.aggregator.sample()
         if isinstance(event, self.freq.end_event_type):
-            self.record()
+            self.num_periods += 1
+            if self.num_periods % self.freq.stride == 0:
+                self.record()
         elif isinstance(event, events.PauseLogging):
             if event.freq == self.freq:
                 self.paused = True
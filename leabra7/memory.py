@@ -0,0 +1,73 @@
+"""Tools to account for the memory used by a network."""
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd  # type: ignore
+
+
+class MemoryRecord(NamedTuple):
+    """The memory used by one component of one object.
+
+    Attributes:
+      obj (str): The name of the object.
+      kind (str): The kind of object, e.g. "layer", "projn", or "logger".
+      component (str): The name of the component, e.g. "wts".
+      nbytes (int): The number of bytes used by the component.
+
+    """
+    obj: str
+    kind: str
+    component: str
+    nbytes: int
+
+
+class MemoryReport:
+    """A report of the memory used by each component of a network.
+
+    Args:
+      records: The memory records.
+
+    """
+
+    def __init__(self, records: List[MemoryRecord]) -> None:
+        self.records = records
+
+    @property
+    def total(self) -> int:
+        """The total number of bytes used by all components."""
+        return sum(r.nbytes for r in self.records)
+
+    def totals_by_obj(self) -> Dict[str, int]:
+        """Returns the total number of bytes used by each object."""
+        totals: Dict[str, int] = {}
+        for r in self.records:
+            totals[r.obj] = totals.get(r.obj, 0) + r.nbytes
+        return totals
+
+    def totals_by_kind(self) -> Dict[str, int]:
+        """Returns the total number of bytes used by each kind of object."""
+        totals: Dict[str, int] = {}
+        for r in self.records:
+            totals[r.kind] = totals.get(r.kind, 0) + r.nbytes
+        return totals
+
+    def to_df(self) -> "pd.DataFrame":
+        """Returns a DataFrame with one row per record."""
+        import pandas as pd  # type: ignore
+        return pd.DataFrame(self.records, columns=MemoryRecord._fields)
+
+    def __str__(self) -> str:
+        lines = [
+            "{0:<30} {1:<8} {2:<14} {3:>16}".format("obj", "kind",
+                                                  "component", "bytes")
+        ]
+        for r in sorted(self.records, key=lambda r: r.nbytes, reverse=True):
+            lines.append("{0:<30} {1:<8} {2:<14} {3:>16,d}".format(
+                r.obj, r.kind, r.component, r.nbytes))
+        for kind, nbytes in sorted(self.totals_by_kind().items()):
+            lines.append("{0:<54} {1:>16,d}".format("total " + kind, nbytes))
+        lines.append("{0:<54} {1:>16,d}".format("total", self.total))
+        return "\n".join(lines)
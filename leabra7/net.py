@@ -1,28 +1,79 @@
 """A network."""
+import contextlib
+from typing import ContextManager
 from typing import Dict
+from typing import Iterator
 from typing import List
+from typing import Optional
 from typing import Sequence
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import TypeVar
+from typing import Union
 
 import pickle
-import pandas as pd  # type: ignore
 
+import numpy as np  # type: ignore
+import torch  # type: ignore
+
+from leabra7 import buffers
+from leabra7 import cache
 from leabra7 import layer
 from leabra7 import log
 from leabra7 import events
+from leabra7 import memory
+from leabra7 import profiling
 from leabra7 import projn
+from leabra7 import rand
+from leabra7 import simulation
 from leabra7 import specs
 
+if TYPE_CHECKING:
+    import pandas as pd  # type: ignore
+
+InstrumenterT = TypeVar('InstrumenterT', bound=profiling.Instrumenter)
+
+
+class Net(simulation.SimulationMixin, events.EventListenerMixin):
+    """A leabra7 network. This is the main class.
+
+    Args:
+        seed: The seed for the network's random numbers. Each object derives
+            its own seed from this one and its name, so results do not depend
+            on the order in which objects are created. If `None`, random
+            numbers are drawn from torch's global generator.
+        async_logging: Whether loggers write their records on a background
+            thread. The simulation then only copies the values to record,
+            and `logs()` waits for the pending records to be written.
+        log_queue_size: With `async_logging`, the maximum number of records
+            waiting to be written before the simulation blocks.
 
-class Net(events.EventListenerMixin):
-    """A leabra7 network. This is the main class."""
+    """
 
-    def __init__(self) -> None:
+    def __init__(self,
+                 seed: int = None,
+                 async_logging: bool = False,
+                 log_queue_size: int = 64) -> None:
         """Initializes network object."""
+        self.seed = seed
+        self.log_writer: Optional[buffers.LogWriter] = None
+        if async_logging:
+            self.log_writer = buffers.LogWriter(log_queue_size)
+        # The number of epochs run with self.run_epoch()
+        self.num_epochs_run = 0
         # Each of the following dicts is keyed by the name of the object
         self.objs: Dict[str, events.EventListenerMixin] = {}
         self.layers: Dict[str, layer.Layer] = {}
         self.projns: Dict[str, projn.Projn] = {}
         self.loggers: List[log.Logger] = []
+        # The loggers keyed by frequency name and object name
+        self.loggers_by_key: Dict[Tuple[str, str], log.Logger] = {}
+        # Counts the periods run, to stamp the log records with
+        self.clock = buffers.Clock()
+        # Stores the end states of trials run with self.trial(), if enabled
+        self.settle_cache: Optional[cache.SettleCache] = None
+        # The layer states saved with self.save_state(), by name
+        self.saved_states: Dict[str, cache.TrialStates] = {}
 
     def _validate_obj_name(self, name: str) -> None:
         """Checks if a name exists within the objects dict.
@@ -78,8 +129,10 @@ class Net(events.EventListenerMixin):
         for freq_name, freq in events.Frequency.registry.items():
             attrs_to_log = obj.spec.attrs_to_log(freq)
             if attrs_to_log:
-                logger = log.Logger(obj, attrs_to_log, freq)
+                logger = log.Logger(obj, attrs_to_log, freq,
+                                    self.log_writer, self.clock)
                 self.loggers.append(logger)
+                self.loggers_by_key[(freq_name, obj.name)] = logger
                 self.objs["{0}_{1}_logger".format(obj.name,
                                                   freq_name)] = logger
 
@@ -103,10 +156,18 @@ class Net(events.EventListenerMixin):
 
         """
         loaded_net = pickle.load(open(filename, "rb"))
+        self.seed = getattr(loaded_net, "seed", None)
+        self.log_writer = getattr(loaded_net, "log_writer", None)
+        self.num_epochs_run = getattr(loaded_net, "num_epochs_run", 0)
         self.objs = loaded_net.objs
         self.layers = loaded_net.layers
         self.projns = loaded_net.projns
         self.loggers = loaded_net.loggers
+        self.loggers_by_key = {(i.freq.name, i.target_name): i
+                               for i in self.loggers}
+        self.clock = getattr(loaded_net, "clock", buffers.Clock())
+        self.settle_cache = getattr(loaded_net, "settle_cache", None)
+        self.saved_states = getattr(loaded_net, "saved_states", {})
 
     def new_layer(self, name: str, size: int,
                   spec: specs.LayerSpec = None) -> None:
@@ -120,6 +181,7 @@ class Net(events.EventListenerMixin):
         Raises:
             spec.ValidationError: If the spec contains an invalid parameter
                 value.
+            ValueError: If `spec.log_units` does not fit the layer size.
 
         """
         if spec is not None:
@@ -129,38 +191,6 @@ class Net(events.EventListenerMixin):
         self.objs[name] = lr
         self._add_loggers(lr)
 
-    def clamp_layer(self, name: str, acts: Sequence[float]) -> None:
-        """Clamps the layer's activations.
-
-        After forcing, the layer's activations will be set to the values
-        contained in `acts` and will not change from cycle to cycle.
-
-        Args:
-            name: The name of the layer.
-            acts: A sequence containing the activations that the layer's
-                units will be clamped to. If its length is less than the number
-                of units in the layer, it will be tiled. If its length is
-                greater, the extra values will be ignored.
-
-        ValueError: If `name` does not match any existing layer name.
-
-        """
-        self._validate_layer_name(name)
-        self.handle(events.HardClamp(name, acts))
-
-    def unclamp_layer(self, name: str) -> None:
-        """Unclamps the layer's activations.
-
-        After unclamping, the layer's activations will be
-        updated each cycle.
-
-        Args:
-            name: The name of the layer to unclamp.
-
-        """
-        self._validate_layer_name(name)
-        self.handle(events.Unclamp(name))
-
     def new_projn(self,
                   name: str,
                   pre: str,
@@ -186,74 +216,14 @@ class Net(events.EventListenerMixin):
 
         pre_lr = self._get_layer(pre)
         post_lr = self._get_layer(post)
-        pr = projn.Projn(name, pre_lr, post_lr, spec)
+        seed = None
+        if self.seed is not None:
+            seed = rand.derive_seed(self.seed, name)
+        pr = projn.Projn(name, pre_lr, post_lr, spec, seed)
         self.projns[name] = pr
         self.objs[name] = pr
         self._add_loggers(pr)
 
-    def _cycle(self) -> None:
-        """Cycles the network (triggered by cycle event)."""
-        for _, lr in self.layers.items():
-            lr.activation_cycle()
-
-        for _, pr in self.projns.items():
-            pr.flush()
-
-    def cycle(self) -> None:
-        """Cycles the network."""
-        self.handle(events.Cycle())
-
-    def minus_phase_cycle(self, num_cycles: int = 50) -> None:
-        """Runs a series of cycles for the trial minus phase.
-
-        A minus phase is the trial phase where target values are not clamped
-        output layers. Clamping the values on the output layers is the user's
-        responsibility.
-
-        Args:
-          num_cycles: The number of cycles to run.
-
-        Raises:
-          ValueError: If num_cycles is less than 1.
-
-        """
-        if num_cycles < 1:
-            raise ValueError("Number of cycles must be >= 1.")
-        self.handle(events.BeginMinusPhase())
-        for _ in range(num_cycles):
-            self.handle(events.Cycle())
-        self.handle(events.EndMinusPhase())
-
-    def plus_phase_cycle(self, num_cycles: int = 25) -> None:
-        """Runs a series of cycles for the trial plus phase.
-
-        A plus phase is the trial phase where target values are clamped on
-        output layers. Clamping the values on the output layers is the user's
-        responsibility.
-
-        Args:
-          num_cycles: The number of cycles to run.
-
-        Raises:
-          ValueError: If num_cycles is less than 1.
-
-        """
-        if num_cycles < 1:
-            raise ValueError("Number of cycles must be >= 1.")
-        self.handle(events.BeginPlusPhase())
-        for _ in range(num_cycles):
-            self.handle(events.Cycle())
-        self.handle(events.EndPlusPhase())
-        self.handle(events.EndTrial())
-
-    def end_epoch(self) -> None:
-        """Signals to the network that an epoch has ended."""
-        self.handle(events.EndEpoch())
-
-    def end_batch(self) -> None:
-        """Signals to the network that a batch has ended."""
-        self.handle(events.EndBatch())
-
     def pause_logging(self, freq: str = None) -> None:
         """Pauses logging in the network.
 
@@ -288,11 +258,7 @@ class Net(events.EventListenerMixin):
         else:
             self.handle(events.ResumeLogging(freq))
 
-    def learn(self) -> None:
-        """Updates projection weights with XCAL learning equation."""
-        self.handle(events.Learn())
-
-    def observe(self, name: str, attr: str) -> pd.DataFrame:
+    def observe(self, name: str, attr: str) -> "pd.DataFrame":
         """Observes an attribute of an object in the network.
 
         This is like logging, but it only returns the current object state.
@@ -311,17 +277,142 @@ class Net(events.EventListenerMixin):
         Returns:
           A dataframe containing the observation value.
 
+        """
+        return self._get_observable(name).observe(attr)
+
+    def observe_array(self, name: str, attr: str, as_tensor: bool = False
+                      ) -> Union[np.ndarray, torch.Tensor]:
+        """Observes an attribute of an object as an array.
+
+        This is like `observe()`, but the values are not converted to Python
+        objects or wrapped in a dataframe, so it is much cheaper to call every
+        trial. Parts attributes are ordered like the rows returned by
+        `observe()`.
+
+        Args:
+          name: The name of the object.
+          attr: The attr to observe. This can be any attribute that is valid to
+            log on the object, as defined in the object spec.
+          as_tensor: If true, returns a tensor clone of the values. Otherwise,
+            returns a read-only numpy view of them, which may change as the
+            network runs (copy it to keep it).
+
+        Raises:
+          ValueError: if the object does not exist, does not support
+            observations, or the attribute is not a valid loggable attribute.
+
+        Returns:
+          The observation. Whole attributes are zero dimensional, and parts
+          attributes have one value for each part.
+
+        """
+        return self._get_observable(name).observe_array(attr, as_tensor)
+
+    def observe_arrays(self, name: str, attrs: Sequence[str],
+                       as_tensor: bool = False
+                       ) -> Dict[str, Union[np.ndarray, torch.Tensor]]:
+        """Observes several attributes of an object as arrays.
+
+        Args:
+          name: The name of the object.
+          attrs: The attrs to observe.
+          as_tensor: See `observe_array()`.
+
+        Raises:
+          ValueError: if the object does not exist, does not support
+            observations, or any attribute is not a valid loggable attribute.
+
+        Returns:
+          A dict mapping each attribute to its observation, as returned by
+          `observe_array()`.
+
+        """
+        obj = self._get_observable(name)
+        return {attr: obj.observe_array(attr, as_tensor) for attr in attrs}
+
+    def _get_observable(self, name: str) -> log.ObservableMixin:
+        """Gets an observable object by name.
+
+        Args:
+          name: The name of the object.
+
+        Raises:
+          ValueError: if the object does not exist or does not support
+            observations.
+
         """
         try:
             obj = self.objs[name]
             # We use isinstance instead of catching AttributeError for MyPy
             if isinstance(obj, log.ObservableMixin):
-                return obj.observe(attr)
+                return obj
             raise ValueError(
                 "Object {0} does not support observations.".format(name))
         except KeyError:
             raise ValueError("No object with name {0} found.".format(name))
 
+    def memory_report(self) -> memory.MemoryReport:
+        """Reports the memory used by the network's tensors and log buffers.
+
+        Layers report their unit state and their own buffers, projections
+        report their weights, fast weights and mask separately, loggers
+        report their whole and parts buffers, and the settle cache (if
+        enabled) reports the states it stores.
+
+        Returns:
+          A `memory.MemoryReport`, with one record per component.
+
+        """
+        records: List[memory.MemoryRecord] = []
+        for name, obj in self.objs.items():
+            if isinstance(obj, layer.Layer):
+                kind = "layer"
+            elif isinstance(obj, projn.Projn):
+                kind = "projn"
+            elif isinstance(obj, log.Logger):
+                kind = "logger"
+            else:
+                continue
+            for component, nbytes in obj.memory_usage().items():
+                records.append(
+                    memory.MemoryRecord(name, kind, component, nbytes))
+        if self.settle_cache is not None:
+            records.append(
+                memory.MemoryRecord("settle_cache", "cache", "states",
+                                    self.settle_cache.nbytes()))
+        if self.saved_states:
+            records.append(
+                memory.MemoryRecord("saved_states", "cache", "states",
+                                    cache.states_nbytes(self.saved_states)))
+        return memory.MemoryReport(records)
+
+    def flush_logs(self) -> None:
+        """Blocks until every pending log record has been written.
+
+        This is only needed with `async_logging`, e.g. to time a run
+        including its logging. `logs()` flushes by itself.
+
+        Raises:
+          Exception: Any exception raised while writing a record.
+
+        """
+        if self.log_writer is not None:
+            self.log_writer.flush()
+
+    def close(self) -> None:
+        """Writes the pending log records and stops the log writer thread.
+
+        This is only needed with `async_logging`. The thread is also stopped
+        when the network is garbage collected, and logging again after
+        closing starts a new thread.
+
+        Raises:
+          Exception: Any exception raised while writing a record.
+
+        """
+        if self.log_writer is not None:
+            self.log_writer.close()
+
     def logs(self, freq: str, name: str) -> log.Logs:
         """Retrieves logs for an object in the network.
 
@@ -335,16 +426,162 @@ class Net(events.EventListenerMixin):
                 recorded for the desired object.
 
         """
-        freq_obj = events.Frequency.from_name(freq)
+        self.flush_logs()
+        return self._get_logger(freq, name).to_logs()
+
+    def query_logs(self,
+                   freq: str,
+                   name: str,
+                   attrs: Sequence[str],
+                   time_range: log.TimeRange = (None, None),
+                   index: str = "time",
+                   units: Sequence[int] = None) -> log.Logs:
+        """Retrieves a slice of the logs for an object in the network.
+
+        Only the requested records are built, instead of the whole history.
+        Each row has "cycle", "trial", "epoch", and "batch" columns with the
+        number of each period that ended before the event that triggered the
+        record, so logs taken at different frequencies can be joined. The
+        triggering period is not counted yet, so a record's column for its
+        own frequency is the zero-based index of the period it records: the
+        first cycle record has cycle 0, and the record at the end of the
+        first trial has trial 0 and counts the cycles of that trial.
+
+        Args:
+            freq: The frequency at which the desired logs were recorded.
+            name: The name of the object for which the logs were recorded.
+            attrs: The attributes to retrieve.
+            time_range: The first time to retrieve, and the time after the
+                last one. Either can be `None` to leave the range open on
+                that side.
+            index: What the time range is measured in. Either "time" for the
+                "time" column of `logs()`, or one of "cycle", "trial",
+                "epoch", or "batch".
+            units: If given, only the parts rows of these units are
+                retrieved. Only layer logs have units.
+
+        Returns:
+            A Logs object with the requested attributes, plus the time and
+            part index columns.
+
+        Raises:
+            ValueError: If the frequency name is invalid, if no logs were
+                recorded for the desired object, if an attribute is not
+                logged at the frequency, if the index is invalid, or if
+                `units` is given for an object without units.
+
+        """
+        self.flush_logs()
+        return self._get_logger(freq, name).query(attrs, time_range, index,
+                                                  units)
+
+    def _get_logger(self, freq: str, name: str) -> log.Logger:
+        """Finds the logger for an object at a frequency.
+
+        Raises:
+            ValueError: If the frequency name is invalid, or if no logs were
+                recorded for the desired object.
+
+        """
+        events.Frequency.from_name(freq)
         try:
-            logger = next(i for i in self.loggers
-                          if i.freq == freq_obj and i.target_name == name)
-        except StopIteration:
+            return self.loggers_by_key[(freq, name)]
+        except KeyError:
             raise ValueError(
                 "No logs recorded for object {0}, frequency {1}.".format(
                     name, freq))
 
-        return logger.to_logs()
+    @contextlib.contextmanager
+    def _instrument(self,
+                    instrumenter: InstrumenterT) -> Iterator[InstrumenterT]:
+        """Instruments the network's hot paths within a `with` block.
+
+        Args:
+          instrumenter: The instrumenter with which to wrap the hot paths.
+
+        Yields:
+          The instrumenter.
+
+        Raises:
+          RuntimeError: If the network is already instrumented.
+
+        """
+        if "handle" in self.__dict__:
+            raise RuntimeError("The network is already being profiled or "
+                               "traced.")
+        for name, obj in self.objs.items():
+            if isinstance(obj, layer.Layer):
+                instrumenter.instrument(obj, name, "activation_cycle")
+            elif isinstance(obj, projn.Projn):
+                instrumenter.instrument(obj, name, "flush")
+                instrumenter.instrument(obj, name, "learn")
+            elif isinstance(obj, log.Logger):
+                instrumenter.instrument(obj, name, "record")
+        instrumenter.watch_events(self)
+        try:
+            yield instrumenter
+        finally:
+            instrumenter.restore()
+
+    def profile(self) -> ContextManager[profiling.Profiler]:
+        """Profiles the network's hot paths within a `with` block.
+
+        While the block runs, we record the calls and wall time of each
+        layer's activation cycle, each projection's flush and learning, and
+        each logger's record, as well as the number of cycles and trials. When
+        profiling is not active, it costs nothing.
+
+        Objects added to the network inside the block are not profiled, and
+        the network cannot be saved while profiling.
+
+        Example:
+
+            with net.profile() as prof:
+                net.minus_phase_cycle()
+            print(prof.report())
+
+        Returns:
+          A context manager that yields the profiler. Call its `report()`
+          method to get a sortable `profiling.ProfileReport`.
+
+        Raises:
+          RuntimeError: If the network is already being profiled or traced.
+
+        """
+        return self._instrument(profiling.Profiler())
+
+    @contextlib.contextmanager
+    def trace(self, filename: str = None) -> Iterator[profiling.Tracer]:
+        """Traces the network's timeline within a `with` block.
+
+        Phases, events, and the same per-object work as `Net.profile()` are
+        recorded as nested spans, along with calls to `Net.logs()`. The
+        result is in Chrome Trace Event format, so it can be opened in
+        chrome://tracing or another trace viewer.
+
+        Objects added to the network inside the block are not traced, and
+        the network cannot be saved while tracing.
+
+        Args:
+          filename: If provided, the trace is saved to this file when the
+            block exits.
+
+        Yields:
+          The tracer. Call its `save()` or `to_json()` method to get the
+          trace.
+
+        Raises:
+          RuntimeError: If the network is already being profiled or traced.
+
+        """
+        tracer = profiling.Tracer()
+        with self._instrument(tracer):
+            tracer.instrument(self, "net", "logs")
+            try:
+                yield tracer
+            finally:
+                if filename is not None:
+                    tracer.save(filename)
 
     def handle(self, event: events.Event) -> None:
         """Overrides events.EventListnerMixin.handle()"""
@@ -353,3 +590,6 @@ class Net(events.EventListenerMixin):
 
         for _, obj in self.objs.items():
             obj.handle(event)
+        # Counted after the loggers record, so records are stamped with the
+        # periods that ended before the event
+        self.clock.handle(event)
@@ -0,0 +1,349 @@
+"""Tools to measure where the network spends its time."""
+import abc
+import json
+import os
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+from leabra7 import events
+
+if TYPE_CHECKING:
+    import pandas as pd  # type: ignore
+
+
+class Timing:
+    """Accumulates the calls and wall time of one method on one object."""
+
+    __slots__ = ("calls", "total")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total = 0.0
+
+
+class ProfileRecord(NamedTuple):
+    """The timing of one method on one object.
+
+    Attributes:
+      obj (str): The name of the object.
+      method (str): The name of the method.
+      calls (int): The number of times the method was called.
+      total (float): The total wall time spent in the method, in seconds.
+      mean (float): The mean wall time per call, in seconds.
+
+    """
+    obj: str
+    method: str
+    calls: int
+    total: float
+    mean: float
+
+
+class ProfileReport:
+    """A report of the time spent in each profiled method.
+
+    Args:
+      records: The timing records.
+      wall_time: The wall time covered by the report, in seconds.
+      num_cycles: The number of cycles run while profiling.
+      num_trials: The number of trials run while profiling.
+
+    """
+
+    def __init__(self, records: List[ProfileRecord], wall_time: float,
+                 num_cycles: int, num_trials: int) -> None:
+        self.records = records
+        self.wall_time = wall_time
+        self.num_cycles = num_cycles
+        self.num_trials = num_trials
+
+    @property
+    def cycles_per_sec(self) -> float:
+        """The number of cycles run per second of wall time."""
+        if self.wall_time == 0:
+            return 0.0
+        return self.num_cycles / self.wall_time
+
+    @property
+    def trials_per_sec(self) -> float:
+        """The number of trials run per second of wall time."""
+        if self.wall_time == 0:
+            return 0.0
+        return self.num_trials / self.wall_time
+
+    def sorted(self, by: str = "total",
+               descending: bool = True) -> "ProfileReport":
+        """Sorts the records.
+
+        Args:
+          by: The record field to sort by. One of "obj", "method", "calls",
+            "total", or "mean".
+          descending: Whether to sort in descending order.
+
+        Returns:
+          A new report with sorted records.
+
+        Raises:
+          ValueError: If `by` is not a record field.
+
+        """
+        if by not in ProfileRecord._fields:
+            raise ValueError("Cannot sort by {0}.".format(by))
+        records = sorted(
+            self.records, key=lambda r: getattr(r, by), reverse=descending)
+        return ProfileReport(records, self.wall_time, self.num_cycles,
+                             self.num_trials)
+
+    def to_df(self) -> "pd.DataFrame":
+        """Returns a DataFrame with one row per record."""
+        import pandas as pd  # type: ignore
+        return pd.DataFrame(self.records, columns=ProfileRecord._fields)
+
+    def __str__(self) -> str:
+        lines = [
+            "{0:<30} {1:<20} {2:>10} {3:>12} {4:>12}".format(
+                "obj", "method", "calls", "total (s)", "mean (s)")
+        ]
+        for r in self.records:
+            lines.append(
+                "{0:<30} {1:<20} {2:>10d} {3:>12.6f} {4:>12.6f}".format(
+                    r.obj, r.method, r.calls, r.total, r.mean))
+        lines.append("{0} cycles in {1:.6f} s ({2:.1f} cycles/s, "
+                     "{3:.1f} trials/s)".format(
+                         self.num_cycles, self.wall_time, self.cycles_per_sec,
+                         self.trials_per_sec))
+        return "\n".join(lines)
+
+
+class Instrumenter(metaclass=abc.ABCMeta):
+    """Base class for tools that wrap methods on network objects.
+
+    Methods are instrumented by shadowing them with wrappers on the instance,
+    so uninstrumented objects pay nothing at all. Call `restore()` to remove
+    the wrappers.
+
+    """
+
+    def __init__(self) -> None:
+        self._instrumented: List[Tuple[Any, str]] = []
+
+    def shadow(self, obj: Any, method: str, wrapper: Callable) -> None:
+        """Shadows a method on an object with a wrapper.
+
+        Args:
+          obj: The object.
+          method: The name of the method.
+          wrapper: The callable to use in place of the method.
+
+        """
+        setattr(obj, method, wrapper)
+        self._instrumented.append((obj, method))
+
+    @abc.abstractmethod
+    def instrument(self, obj: Any, obj_name: str, method: str) -> None:
+        """Records every call to a method of an object.
+
+        Args:
+          obj: The object.
+          obj_name: The name to use for the object in the output.
+          method: The name of the method to record.
+
+        """
+
+    @abc.abstractmethod
+    def watch_events(self, obj: Any, method: str = "handle") -> None:
+        """Records the events passing through an event handler.
+
+        Args:
+          obj: The object whose event handler to wrap.
+          method: The name of the event handler method.
+
+        """
+
+    def restore(self) -> None:
+        """Removes all instrumentation."""
+        for obj, method in reversed(self._instrumented):
+            delattr(obj, method)
+        self._instrumented = []
+
+
+class Profiler(Instrumenter):
+    """Accumulates the calls and wall time of methods on network objects."""
+
+    def __init__(self) -> None:
+        self.timings: Dict[Tuple[str, str], Timing] = {}
+        self.num_cycles = 0
+        self.num_trials = 0
+        self.start_time = time.perf_counter()
+        self.stop_time: Optional[float] = None
+        super().__init__()
+
+    def instrument(self, obj: Any, obj_name: str, method: str) -> None:
+        """Overrides `Instrumenter.instrument()`."""
+        original = getattr(obj, method)
+        timing = self.timings.setdefault((obj_name, method), Timing())
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                timing.total += time.perf_counter() - start
+                timing.calls += 1
+
+        self.shadow(obj, method, timed)
+
+    def watch_events(self, obj: Any, method: str = "handle") -> None:
+        """Overrides `Instrumenter.watch_events()`.
+
+        Counts the cycles and trials.
+
+        """
+        original: Callable[[events.Event], None] = getattr(obj, method)
+
+        def counted(event: events.Event) -> None:
+            if isinstance(event, events.Cycle):
+                self.num_cycles += 1
+            elif isinstance(event, events.EndTrial):
+                self.num_trials += 1
+            original(event)
+
+        self.shadow(obj, method, counted)
+
+    def restore(self) -> None:
+        """Extends `Instrumenter.restore()`, also stopping the wall clock."""
+        super().restore()
+        self.stop_time = time.perf_counter()
+
+    def report(self) -> ProfileReport:
+        """Returns a report of the timings, sorted by total time.
+
+        This can be called while profiling is still running.
+
+        """
+        stop_time = self.stop_time
+        if stop_time is None:
+            stop_time = time.perf_counter()
+        records = [
+            ProfileRecord(
+                obj=obj,
+                method=method,
+                calls=t.calls,
+                total=t.total,
+                mean=t.total / t.calls if t.calls else 0.0)
+            for (obj, method), t in self.timings.items()
+        ]
+        return ProfileReport(records, stop_time - self.start_time,
+                             self.num_cycles, self.num_trials).sorted()
+
+
+# Events that open and close a named span in a trace
+_SPAN_BEGINNINGS = {
+    events.BeginMinusPhase: "minus_phase",
+    events.BeginPlusPhase: "plus_phase"
+}
+_SPAN_ENDINGS = {
+    events.EndMinusPhase: "minus_phase",
+    events.EndPlusPhase: "plus_phase"
+}
+
+
+class Tracer(Instrumenter):
+    """Records a timeline of network events in Chrome Trace Event format.
+
+    Phases become spans that open and close with their begin and end events,
+    every other event becomes a span covering its handling, and each call to
+    an instrumented method becomes a span nested inside the event that
+    triggered it. The output can be opened in chrome://tracing or any other
+    viewer that reads the Trace Event format.
+
+    """
+
+    def __init__(self) -> None:
+        self.trace_events: List[Dict[str, Any]] = []
+        self._pid = os.getpid()
+        self._start_time = time.perf_counter()
+        super().__init__()
+
+    def _timestamp(self) -> float:
+        """Returns the microseconds elapsed since the tracer was created."""
+        return (time.perf_counter() - self._start_time) * 1e6
+
+    def _add(self, name: str, cat: str, ph: str, ts: float,
+             **kwargs: Any) -> None:
+        """Adds an event to the trace."""
+        self.trace_events.append(
+            dict(
+                name=name,
+                cat=cat,
+                ph=ph,
+                ts=ts,
+                pid=self._pid,
+                tid=threading.get_ident(),
+                **kwargs))
+
+    def instrument(self, obj: Any, obj_name: str, method: str) -> None:
+        """Overrides `Instrumenter.instrument()`."""
+        original = getattr(obj, method)
+        name = "{0}.{1}".format(obj_name, method)
+
+        def traced(*args: Any, **kwargs: Any) -> Any:
+            start = self._timestamp()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self._add(
+                    name, method, "X", start, dur=self._timestamp() - start)
+
+        self.shadow(obj, method, traced)
+
+    def watch_events(self, obj: Any, method: str = "handle") -> None:
+        """Overrides `Instrumenter.watch_events()`."""
+        original: Callable[[events.Event], None] = getattr(obj, method)
+
+        def traced(event: events.Event) -> None:
+            event_type = type(event)
+            if event_type in _SPAN_BEGINNINGS:
+                self._add(_SPAN_BEGINNINGS[event_type], "phase", "B",
+                          self._timestamp())
+                original(event)
+            elif event_type in _SPAN_ENDINGS:
+                original(event)
+                self._add(_SPAN_ENDINGS[event_type], "phase", "E",
+                          self._timestamp())
+            else:
+                start = self._timestamp()
+                original(event)
+                self._add(
+                    event_type.__name__,
+                    "event",
+                    "X",
+                    start,
+                    dur=self._timestamp() - start)
+
+        self.shadow(obj, method, traced)
+
+    def to_json(self) -> str:
+        """Returns the trace as a Chrome Trace Event JSON string."""
+        return json.dumps({
+            "traceEvents": self.trace_events,
+            "displayTimeUnit": "ms"
+        })
+
+    def save(self, filename: str) -> None:
+        """Saves the trace as a Chrome Trace Event JSON file.
+
+        Args:
+          filename: Where to save the trace.
+
+        """
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
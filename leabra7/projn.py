@@ -1,17 +1,22 @@
 """A connection between layers."""
+import concurrent.futures
 import itertools
 import math
+from typing import Dict
 from typing import TypeVar
 from typing import Iterable
 from typing import List
+from typing import Optional
 from typing import Tuple
 
+import numpy as np  # type: ignore
 import torch  # type: ignore
 
 from leabra7 import specs
 from leabra7 import layer
 from leabra7 import log
 from leabra7 import events
+from leabra7 import rand
 
 T = TypeVar('T')
 
@@ -31,8 +36,30 @@ def tile(length: int, xs: Iterable[T]) -> List[T]:
     return list(itertools.islice(itertools.cycle(xs), length))
 
 
-def expand_layer_mask_full(pre_mask: List[bool],
-                           post_mask: List[bool]) -> torch.ByteTensor:
+def tile_mask(length: int, mask: Iterable[bool]) -> torch.Tensor:
+    """Tiles a layer mask into a boolean tensor.
+
+    This is a vectorized version of `tile()` for the projection masks, which
+    can be as long as the layer.
+
+    Args:
+        length: The length to tile the mask to.
+        mask: The mask to tile.
+
+    Returns:
+        A 1D boolean tensor of size `length`, containing elements from mask,
+        tiled.
+
+    """
+    assert length > 0
+    base = torch.as_tensor(list(mask), dtype=torch.bool)
+    assert base.numel() > 0
+    repeats = -(-length // base.numel())
+    return base.repeat(repeats)[:length]
+
+
+def expand_layer_mask_full(pre_mask: Iterable[bool],
+                           post_mask: Iterable[bool]) -> torch.Tensor:
     """Expands layer masks into a weight matrix mask with full connectivity.
 
     Args:
@@ -45,22 +72,27 @@ def expand_layer_mask_full(pre_mask: List[bool],
             layer units.
 
     Returns:
-        A mask for the full projection weight matrix indicating
+        A boolean mask for the full projection weight matrix indicating
         which elements of the matrix correspond to active connections
         in the full connectivity pattern.
 
     """
+    pre = torch.as_tensor(pre_mask, dtype=torch.bool)
+    post = torch.as_tensor(post_mask, dtype=torch.bool)
     # In the full connectivity case, it can be concisely calculated with an
     # outer product
-    return torch.ger(torch.ByteTensor(post_mask), torch.ByteTensor(pre_mask))
+    return post.unsqueeze(1) & pre.unsqueeze(0)
 
 
-def expand_layer_mask_one_to_one(pre_mask: List[bool],
-                                 post_mask: List[bool]) -> torch.ByteTensor:
+def expand_layer_mask_one_to_one(pre_mask: Iterable[bool],
+                                 post_mask: Iterable[bool]) -> torch.Tensor:
     """
     Expands layer masks into a weight matrix mask
     with one-to-one connectivity.
 
+    The k-th included pre layer unit is connected to the k-th included post
+    layer unit.
+
     Args:
         pre_mask: The mask for the pre layer specifying which pre layer
             units are included in the projection. Note that this mask will not
@@ -71,59 +103,113 @@ def expand_layer_mask_one_to_one(pre_mask: List[bool],
             layer units.
 
     Returns:
-        A mask for the one-to-one projection weight matrix indicating
+        A boolean mask for the one-to-one projection weight matrix indicating
         which elements of the matrix correspond to active connections
         in the full connectivity pattern.
 
     """
-    if sum(pre_mask) != sum(post_mask):
+    pre = torch.as_tensor(pre_mask, dtype=torch.bool)
+    post = torch.as_tensor(post_mask, dtype=torch.bool)
+    # These are layer-sized, not matrix-sized, so they are cheap to index
+    pre_idx = pre.nonzero().view(-1)
+    post_idx = post.nonzero().view(-1)
+    if pre_idx.numel() != post_idx.numel():
         raise ValueError(
             """Mismatched one-to-one projection. Pre_mask units: {0}.
-            Post_mask units: {1}.""".format(sum(pre_mask), sum(post_mask)))
-
-    mask = torch.zeros(len(pre_mask), len(post_mask)).byte()
-    i = 0
-    j = 0
-    while i < len(pre_mask):
-        if pre_mask[i]:
-            if post_mask[j]:
-                mask[i, j] = 1
-                i += 1
-                j += 1
-            else:
-                j += 1
-        else:
-            i += 1
+            Post_mask units: {1}.""".format(pre_idx.numel(),
+                                            post_idx.numel()))
+
+    mask = torch.zeros(pre.numel(), post.numel(), dtype=torch.bool)
+    mask[pre_idx, post_idx] = True
     return mask
 
 
-def sparsify(sparsity: float,
-             tensor: torch.ByteTensor) -> Tuple[torch.ByteTensor, int]:
+def sparsify(sparsity: float, tensor: torch.Tensor,
+             gen: torch.Generator = None) -> Tuple[torch.Tensor, int]:
     """
     Makes a boolean tensor sparse, by randomly setting True values to False.
 
+    Each True value draws a random key, and we keep the ones whose keys fall
+    below the appropriate order statistic. This way we never build an index
+    list of every candidate connection.
+
     Args:
         sparsity: The percentage of `True` values from the original
             matrix to keep.
-        tensor: The ByteTensor to sparsify.
+        tensor: The boolean tensor to sparsify.
+        gen: The generator to draw from. If it is `None`, torch's global
+            generator is used.
 
     Returns:
-        A tuple. The first element is a ByteTensor of the same shape
+        A tuple. The first element is a boolean tensor of the same shape
         as the original tensor, but with floor(1 - sparsity)% of its
         true values set to `False`. The second element is the number of True
         values in the sparsified Tensor.
     """
     assert 0 <= sparsity <= 1
-    nonzero = tensor.nonzero()
-    num_nonzero = nonzero.shape[0]
+    tensor = tensor.bool()
+    num_nonzero = int(tensor.sum())
     num_to_keep = math.floor(sparsity * num_nonzero)
-    to_keep = nonzero[torch.randperm(num_nonzero)[:num_to_keep]]
+    if num_to_keep == num_nonzero:
+        return (tensor.clone(), num_to_keep)
+
     sparse = torch.zeros_like(tensor)
-    # All we want to do is set the elements of sparse given by the
-    # indices in to_keep to True. The list comprehension below is pretty hacky,
-    # but I can't find a cleaner way to do it in torch 0.3
-    sparse[[to_keep[:, i] for i in range(to_keep.shape[1])]] = 1
-    return (sparse, num_to_keep)
+    if num_to_keep == 0:
+        return (sparse, 0)
+
+    # Double precision keys make ties at the threshold vanishingly unlikely
+    keys = torch.rand(num_nonzero, dtype=torch.float64, generator=gen)
+    threshold, _ = torch.kthvalue(keys, num_to_keep)
+    keep = keys <= threshold
+    sparse.masked_scatter_(tensor, keep)
+    return (sparse, int(keep.sum()))
+
+
+def fill_masked(tensor: torch.Tensor,
+                mask: torch.Tensor,
+                dist: rand.Distribution,
+                chunk_size: int,
+                num_threads: int = 1,
+                seed: int = None) -> None:
+    """Fills the masked elements of a matrix in-place with random numbers.
+
+    The matrix is filled in blocks of rows, directly from the distribution, so
+    the only temporary memory needed is the size of one block (per thread).
+    Elements outside of the mask are set to zero.
+
+    Args:
+        tensor: The 2D tensor to fill.
+        mask: A boolean tensor with the same shape as `tensor`.
+        dist: The distribution from which to draw the values.
+        chunk_size: The approximate number of elements in each block. Blocks
+            always contain at least one row.
+        num_threads: The number of threads that fill blocks concurrently. If
+            it is 1, the blocks are filled in the calling thread.
+        seed: If provided, each block draws from its own generator, seeded
+            from `seed` and the block position, so the result does not depend
+            on thread scheduling. If `None`, torch's global generator is used.
+
+    """
+    assert tensor.shape == mask.shape
+    num_rows, num_cols = tensor.shape
+    rows_per_chunk = max(1, chunk_size // max(1, num_cols))
+
+    def fill_rows(start: int) -> None:
+        block = tensor[start:start + rows_per_chunk]
+        gen = None
+        if seed is not None:
+            gen = rand.generator(rand.derive_seed(seed, "rows_" + str(start)))
+        dist.fill(block, gen)
+        block.masked_fill_(~mask[start:start + rows_per_chunk], 0)
+
+    starts = range(0, num_rows, rows_per_chunk)
+    if num_threads == 1 or len(starts) == 1:
+        for start in starts:
+            fill_rows(start)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(num_threads) as pool:
+            # Consume the iterator so that exceptions are raised here
+            list(pool.map(fill_rows, starts))
 
 
 def xcal(x: torch.Tensor, thr: torch.Tensor) -> torch.Tensor:
@@ -174,6 +260,9 @@ class Projn(events.EventListenerMixin, log.ObservableMixin):
         post: The receiving layer.
         spec: The projection specification. If none is provided, the default
             spec will be used.
+        seed: The seed for the random numbers drawn by the projection (e.g. to
+            sparsify and initialize the weights). If none is provided, they
+            are drawn from torch's global generator.
 
     """
 
@@ -181,10 +270,12 @@ class Projn(events.EventListenerMixin, log.ObservableMixin):
                  name: str,
                  pre: layer.Layer,
                  post: layer.Layer,
-                 spec: specs.ProjnSpec = None) -> None:
+                 spec: specs.ProjnSpec = None,
+                 seed: int = None) -> None:
         self._name = name
         self.pre = pre
         self.post = post
+        self.seed = seed
 
         if spec is None:
             self._spec = specs.ProjnSpec()
@@ -195,14 +286,11 @@ class Projn(events.EventListenerMixin, log.ObservableMixin):
         # Rows encode the postsynaptic units, and columns encode the
         # presynaptic units. These weights are sigmoidally contrast-enchanced,
         # and are used to send net input to other neurons.
-        self.wts = torch.Tensor(self.post.size, self.pre.size).zero_()
-        # These weights ("fast weights") are linear and not contrast enhanced
-        self.fwts = torch.Tensor(self.post.size, self.pre.size).zero_()
+        self.wts = torch.Tensor(self.post.size, self.pre.size)
 
         # Only create the projection between the units selected by the masks
-        # Currently, only full connections are supported
-        tiled_pre_mask = tile(self.pre.size, self.spec.pre_mask)
-        tiled_post_mask = tile(self.post.size, self.spec.post_mask)
+        tiled_pre_mask = tile_mask(self.pre.size, self.spec.pre_mask)
+        tiled_post_mask = tile_mask(self.post.size, self.spec.post_mask)
 
         if self.spec.projn_type == "one_to_one":
             mask = expand_layer_mask_one_to_one(tiled_pre_mask,
@@ -211,18 +299,34 @@ class Projn(events.EventListenerMixin, log.ObservableMixin):
             mask = expand_layer_mask_full(tiled_pre_mask, tiled_post_mask)
 
         # Enforce sparsity
-        self.mask, num_nonzero = sparsify(self.spec.sparsity, mask)
+        sparsify_gen = None
+        if self.seed is not None:
+            sparsify_gen = rand.generator(
+                rand.derive_seed(self.seed, "sparsify"))
+        self.mask, _ = sparsify(self.spec.sparsity, mask, sparsify_gen)
 
         # Fill the weight matrix with values
-        rand_nums = torch.Tensor(num_nonzero)
-        self.spec.dist.fill(rand_nums)
-        self.wts[self.mask] = rand_nums
+        init_seed = None
+        if self.seed is not None:
+            init_seed = rand.derive_seed(self.seed, "init")
+        fill_masked(self.wts, self.mask, self.spec.dist,
+                    self.spec.init_chunk_size, self.spec.init_threads,
+                    init_seed)
 
+        # These weights ("fast weights") are linear and not contrast enhanced
         self.fwts = self.wts
+        # Incremented every time the weights change, so results computed
+        # with old weights can be recognized
+        self.wt_version = 0
 
         # Record the number of incoming connections for each unit
         self.num_recv_conns = torch.sum(self.mask, dim=1).float()
 
+        # The pre_unit and post_unit lists of the connections, in row-major
+        # order. The mask never changes, so they are created on the first
+        # observation and reused.
+        self._conn_index: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
         # When adding any loggable attribute or property to these lists, update
         # specs.ProjnSpec._valid_log_on_cycle (we represent in two places to
         # avoid a circular dependency)
@@ -329,24 +433,97 @@ class Projn(events.EventListenerMixin, log.ObservableMixin):
         dwts[~mask] *= self.fwts[~mask]
         self.fwts += dwts
         self.wts = sig(self.spec.sig_gain, self.spec.sig_offset, self.fwts)
+        self.wt_version += 1
 
-    def observe_parts_attr(self, attr: str) -> log.PartsObs:
-        """Overrides `log.ObservableMixin.observe_parts_attr()`."""
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns the number of bytes held by the projection's matrices.
+
+        Returns:
+          A dict with the bytes of the weights ("wts"), fast weights ("fwts"),
+          connection mask ("mask"), and cached connection index
+          ("conn_cache"). Until the first learning step, the fast
+          weights share storage with the weights, so they count as zero.
+
+        """
+        usage = {
+            "wts": self.wts.element_size() * self.wts.nelement(),
+            "fwts": self.fwts.element_size() * self.fwts.nelement(),
+            "mask": self.mask.element_size() * self.mask.nelement(),
+            "conn_cache": 0
+        }
+        conn_index = getattr(self, "_conn_index", None)
+        if conn_index is not None:
+            usage["conn_cache"] = sum(i.nbytes for i in conn_index)
+        if self.fwts.data_ptr() == self.wts.data_ptr():
+            usage["fwts"] = 0
+        return usage
+
+    def _conn_matrix(self, attr: str) -> torch.Tensor:
+        """Returns the matrix behind a connection attribute.
+
+        Raises:
+          ValueError: If the attr is not a parts attribute.
+
+        """
         if attr == "conn_wt":
-            attr_to_get = "wts"
-        elif attr == "conn_fwt":
-            attr_to_get = "fwts"
-        else:
-            raise ValueError(
-                "{0} is not a valid parts attribute for Projn.".format(attr))
+            return self.wts
+        if attr == "conn_fwt":
+            return self.fwts
+        raise ValueError(
+            "{0} is not a valid parts attribute for Projn.".format(attr))
+
+    def _cached_conn_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the cached pre_unit and post_unit arrays of the connections.
+
+        They are ordered like the values from `observe_parts_tensor()`, and
+        are read-only.
+
+        """
+        conn_index = getattr(self, "_conn_index", None)
+        if conn_index is None:
+            indices = torch.nonzero(self.mask).numpy()
+            conn_index = (indices[:, 1].copy(), indices[:, 0].copy())
+            for index in conn_index:
+                index.flags.writeable = False
+            self._conn_index = conn_index
+        return conn_index
+
+    def observe_parts_attr(self, attr: str) -> log.PartsObs:
+        """Overrides `log.ObservableMixin.observe_parts_attr()`.
+
+        If `spec.conn_log_format` is "dense", the observation is a single
+        snapshot of the whole matrix, with rows for post units, columns for
+        pre units, and NaN where there is no connection.
 
-        matrix = getattr(self, attr_to_get)
-        indices = torch.nonzero(self.mask)
+        """
+        matrix = self._conn_matrix(attr)
+        if self.spec.conn_log_format == "dense":
+            return {attr: [matrix.masked_fill(~self.mask, math.nan).numpy()]}
+        pre_unit, post_unit = self._cached_conn_index()
         values = torch.masked_select(matrix, self.mask)
         return {
-            "pre_unit": indices[:, 1].tolist(),
-            "post_unit": indices[:, 0].tolist(),
-            attr: values.tolist()
+            "pre_unit": pre_unit,
+            "post_unit": post_unit,
+            attr: values.numpy().astype(np.float64)
+        }
+
+    def observe_parts_tensor(self, attr: str) -> torch.Tensor:
+        """Overrides `log.ObservableMixin.observe_parts_tensor()`."""
+        return torch.masked_select(self._conn_matrix(attr), self.mask)
+
+    def parts_obs_from_tensor(self, attr: str,
+                              values: torch.Tensor) -> log.PartsObs:
+        """Overrides `log.ObservableMixin.parts_obs_from_tensor()`."""
+        self._conn_matrix(attr)  # Validates the attr
+        if self.spec.conn_log_format == "dense":
+            matrix = torch.full(self.mask.shape, math.nan)
+            matrix[self.mask] = values
+            return {attr: [matrix.numpy()]}
+        pre_unit, post_unit = self._cached_conn_index()
+        return {
+            "pre_unit": pre_unit,
+            "post_unit": post_unit,
+            attr: values.numpy().astype(np.float64)
         }
 
     def handle(self, event: events.Event) -> None:
@@ -1,20 +1,66 @@
 """Random number distributions.
 
-At the moment, this module is not thread-safe.
+By default, distributions draw from torch's global generator, so the numbers
+you get depend on the order in which everything draws from it. For
+reproducible results that do not depend on construction order or thread
+scheduling, derive a seed for each object with `derive_seed()` and pass a
+generator made with `generator()` to `Distribution.fill()`.
 
 """
 import abc
+import hashlib
 import math
 
 import torch  # type: ignore
 
 
+def derive_seed(seed: int, name: str) -> int:
+    """Derives a seed for a named object from a parent seed.
+
+    The derivation is stable across processes and platforms (unlike Python's
+    `hash()`), and different names give independent-looking seeds.
+
+    Args:
+        seed: The parent seed.
+        name: The name of the object (or stream) that the seed is for.
+
+    Returns:
+        A non-negative seed that fits in 63 bits.
+
+    """
+    digest = hashlib.sha256("{0}/{1}".format(seed, name).encode()).digest()
+    return int.from_bytes(digest[:8], "little") & (2**63 - 1)
+
+
+def generator(seed: int) -> torch.Generator:
+    """Creates a torch generator seeded with `seed`.
+
+    Args:
+        seed: The seed for the generator.
+
+    Returns:
+        A new torch.Generator.
+
+    """
+    gen = torch.Generator()
+    gen.manual_seed(seed)
+    return gen
+
+
 class Distribution(metaclass=abc.ABCMeta):
     """Abstract base class for all random number distributions."""
 
     @abc.abstractmethod
-    def fill(self, tensor: torch.Tensor) -> None:
-        """Fills a tensor in-place with random numbers."""
+    def fill(self, tensor: torch.Tensor,
+             gen: torch.Generator = None) -> None:
+        """Fills a tensor in-place with random numbers.
+
+        Args:
+            tensor: The tensor to fill.
+            gen: The generator to draw from. If it is `None`, torch's global
+                generator is used.
+
+        """
 
 
 class Scalar(Distribution):
@@ -28,7 +74,8 @@ class Scalar(Distribution):
     def __init__(self, value: float) -> None:
         self.value = value
 
-    def fill(self, tensor: torch.Tensor) -> None:
+    def fill(self, tensor: torch.Tensor,
+             gen: torch.Generator = None) -> None:
         """Overrides `Distribution.fill()`."""
         tensor.fill_(self.value)
 
@@ -52,9 +99,10 @@ class Uniform(Distribution):
         self.low = low
         self.high = high
 
-    def fill(self, tensor: torch.Tensor) -> None:
+    def fill(self, tensor: torch.Tensor,
+             gen: torch.Generator = None) -> None:
         """Overrides ``Distribution.fill`."""
-        tensor.uniform_(self.low, self.high)
+        tensor.uniform_(self.low, self.high, generator=gen)
 
 
 class Gaussian(Distribution):
@@ -75,9 +123,10 @@ class Gaussian(Distribution):
         self.mu = mean
         self.sigma = math.sqrt(var)
 
-    def fill(self, tensor: torch.Tensor) -> None:
+    def fill(self, tensor: torch.Tensor,
+             gen: torch.Generator = None) -> None:
         """Overrides ``Distribution.fill`."""
-        tensor.normal_(self.mu, self.sigma)
+        tensor.normal_(self.mu, self.sigma, generator=gen)
 
 
 class LogNormal(Distribution):
@@ -98,9 +147,10 @@ class LogNormal(Distribution):
         self.mu = mean
         self.sigma = math.sqrt(var)
 
-    def fill(self, tensor: torch.Tensor) -> None:
+    def fill(self, tensor: torch.Tensor,
+             gen: torch.Generator = None) -> None:
         """Overrides ``Distribution.fill`."""
-        tensor.log_normal_(self.mu, self.sigma)
+        tensor.log_normal_(self.mu, self.sigma, generator=gen)
 
 
 class Exponential(Distribution):
@@ -114,6 +164,7 @@ class Exponential(Distribution):
     def __init__(self, lambd: float) -> None:
         self.lambd = lambd
 
-    def fill(self, tensor: torch.Tensor) -> None:
+    def fill(self, tensor: torch.Tensor,
+             gen: torch.Generator = None) -> None:
         """Overrides ``Distribution.fill`."""
-        tensor.exponential_(self.lambd)
+        tensor.exponential_(self.lambd, generator=gen)
@@ -0,0 +1,652 @@
+"""Advances a network in time: clamps, cycles, trials and epochs."""
+import abc
+import contextlib
+import math
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+import numpy as np  # type: ignore
+import torch  # type: ignore
+
+from leabra7 import buffers
+from leabra7 import cache
+from leabra7 import data
+from leabra7 import events
+from leabra7 import layer
+from leabra7 import log
+from leabra7 import projn
+from leabra7 import rand
+from leabra7 import specs
+from leabra7 import utils
+
+
+class SimulationMixin(metaclass=abc.ABCMeta):
+    """Runs a network: clamps its layers, and runs cycles, trials and epochs.
+
+    This is mixed into `net.Net`, which provides the attributes and abstract
+    methods below.
+
+    """
+    seed: Optional[int]
+    num_epochs_run: int
+    layers: Dict[str, layer.Layer]
+    projns: Dict[str, projn.Projn]
+    loggers: List[log.Logger]
+    clock: buffers.Clock
+    settle_cache: Optional[cache.SettleCache]
+    saved_states: Dict[str, cache.TrialStates]
+
+    @abc.abstractmethod
+    def handle(self, event: events.Event) -> None:
+        """Signals an event to every object in the network."""
+
+    @abc.abstractmethod
+    def _validate_layer_name(self, name: str) -> None:
+        """Checks if a layer name exists.
+
+        Raises:
+          ValueError: If no layer with such a name exists.
+
+        """
+
+    def clamp_layer(self, name: str,
+                    acts: Union[Sequence[float], np.ndarray, torch.Tensor]
+                    ) -> None:
+        """Clamps the layer's activations.
+
+        After forcing, the layer's activations will be set to the values
+        contained in `acts` and will not change from cycle to cycle.
+
+        Args:
+            name: The name of the layer.
+            acts: A sequence, numpy array, or tensor containing the
+                activations that the layer's units will be clamped to. Float32
+                arrays and tensors are used without copying. If its length is
+                less than the number of units in the layer, it will be tiled.
+                If its length is greater, the extra values will be ignored.
+
+        ValueError: If `name` does not match any existing layer name, or if
+            any value of `acts` is outside the range [0, 1].
+
+        """
+        self._validate_layer_name(name)
+        self.handle(events.HardClamp(name, acts))
+
+    def register_pattern(
+            self, name: str, key: Hashable,
+            acts: Union[Sequence[float], np.ndarray, torch.Tensor]) -> None:
+        """Registers a pattern that can be clamped repeatedly.
+
+        The pattern is validated, tiled, and clipped once, and the membrane
+        potentials it implies are precomputed. Each layer keeps at most
+        `LayerSpec.pattern_cache_size` patterns; registering more evicts the
+        least recently used one.
+
+        Args:
+            name: The name of the layer.
+            key: The key of the pattern. Registering a key again replaces its
+                pattern.
+            acts: The activations. See `clamp_layer()`.
+
+        Raises:
+            ValueError: If `name` does not match any existing layer name, or if
+                any value of `acts` is outside the range [0, 1].
+
+        """
+        self._validate_layer_name(name)
+        self.layers[name].register_pattern(key, utils.as_acts_tensor(acts))
+
+    def clamp_pattern(self, name: str, key: Hashable) -> None:
+        """Clamps the layer's activations to a registered pattern.
+
+        This is equivalent to calling `clamp_layer()` with the registered
+        activations, but the prepared values are copied in place.
+
+        Args:
+            name: The name of the layer.
+            key: The key of the pattern.
+
+        Raises:
+            ValueError: If `name` does not match any existing layer name, or if
+                no pattern is registered with `key` (e.g. because it was
+                evicted).
+
+        """
+        self._validate_layer_name(name)
+        self.handle(events.ClampPattern(name, key))
+
+    def unclamp_layer(self, name: str) -> None:
+        """Unclamps the layer's activations.
+
+        After unclamping, the layer's activations will be
+        updated each cycle.
+
+        Args:
+            name: The name of the layer to unclamp.
+
+        """
+        self._validate_layer_name(name)
+        self.handle(events.Unclamp(name))
+
+    def _cycle(self) -> None:
+        """Cycles the network (triggered by cycle event)."""
+        for _, lr in self.layers.items():
+            lr.activation_cycle()
+
+        for _, pr in self.projns.items():
+            pr.flush()
+
+    def cycle(self) -> None:
+        """Cycles the network."""
+        self.handle(events.Cycle())
+
+    def minus_phase_cycle(self, num_cycles: int = 50) -> None:
+        """Runs a series of cycles for the trial minus phase.
+
+        A minus phase is the trial phase where target values are not clamped
+        output layers. Clamping the values on the output layers is the user's
+        responsibility.
+
+        Args:
+          num_cycles: The number of cycles to run. With adaptive integration
+            (see `specs.UnitSpec.adaptive_integ`), the phase lasts as long as
+            this many fixed step cycles, but may run fewer.
+
+        Raises:
+          ValueError: If num_cycles is less than 1, or if only some layers
+            use adaptive integration.
+
+        """
+        if num_cycles < 1:
+            raise ValueError("Number of cycles must be >= 1.")
+        adaptive = self._uses_adaptive_integ()
+        self.handle(events.BeginMinusPhase())
+        self._run_cycles(num_cycles, adaptive)
+        self.handle(events.EndMinusPhase())
+
+    def plus_phase_cycle(self, num_cycles: int = 25) -> None:
+        """Runs a series of cycles for the trial plus phase.
+
+        A plus phase is the trial phase where target values are clamped on
+        output layers. Clamping the values on the output layers is the user's
+        responsibility.
+
+        Args:
+          num_cycles: The number of cycles to run. With adaptive integration
+            (see `specs.UnitSpec.adaptive_integ`), the phase lasts as long as
+            this many fixed step cycles, but may run fewer.
+
+        Raises:
+          ValueError: If num_cycles is less than 1, or if only some layers
+            use adaptive integration.
+
+        """
+        self._plus_phase(num_cycles)
+        self.handle(events.EndTrial())
+
+    def _plus_phase(self, num_cycles: int) -> None:
+        """Runs the plus phase, without ending the trial."""
+        if num_cycles < 1:
+            raise ValueError("Number of cycles must be >= 1.")
+        adaptive = self._uses_adaptive_integ()
+        self.handle(events.BeginPlusPhase())
+        self._run_cycles(num_cycles, adaptive)
+        self.handle(events.EndPlusPhase())
+
+    def _uses_adaptive_integ(self) -> bool:
+        """Checks whether the layers use adaptive integration.
+
+        Returns:
+          True if the layers' unit specs have `adaptive_integ` set.
+
+        Raises:
+          ValueError: If only some of the layers' unit specs have
+            `adaptive_integ` set.
+
+        """
+        layers = self.layers.values()
+        num_adaptive = sum(lr.spec.unit_spec.adaptive_integ for lr in layers)
+        if 0 < num_adaptive < len(layers):
+            raise ValueError("Either all or none of the layers must have "
+                             "adaptive_integ set in their unit spec.")
+        return num_adaptive > 0
+
+    def _run_cycles(self, num_cycles: int, adaptive: bool) -> None:
+        """Runs the cycles of a phase.
+
+        If `adaptive` is set, the phase lasts as long as `num_cycles` cycles
+        with the fixed time step, but cycles take larger steps while the
+        activations change slowly, so fewer cycles are run. All layers take
+        the same step, which is the smallest step any unclamped layer
+        proposes.
+
+        Args:
+          num_cycles: The length of the phase, in fixed step cycles.
+          adaptive: Whether the layers use adaptive integration (see
+            `_uses_adaptive_integ()`).
+
+        """
+        if not adaptive:
+            for _ in range(num_cycles):
+                self.handle(events.Cycle())
+            return
+
+        layers = list(self.layers.values())
+        for lr in layers:
+            lr.units.reset_integ_scale()
+        elapsed = 0.0
+        scale = 1.0
+        try:
+            while elapsed < num_cycles:
+                # The last cycle is shortened to end the phase on time
+                scale = min(scale, num_cycles - elapsed)
+                for lr in layers:
+                    lr.units.integ_scale = scale
+                self.handle(events.Cycle())
+                elapsed += scale
+                scale = min((lr.units.next_integ_scale()
+                             for lr in layers if not lr.clamped),
+                            default=scale)
+        finally:
+            for lr in layers:
+                lr.units.reset_integ_scale()
+
+    def trial(self,
+              inputs: Mapping[str, Any],
+              targets: Mapping[str, Any] = None,
+              minus_cycles: int = 50,
+              plus_cycles: int = 25,
+              start: str = None) -> None:
+        """Runs a trial.
+
+        The input layers are clamped, the minus phase is run, the target
+        layers are clamped, the plus phase is run, and the target layers are
+        unclamped.
+
+        By default, the trial settles from the state the previous trial left
+        behind. With `start="reset"`, the state is reset first (see
+        `reset_state()`), so the trial does not depend on the previous one.
+        With `start="nearest"`, the trial warm starts from the saved state
+        (see `save_state()`) whose clamped inputs are nearest to `inputs`,
+        so similar inputs settle from similar states. The phases still run
+        for the given numbers of cycles. If no saved state clamped all the
+        input layers, the state is reset instead.
+
+        If the settle cache is enabled (see `enable_settle_cache()`) and the
+        same trial was already run from the same starting activations, with
+        the same weights and specs, the layers are set to the state they
+        ended that trial in instead of running the cycles again. No cycle or
+        minus phase events are signaled for such trials, so cycle
+        frequencies do not log them. The cycle learning averages are updated
+        as if the cycles had run (they integrate linearly, so the cache
+        stores their update as an affine function), and the layers and
+        loggers see the end of the plus phase, so the trial learning
+        averages and the trial logs match an uncached run.
+
+        Args:
+          inputs: A dict mapping the name of each input layer to its
+            activations (see `clamp_layer()`).
+          targets: Like `inputs`, but for the target layers, which are only
+            clamped during the plus phase.
+          minus_cycles: The number of cycles in the minus phase.
+          plus_cycles: The number of cycles in the plus phase.
+          start: Where to start settling from: `None` (the current state),
+            "reset" or "nearest".
+
+        Raises:
+          ValueError: If a layer name does not match any existing layer, if
+            any activation is outside the range [0, 1], if a number of
+            cycles is less than 1, or if `start` is not valid.
+
+        """
+        if targets is None:
+            targets = {}
+        for name in list(inputs) + list(targets):
+            self._validate_layer_name(name)
+        if minus_cycles < 1 or plus_cycles < 1:
+            raise ValueError("Number of cycles must be >= 1.")
+        if start not in (None, "reset", "nearest"):
+            raise ValueError(
+                "start must be None, reset or nearest, got {0}.".format(start))
+        self._run_trial(
+            inputs, targets,
+            specs.EpochSpec(
+                minus_cycles=minus_cycles, plus_cycles=plus_cycles,
+                start=start))
+
+    def _run_trial(self,
+                   inputs: Mapping[str, Any],
+                   targets: Mapping[str, Any],
+                   spec: specs.EpochSpec,
+                   prepared: bool = False) -> None:
+        """Runs a trial with checked arguments (see `trial()`).
+
+        Args:
+          inputs: A dict mapping the name of each input layer to its
+            activations.
+          targets: Like `inputs`, but for the target layers.
+          spec: The numbers of cycles and the starting point of the trial.
+          prepared: If true, the activations are tensors already tiled and
+            clipped with `data.prepare_pattern()`, which are clamped without
+            checking or copying them again.
+
+        """
+        start = spec.start
+        nearest = self.nearest_state(inputs) if start == "nearest" else None
+        if nearest is not None:
+            self.load_state(nearest)
+        elif start is not None:
+            self.reset_state()
+
+        for name, acts in inputs.items():
+            self.handle(events.HardClamp(name, acts, prepared))
+
+        key = None
+        if self.settle_cache is not None:
+            key = self._settle_key(inputs, targets, spec, prepared)
+        if key is None or not self._replay_settled_trial(key):
+            self._settle(targets, spec, prepared, key)
+        self.handle(events.EndTrial())
+        for name in targets:
+            self.unclamp_layer(name)
+
+    def _settle_key(self, inputs: Mapping[str, Any],
+                    targets: Mapping[str, Any], spec: specs.EpochSpec,
+                    prepared: bool) -> bytes:
+        """Computes the settle cache key of a trial (see `_run_trial()`)."""
+        if prepared:
+            input_acts, target_acts = inputs, targets
+        else:
+            input_acts = {
+                name: utils.as_acts_tensor(a)
+                for name, a in inputs.items()
+            }
+            target_acts = {
+                name: utils.as_acts_tensor(a)
+                for name, a in targets.items()
+            }
+        return cache.settle_key(self.layers, self.projns, input_acts,
+                                target_acts, spec.minus_cycles,
+                                spec.plus_cycles)
+
+    def _replay_settled_trial(self, key: bytes) -> bool:
+        """Replays a trial from the settle cache, if it is stored there.
+
+        The layers are set to their stored end states, the cycle learning
+        averages are updated, and the end of the plus phase is signaled.
+
+        Args:
+          key: The key of the trial, from `_settle_key()`.
+
+        Returns:
+          Whether the trial was in the cache.
+
+        """
+        assert self.settle_cache is not None
+        result = self.settle_cache.get(key)
+        if result is None:
+            return False
+        for name, state in result.states.items():
+            self.layers[name].load_state(state)
+        for name, update in result.avgs_updates.items():
+            cache.apply_cycle_averages_update(self.layers[name].units,
+                                              *update)
+        self.clock.counts["cycle"] += result.num_cycles
+        # Only the layers and loggers handle the end of the plus phase, since
+        # no other phase events were signaled
+        for lr in self.layers.values():
+            lr.handle(events.EndPlusPhase())
+        for logger in self.loggers:
+            logger.handle(events.EndPlusPhase())
+        return True
+
+    def _settle(self, targets: Mapping[str, Any], spec: specs.EpochSpec,
+                prepared: bool, key: Optional[bytes]) -> None:
+        """Runs the minus and plus phases of a trial (see `_run_trial()`).
+
+        Args:
+          targets: The target activations, clamped for the plus phase.
+          spec: The numbers of cycles of the trial.
+          prepared: Whether the targets are prepared tensors.
+          key: The settle cache key under which to store the end state of
+            the trial, or `None` to not store it.
+
+        """
+        avgs_starts: Dict[str, torch.Tensor] = {}
+        if key is not None:
+            avgs_starts = {
+                name: cache.start_cycle_averages_update(lr.units)
+                for name, lr in self.layers.items()
+            }
+        start_cycle = self.clock.counts["cycle"]
+
+        self.minus_phase_cycle(spec.minus_cycles)
+        for name, acts in targets.items():
+            self.handle(events.HardClamp(name, acts, prepared))
+        self._plus_phase(spec.plus_cycles)
+
+        if key is not None:
+            assert self.settle_cache is not None
+            self.settle_cache.put(
+                key,
+                cache.SettleResult(
+                    {name: lr.save_state(learning=False)
+                     for name, lr in self.layers.items()},
+                    {name: cache.end_cycle_averages_update(
+                        lr.units, avgs_starts[name])
+                     for name, lr in self.layers.items()},
+                    self.clock.counts["cycle"] - start_cycle))
+
+    def enable_settle_cache(self, max_entries: int = 1024) -> None:
+        """Caches the end states of trials run with `trial()`.
+
+        This is meant for evaluation runs, which settle the same patterns
+        with the same weights again and again (e.g. from a reset state, see
+        `trial()`). The cache keeps the layer states of the `max_entries`
+        most recently used trials. It is keyed by the starting activations of
+        the layers, the clamped patterns, the numbers of cycles, and the
+        weights and specs, so learning or changing a spec never returns stale
+        results. Learning also empties the cache. Trials served from the
+        cache update the learning averages like uncached trials.
+
+        Args:
+          max_entries: The maximum number of trials to keep.
+
+        Raises:
+          ValueError: If `max_entries` is less than 1.
+
+        """
+        self.settle_cache = cache.SettleCache(max_entries)
+
+    def disable_settle_cache(self) -> None:
+        """Disables and empties the settle cache."""
+        self.settle_cache = None
+
+    def save_state(self, name: str) -> None:
+        """Saves a copy of the state of every layer under a name.
+
+        The state includes the unit activations, inhibition and clamps of
+        each layer, but not the learning averages, so loading it does not
+        undo any learning. Saving a state under an existing name replaces it.
+
+        Args:
+          name: The name of the state.
+
+        """
+        self.saved_states[name] = {
+            layer_name: lr.save_state(learning=False)
+            for layer_name, lr in self.layers.items()
+        }
+
+    def load_state(self, name: str) -> None:
+        """Restores the layers to a state saved with `save_state()`.
+
+        The clamps in the state are not restored. Each layer keeps its
+        current clamp, so a state saved in the middle of a trial (e.g. while
+        the target layers are clamped) does not leave any layer clamped.
+
+        Args:
+          name: The name of the state.
+
+        Raises:
+          ValueError: If no state was saved under `name`.
+
+        """
+        if name not in self.saved_states:
+            raise ValueError("No state named {0}.".format(name))
+        for layer_name, state in self.saved_states[name].items():
+            self.layers[layer_name].load_state(state, keep_clamp=True)
+
+    def delete_state(self, name: str) -> None:
+        """Deletes a state saved with `save_state()`.
+
+        Args:
+          name: The name of the state.
+
+        Raises:
+          ValueError: If no state was saved under `name`.
+
+        """
+        if name not in self.saved_states:
+            raise ValueError("No state named {0}.".format(name))
+        del self.saved_states[name]
+
+    def nearest_state(self, inputs: Mapping[str, Any]) -> Optional[str]:
+        """Finds the saved state whose clamped inputs are nearest to inputs.
+
+        Args:
+          inputs: A dict mapping the name of each input layer to its
+            activations (see `clamp_layer()`).
+
+        Returns:
+          The name of the saved state that minimizes the squared euclidean
+          distance between its clamped activations and `inputs`, summed
+          over the input layers, or `None` if no saved state clamped all the
+          input layers.
+
+        Raises:
+          ValueError: If a layer name does not match any existing layer.
+
+        """
+        for name in inputs:
+            self._validate_layer_name(name)
+        acts = {name: utils.as_acts_tensor(a) for name, a in inputs.items()}
+        best, best_distance = None, math.inf
+        for state_name, states in self.saved_states.items():
+            distance = sum(
+                layer.clamp_distance(self.layers[name], states[name], a)
+                for name, a in acts.items())
+            if distance < best_distance:
+                best, best_distance = state_name, distance
+        return best
+
+    def reset_state(self) -> None:
+        """Resets the activation state of every layer.
+
+        The inhibition and unit activations are set to their initial values,
+        so the next trial does not depend on the previous one. Weights,
+        learning averages and clamps are kept.
+
+        """
+        for lr in self.layers.values():
+            lr.reset_state()
+
+    def run_epoch(self,
+                  dataset: Any,
+                  input_map: Dict[str, Any],
+                  target_map: Dict[str, Any] = None,
+                  spec: specs.EpochSpec = None) -> int:
+        """Runs one trial for each row of a dataset, then ends the epoch.
+
+        Each trial clamps the input layers, runs the minus phase, clamps the
+        target layers, runs the plus phase, unclamps the target layers (see
+        `trial()`), and (optionally) learns. Patterns are read, checked,
+        tiled, and clipped on a background thread while the network runs,
+        and the layers clamp them as they are.
+
+        Example:
+
+            # Columns 0-9 are the inputs, and columns 10-14 are the targets
+            patterns = np.load("patterns.npy", mmap_mode="r")
+            net.run_epoch(patterns, input_map={"input": slice(0, 10)},
+                          target_map={"output": slice(10, 15)},
+                          spec=specs.EpochSpec(shuffle=False))
+
+        Args:
+          dataset: The dataset, with one row per trial. It can be any
+            indexable object (e.g. a numpy array or an `np.memmap`), or any
+            iterable of rows (e.g. a generator).
+          input_map: A dict mapping the name of each input layer to a numpy
+            index (e.g. a slice or a list of columns) that selects its
+            activations from each row.
+          target_map: Like `input_map`, but for the target layers, which are
+            only clamped during the plus phase.
+          spec: The options of the epoch. If it is `None`, the defaults of
+            `specs.EpochSpec` are used.
+
+        Returns:
+          The number of trials run.
+
+        Raises:
+          ValueError: If a layer name does not match any existing layer, if
+            the dataset cannot be shuffled, or if any selected activation is
+            outside the range [0, 1].
+          specs.ValidationError: If the spec is not valid.
+
+        """
+        if target_map is None:
+            target_map = {}
+        if spec is None:
+            spec = specs.EpochSpec()
+        spec.validate()
+        for name in list(input_map) + list(target_map):
+            self._validate_layer_name(name)
+
+        def prepare(row: Any) -> Tuple[Dict[str, torch.Tensor], ...]:
+            return tuple({
+                name: data.prepare_pattern(row, selector,
+                                           self.layers[name].size,
+                                           self.layers[name].spec.clamp_max)
+                for name, selector in layer_map.items()
+            } for layer_map in (input_map, target_map))
+
+        epoch = self.num_epochs_run
+        gen = None
+        if self.seed is not None:
+            gen = rand.generator(
+                rand.derive_seed(self.seed, "epoch_" + str(epoch)))
+        rows = data.iter_rows(dataset, spec.shuffle, gen)
+
+        num_trials = 0
+        patterns = data.prefetch(rows, prepare, spec.prefetch)
+        with contextlib.closing(patterns):
+            for inputs, targets in patterns:
+                self._run_trial(inputs, targets, spec, prepared=True)
+                if spec.learn:
+                    self.learn()
+                num_trials += 1
+
+        self.end_epoch()
+        self.num_epochs_run = epoch + 1
+        return num_trials
+
+    def end_epoch(self) -> None:
+        """Signals to the network that an epoch has ended."""
+        self.handle(events.EndEpoch())
+
+    def end_batch(self) -> None:
+        """Signals to the network that a batch has ended."""
+        self.handle(events.EndBatch())
+
+    def learn(self) -> None:
+        """Updates projection weights with XCAL learning equation."""
+        self.handle(events.Learn())
+        if self.settle_cache is not None:
+            self.settle_cache.clear()
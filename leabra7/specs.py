@@ -1,9 +1,20 @@
 """Classes that bundle simulation parameters."""
 import abc
 import math
+import numbers
+import types
 
 from typing import Any
+from typing import Dict
 from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+import numpy as np  # type: ignore
 
 from leabra7 import events
 from leabra7 import rand
@@ -41,8 +52,81 @@ class Spec(metaclass=abc.ABCMeta):
                                  "spec.".format(name))
             setattr(self, name, value)
 
+    # Name of the instance attribute that memoizes param_values()
+    _PARAM_VALUES_MEMO = "_param_values_memo"
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        self.__dict__.pop(self._PARAM_VALUES_MEMO, None)
+
     def __eq__(self, other: object) -> bool:
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, Spec):
+            return NotImplemented
+        return self._params_dict() == other._params_dict()
+
+    def _params_dict(self) -> Dict[str, Any]:
+        """Returns the instance attributes, without the memo."""
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if name != self._PARAM_VALUES_MEMO
+        }
+
+    def param_values(self) -> Dict[str, Any]:
+        """Returns the value of every parameter, including nested specs.
+
+        Parameters of nested specs (like a layer's `unit_spec`) are prefixed
+        with the name of the nested spec, e.g. "unit_spec.spk_thr". Values
+        that are not None, booleans, numbers or strings (like distributions
+        or tuples) are converted to strings that show their contents.
+
+        The values are memoized until an attribute of the spec (or of a
+        nested spec) is reassigned. Mutating a parameter value in place, like
+        changing a field of a distribution object, is not detected.
+
+        """
+        memo = self.__dict__.get(self._PARAM_VALUES_MEMO)
+        if memo is None:
+            memo = self._compute_param_values()
+            self.__dict__[self._PARAM_VALUES_MEMO] = memo
+        own_values, nested_specs = memo
+        values = dict(own_values)
+        for name, spec in nested_specs:
+            for param, v in spec.param_values().items():
+                values[name + "." + param] = v
+        return values
+
+    def _compute_param_values(
+            self) -> Tuple[Dict[str, Any], List[Tuple[str, "Spec"]]]:
+        """Walks the spec's parameters for param_values().
+
+        Returns:
+            The values of the spec's own parameters, and the (name, spec)
+            pairs of its nested specs, whose values are merged in by
+            param_values() so that changes to them are always seen.
+
+        """
+        values: Dict[str, Any] = {}
+        nested_specs: List[Tuple[str, Spec]] = []
+        for name in dir(self):
+            class_attr = getattr(type(self), name, None)
+            if (name.startswith("_") or callable(class_attr)
+                    or isinstance(class_attr, property)):
+                continue
+            value = getattr(self, name)
+            if isinstance(value, Spec):
+                nested_specs.append((name, value))
+            elif value is None or isinstance(value, (bool, int, float, str)):
+                values[name] = value
+            elif hasattr(value, "__dict__"):
+                # E.g. distributions, whose default repr has no parameters
+                values[name] = "{0}({1})".format(
+                    type(value).__name__, ", ".join(
+                        "{0}={1!r}".format(k, v)
+                        for k, v in sorted(vars(value).items())))
+            else:
+                values[name] = repr(value)
+        return values, nested_specs
 
     # The following two assert methods could be pure functions, but this
     # way we have access to the attr name, which makes our error messages more
@@ -67,6 +151,21 @@ class Spec(metaclass=abc.ABCMeta):
                 attr, low, high)
             raise ValidationError(msg)
 
+    def assert_integer(self, attr: str) -> None:
+        """Asserts that an attribute is an integer.
+
+        Args:
+            attr: The attribute to check.
+
+        Raises:
+            ValidationError: If the attribute is not an integer, or is a bool.
+
+        """
+        value = getattr(self, attr)
+        if (not isinstance(value, numbers.Integral)
+                or isinstance(value, bool)):
+            raise ValidationError("{0} must be an integer.".format(attr))
+
     def assert_sane_float(self, attr: str) -> None:
         """Asserts that an attribute is not NaN, -Inf, or +Inf.
 
@@ -109,6 +208,25 @@ class ObservableSpec(Spec, metaclass=abc.ABCMeta):
     log_on_epoch: Iterable[str] = ()
     # Attrs to log every batch
     log_on_batch: Iterable[str] = ()
+    # Attrs to log at user-defined frequencies (see events.Frequency), keyed
+    # by frequency name
+    log_on_custom: Mapping[str, Iterable[str]] = types.MappingProxyType({})
+    # Delta-compresses the parts logs: a full record is stored every
+    # log_keyframe_interval records, and in between only the parts with a
+    # value that changed by more than log_delta_tol. With an interval of 1,
+    # every record is stored in full.
+    log_keyframe_interval = 1
+    log_delta_tol = 0.0
+    # If positive, each logger keeps only its last log_ring_size records, in
+    # a preallocated buffer that is overwritten in place. This keeps memory
+    # constant over unbounded runs. It cannot be combined with delta
+    # compression.
+    log_ring_size = 0
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        # Each spec gets its own copy, so changing it does not affect others
+        self.log_on_custom = dict(self.log_on_custom)
 
     @property
     @abc.abstractmethod
@@ -122,25 +240,33 @@ class ObservableSpec(Spec, metaclass=abc.ABCMeta):
           freq: The frequency for which to get the attrs to log.
 
         Returns:
-          An iterable of the attributes to log.
-
-        Raises:
-          AttributeError: if the spec doesn't specify which attrs to log for
-            the frequency
+          An iterable of the attributes to log. For user-defined frequencies,
+          these come from `log_on_custom`.
 
         """
-        return getattr(self, "log_on_" + freq.name)
+        if freq.name in self.log_on_custom:
+            return self.log_on_custom[freq.name]
+        return getattr(self, "log_on_" + freq.name, ())
 
     def validate_attrs_to_log(self) -> None:
         """Validates attrs to log for an observable object.
 
         Raises:
-          ValidationError: If any of the attrs to log is invalid.
+          ValidationError: If any of the attrs to log is invalid, or if
+            `log_on_custom` names an undefined or built-in frequency.
 
         """
-        for freq_name, _ in events.Frequency.registry.items():
+        for freq_name in self.log_on_custom:
+            if (freq_name not in events.Frequency.registry
+                    or hasattr(self, "log_on_" + freq_name)):
+                raise ValidationError(
+                    "{0} in log_on_custom is not a user-defined "
+                    "frequency.".format(freq_name))
+        for freq_name, freq in events.Frequency.registry.items():
             attr_list_name = "log_on_{0}".format(freq_name)
-            for attr in getattr(self, attr_list_name):
+            if freq_name in self.log_on_custom:
+                attr_list_name = "log_on_custom[{0}]".format(freq_name)
+            for attr in self.attrs_to_log(freq):
                 if attr not in self._valid_attrs_to_log:
                     raise ValidationError("{0} is not a valid member of "
                                           "{1}".format(attr, attr_list_name))
@@ -149,6 +275,12 @@ class ObservableSpec(Spec, metaclass=abc.ABCMeta):
     def validate(self) -> None:
         """Extends `Spec.validate()`."""
         self.validate_attrs_to_log()
+        self.assert_in_range("log_keyframe_interval", 1, float("Inf"))
+        self.assert_in_range("log_delta_tol", 0, float("Inf"))
+        self.assert_in_range("log_ring_size", 0, float("Inf"))
+        if self.log_ring_size > 0 and self.log_keyframe_interval > 1:
+            raise ValidationError(
+                "Ring buffer logs cannot be delta-compressed.")
         super().validate()
 
 
@@ -190,6 +322,21 @@ class UnitSpec(Spec):
     l_dn_dt = 2.5
     # Long learning average (increasing) increment multiplier
     l_up_inc = 0.2
+    # Gain of the x/(x + 1) activation function
+    xx1_gain = 40.0
+    # Standard deviation of the Gaussian noise convolved with x/(x + 1)
+    nxx1_std = 0.01
+    # Resolution of the noisy x/(x + 1) lookup table
+    nxx1_res = 0.001
+    # Adapt the integration time step of each phase to the dynamics, instead
+    # of always using integ (see net.Net._run_cycles())
+    adaptive_integ = False
+    # In adaptive mode, the step is halved (down to integ) when v_m, act or
+    # the layer's feedback inhibition changes by more than this in a cycle,
+    # and doubled when they change by less than half of it
+    integ_tol = 0.005
+    # Largest multiple of integ the step can grow to in adaptive mode
+    integ_max_scale = 4.0
 
     def validate(self) -> None:
         """Extends `Spec.validate`."""
@@ -211,12 +358,23 @@ class UnitSpec(Spec):
         self.assert_in_range("m_dt", 0, float("Inf"))
         self.assert_in_range("l_dn_dt", 0, float("Inf"))
         self.assert_in_range("l_up_inc", 0, float("Inf"))
+        self.assert_in_range("xx1_gain", 0, float("Inf"))
+        self.assert_in_range("nxx1_std", 1e-3, float("Inf"))
+        self.assert_in_range("nxx1_res", 0, 3.0 * self.nxx1_std)
+
+        if self.nxx1_res == 0:
+            raise ValidationError("nxx1_res cannot be 0.")
 
         if self.v_m_r >= self.spk_thr:
             raise ValidationError(
                 "v_m_r ({0}) cannot be >= spk_thr ({1}).".format(
                     self.v_m_r, self.spk_thr))
 
+        self.assert_in_range("integ_tol", 0, float("Inf"))
+        if self.integ_tol == 0:
+            raise ValidationError("integ_tol cannot be 0.")
+        self.assert_in_range("integ_max_scale", 1, float("Inf"))
+
 
 class LayerSpec(ObservableSpec):
     """Spec for Layer objects."""
@@ -240,10 +398,21 @@ class LayerSpec(ObservableSpec):
     gi = 1.8
     # cos_diff_avg integration time constant
     avg_dt = 0.01
+    # Units whose plus and minus phase activations differ by more than this
+    # count as errors in the cnt_err and err trial metrics
+    err_tol = 0.5
     # We typically clamp binary values (0 or 1). But units cannot support an
     # activation of 1. Any value above clamp_max will be reduced to
     # clamp_max prior to clamping.
     clamp_max = 0.95
+    # The maximum number of registered clamp patterns the layer keeps. When
+    # a new pattern is registered past this limit, the least recently used
+    # pattern is evicted.
+    pattern_cache_size = 256
+    # The units whose parts attributes are logged and observed, as a sequence
+    # of unit indices or a boolean mask with one element per unit. If None,
+    # every unit is.
+    log_units: Optional[Sequence[Union[int, bool]]] = None
     # Layers need to know how to construct their units
     unit_spec = UnitSpec()
 
@@ -257,7 +426,7 @@ class LayerSpec(ObservableSpec):
         return ("avg_act", "avg_net", "fbi", "unit_net_raw", "unit_net",
                 "unit_gc_i", "unit_act", "unit_i_net", "unit_i_net_r",
                 "unit_v_m", "unit_v_m_eq", "unit_adapt", "unit_spike",
-                "cos_diff_avg")
+                "cos_diff_avg", "cos_diff", "sse", "cnt_err", "err")
 
     def validate(self) -> None:
         """Extends `Spec.validate`."""
@@ -276,6 +445,15 @@ class LayerSpec(ObservableSpec):
         self.assert_in_range("fb_dt", 0, float("Inf"))
         self.assert_sane_float("gi")
         self.assert_in_range("clamp_max", 0.0, 1.0)
+        self.assert_in_range("err_tol", 0.0, float("Inf"))
+        self.assert_in_range("pattern_cache_size", 1, float("Inf"))
+        if self.log_units is not None:
+            log_units = np.asarray(self.log_units)
+            if log_units.size > 0 and (log_units.ndim != 1
+                                       or log_units.dtype.kind not in "biu"
+                                       or (log_units < 0).any()):
+                raise ValidationError("log_units must contain non-negative "
+                                      "unit indices or booleans.")
         self.unit_spec.validate()
 
 
@@ -314,6 +492,15 @@ class ProjnSpec(ObservableSpec):
     sig_gain = 6
     # Offset for sigmoidal weight contrast enhancement
     sig_offset = 1
+    # Approximate number of weights to initialize at a time. This bounds the
+    # temporary memory used while building the projection.
+    init_chunk_size = 2**20
+    # Number of threads used to initialize the weights
+    init_threads = 1
+    # How connection attributes are logged and observed. With "long", there
+    # is one row per connection, with its pre and post unit. With "dense",
+    # there is one row per record, holding a snapshot of the whole matrix.
+    conn_log_format = "long"
 
     @property
     def _valid_attrs_to_log(self) -> Iterable[str]:
@@ -345,3 +532,47 @@ class ProjnSpec(ObservableSpec):
         self.assert_in_range("sig_gain", 0, float("Inf"))
         self.assert_sane_float("sig_offset")
         self.assert_in_range("thr_l_mix", 0, float("Inf"))
+        self.assert_integer("init_chunk_size")
+        self.assert_in_range("init_chunk_size", 1, float("Inf"))
+        self.assert_integer("init_threads")
+        self.assert_in_range("init_threads", 1, float("Inf"))
+
+        valid_conn_log_formats = ["long", "dense"]
+        if self.conn_log_format not in valid_conn_log_formats:
+            raise ValidationError(
+                "Connection log format {0} not one of [\"long\", "
+                "\"dense\"]".format(self.conn_log_format))
+        if self.conn_log_format == "dense" and self.log_keyframe_interval > 1:
+            raise ValidationError(
+                "Dense connection logs cannot be delta-compressed.")
+
+
+class EpochSpec(Spec):
+    """Spec for the epochs run with `net.Net.run_epoch()`."""
+    # Whether to run the rows of the dataset in a random order. Only indexable
+    # datasets can be shuffled.
+    shuffle = True
+    # The number of cycles in each minus phase
+    minus_cycles = 50
+    # The number of cycles in each plus phase
+    plus_cycles = 25
+    # Whether to learn at the end of each trial
+    learn = True
+    # The maximum number of prepared patterns to keep ahead of the network
+    prefetch = 16
+    # Where each trial starts settling from: None (the current state),
+    # "reset" or "nearest". See net.Net.trial().
+    start: Optional[str] = None
+
+    def validate(self) -> None:
+        """Extends `Spec.validate`."""
+        super().validate()
+        for attr in ("minus_cycles", "plus_cycles", "prefetch"):
+            self.assert_integer(attr)
+            self.assert_in_range(attr, 1, float("Inf"))
+
+        valid_starts = [None, "reset", "nearest"]
+        if self.start not in valid_starts:
+            raise ValidationError(
+                "Start {0} not one of [None, \"reset\", \"nearest\"]".format(
+                    self.start))
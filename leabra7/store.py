@@ -0,0 +1,272 @@
+"""A local SQLite database of experiment runs and their summary logs."""
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd  # type: ignore
+    from leabra7 import net
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT,
+    seed INTEGER,
+    topology TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_topology ON runs (topology);
+
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    obj TEXT NOT NULL,
+    param TEXT NOT NULL,
+    value,
+    PRIMARY KEY (run_id, obj, param)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS params_by_name ON params (obj, param, value);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    obj TEXT NOT NULL,
+    freq TEXT NOT NULL,
+    attr TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, obj, freq, attr, time)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS metrics_by_attr
+    ON metrics (obj, freq, attr, run_id, time);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    epoch INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (run_id, epoch)
+) WITHOUT ROWID;
+"""
+
+
+def topology_hash(network: "net.Net") -> str:
+    """Hashes the layers and projections of a network.
+
+    Networks with the same layer names and sizes, and the same projections
+    between them, have the same hash, whatever their specs.
+
+    Args:
+      network: The network.
+
+    Returns:
+      The hex digest of the hash.
+
+    """
+    topology = {
+        "layers": sorted((name, lr.size)
+                         for name, lr in network.layers.items()),
+        "projns": sorted((name, pr.pre.name, pr.post.name)
+                         for name, pr in network.projns.items())
+    }
+    return hashlib.sha1(json.dumps(topology).encode()).hexdigest()
+
+
+class ExperimentStore:
+    """A local SQLite database of runs, their summary logs and checkpoints.
+
+    Every run gets a row with its seed and topology hash, and the value of
+    every spec parameter of its layers and projections. Whole attributes
+    logged at the trial, epoch, or any other frequency, and the paths of
+    saved checkpoints, are stored per run. Everything is indexed, so
+    comparing runs (e.g. by their final epoch error) does not require loading
+    any network.
+
+    The store can be used as a context manager, which closes it on exit.
+
+    Args:
+      filename: The SQLite file. It is created if it does not exist.
+
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        self.connection.close()
+
+    def __enter__(self) -> "ExperimentStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def add_run(self, network: "net.Net", name: str = None) -> int:
+        """Records a run of a network.
+
+        Add the run once the network's layers and projections are created.
+
+        Args:
+          network: The network.
+          name: An optional name for the run.
+
+        Returns:
+          The ID of the run, which the other methods take.
+
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (name, seed, topology, created) "
+                "VALUES (?, ?, ?, ?)",
+                (name, network.seed, topology_hash(network), time.time()))
+            run_id = cursor.lastrowid
+            assert run_id is not None
+            rows = []
+            objs: Dict[str, Any] = dict(network.layers)
+            objs.update(network.projns)
+            for obj_name, obj in objs.items():
+                for param, value in obj.spec.param_values().items():
+                    rows.append((run_id, obj_name, param, value))
+            self.connection.executemany(
+                "INSERT INTO params VALUES (?, ?, ?, ?)", rows)
+        return run_id
+
+    def log_metrics(self, run_id: int, network: "net.Net",
+                    freq: str = "epoch") -> int:
+        """Stores the whole attributes logged by a network at a frequency.
+
+        Only the records after the last one already stored for the run are
+        read from the logs, so this can be called repeatedly during a run.
+
+        Args:
+          run_id: The ID of the run.
+          network: The network.
+          freq: The name of the frequency whose logs to store.
+
+        Returns:
+          The number of values stored.
+
+        """
+        rows: List[Tuple[int, str, str, str, int, float]] = []
+        for logger in network.loggers:
+            if logger.freq.name != freq or not logger.whole_attrs:
+                continue
+            last_time, = self.connection.execute(
+                "SELECT MAX(time) FROM metrics WHERE run_id = ? AND obj = ? "
+                "AND freq = ?", (run_id, logger.target_name, freq)).fetchone()
+            whole = logger.whole_logs(
+                None if last_time is None else last_time + 1)
+            if whole.empty:
+                continue
+            times = whole["time"].tolist()
+            for attr in logger.whole_attrs:
+                rows.extend(
+                    (run_id, logger.target_name, freq, attr, t, float(v))
+                    for t, v in zip(times, whole[attr].tolist()))
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+        return len(rows)
+
+    def add_checkpoint(self, run_id: int, network: "net.Net",
+                       filename: str) -> None:
+        """Saves a network and records the checkpoint for a run.
+
+        The checkpoint is keyed by the number of epochs the network has
+        ended, and replaces any earlier checkpoint at the same epoch.
+
+        Args:
+          run_id: The ID of the run.
+          network: The network.
+          filename: Where to save the network.
+
+        """
+        network.save(filename)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+                (run_id, network.clock.counts["epoch"], filename))
+
+    def checkpoints(self, run_id: int) -> List[Tuple[int, str]]:
+        """Returns the (epoch, path) of each checkpoint of a run, in order."""
+        return self.connection.execute(
+            "SELECT epoch, path FROM checkpoints WHERE run_id = ? "
+            "ORDER BY epoch", (run_id, )).fetchall()
+
+    def final_metrics(self,
+                      obj: str,
+                      attr: str,
+                      freq: str = "epoch",
+                      params: Sequence[str] = ()) -> "pd.DataFrame":
+        """Returns the last stored value of a metric in each run.
+
+        Args:
+          obj: The name of the object that logged the metric.
+          attr: The logged attribute.
+          freq: The frequency at which it was logged.
+          params: Spec parameters to add as columns, written as
+            "<object>.<parameter>", e.g. "hidden.gi" or
+            "hidden.unit_spec.spk_thr".
+
+        Returns:
+          A DataFrame with the "run_id", "name", "seed", "time" and "value" of
+          the last record of each run, and a column for each parameter.
+
+        Raises:
+          ValueError: If a parameter is not written as "<object>.<parameter>".
+
+        """
+        import pandas as pd  # type: ignore
+        columns = ["m.run_id", "r.name", "r.seed", "m.time", "m.value"]
+        joins = []
+        args: List[Any] = []
+        for i, param in enumerate(params):
+            obj_name, sep, param_name = param.partition(".")
+            if not sep or not param_name:
+                raise ValueError(
+                    "Parameters must be written as <object>.<parameter>, "
+                    "got {0}.".format(param))
+            # Parameter names are not valid SQL identifiers, so the columns
+            # are renamed by pandas
+            columns.append("p{0}.value AS p{0}".format(i))
+            joins.append("LEFT JOIN params p{0} ON p{0}.run_id = m.run_id "
+                         "AND p{0}.obj = ? AND p{0}.param = ?".format(i))
+            args.extend((obj_name, param_name))
+        # The CROSS JOIN makes SQLite look up the last time of each run in
+        # the index, instead of scanning every record of the metric
+        sql = ("SELECT {0} FROM runs r CROSS JOIN metrics m "
+               "ON m.run_id = r.run_id AND m.obj = ?1 AND m.freq = ?2 "
+               "AND m.attr = ?3 AND m.time = (SELECT MAX(time) FROM metrics "
+               "WHERE run_id = r.run_id AND obj = ?1 AND freq = ?2 "
+               "AND attr = ?3) {1} ORDER BY m.run_id").format(
+                   ", ".join(columns), " ".join(joins))
+        metrics = pd.read_sql_query(
+            sql, self.connection, params=[obj, freq, attr] + args)
+        return metrics.rename(columns={
+            "p{0}".format(i): param
+            for i, param in enumerate(params)
+        })
+
+    def query(self, sql: str, args: Sequence[Any] = ()) -> "pd.DataFrame":
+        """Runs an SQL query on the store.
+
+        The tables are "runs", "params", "metrics" and "checkpoints".
+
+        Args:
+          sql: The query.
+          args: The values of the query's "?" placeholders.
+
+        Returns:
+          A DataFrame with the query results.
+
+        """
+        import pandas as pd  # type: ignore
+        return pd.read_sql_query(sql, self.connection, params=list(args))
@@ -5,10 +5,13 @@ Hazy, T. E., and Contributors (2012). Computational Cognitive Neuroscience.
 Wiki Book, 1st Edition. URL: http://ccnbook.colorado.edu
 
 """
+import functools
 from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
 
 import numpy as np  # type: ignore
-import scipy.interpolate  # type: ignore
 import torch  # type: ignore
 
 from leabra7 import log
@@ -44,42 +47,45 @@ def gaussian(res: float, std: float) -> Any:
     return gauss / sum(gauss)
 
 
-def xx1(res: float, xmin: float, xmax: float) -> Any:
+def xx1(res: float, xmin: float, xmax: float, gain: float = 40) -> Any:
     """Evaluates the xx1 from xmin to xmax.
 
     Args:
         res: The resolution of the array.
         xmin: The lower bound.
         xmax: The upper bound.
+        gain: The gain of the xx1 function.
 
     Returns:
         A Numpy array containing the xx1 function evaluated from xmin to xmax.
 
     """
     xs = np.arange(xmin, xmax, res)
-    gain = 40
     u = gain * np.maximum(xs, 0.0)
     return u / (u + 1)
 
 
-def nxx1_table() -> Any:
+def nxx1_table(gain: float = 40, std: float = 0.01,
+               res: float = 0.001) -> Any:
     """Returns a lookup table for the noisy XX1 function.
 
     The standard XX1 function is convolved with Gaussian noise.
 
+    Args:
+        gain: The gain of the xx1 function.
+        std: The standard deviation of the Gaussian noise.
+        res: The resolution of the x-axis.
+
     Returns:
         An (x, y) tuple where x and y are Numpy arrays holding the x and f(x)
         values of the xx1 function convolved with Gaussian noise.
 
     """
-    res = 0.001  # Resolution of x-axis
-    std = 0.01  # Standard deviation of the Gaussian noise
-
     rng = 3 * std
     xmin = -2 * rng
     xmax = rng + 1.0 + res
     xs = np.arange(xmin, xmax, res)
-    ys = xx1(res, xmin, xmax)
+    ys = xx1(res, xmin, xmax, gain)
     conv = np.convolve(ys, gaussian(res, std), mode="same")
 
     xs_valid = np.arange(-rng, 1.0 + res, res)
@@ -88,12 +94,62 @@ def nxx1_table() -> Any:
     return xs_valid, conv
 
 
+# Sweeps over the NXX1 parameters can create many distinct tables, so we bound
+# the number that we keep around
+NXX1_CACHE_SIZE = 32
+
+
+@functools.lru_cache(maxsize=NXX1_CACHE_SIZE)
+def nxx1_interpolator(gain: float, std: float, res: float) -> Any:
+    """Returns an interpolator for the noisy XX1 function.
+
+    Interpolators are memoized by their parameters, so every UnitGroup with
+    the same gain, noise, and resolution shares a single lookup table, which
+    is only built the first time it is needed.
+
+    Args:
+        gain: The gain of the xx1 function.
+        std: The standard deviation of the Gaussian noise.
+        res: The resolution of the lookup table.
+
+    Returns:
+        A callable that evaluates the noisy XX1 function on an array-like
+        argument, clamping to the table bounds outside of its range.
+
+    """
+    # Scipy is slow to import, so we defer it until the first table is built
+    import scipy.interpolate  # type: ignore
+    xs, ys = nxx1_table(gain, std, res)
+    return scipy.interpolate.interp1d(
+        xs,
+        ys,
+        copy=False,
+        fill_value=(ys[0], ys[-1]),
+        bounds_error=False)
+
+
 def clip(vals: torch.Tensor, minimum: float, maximum: float) -> torch.Tensor:
     """Clips values to fit within range."""
     clipped = torch.max(vals, minimum * torch.ones(vals.shape))
     return torch.min(clipped, maximum * torch.ones(vals.shape))
 
 
+def clamped_v_m(spec: specs.UnitSpec, act_ext: torch.Tensor) -> torch.Tensor:
+    """Computes the membrane potentials that produce clamped activations.
+
+    Args:
+        spec: The spec of the units.
+        act_ext: The clamped activations.
+
+    Returns:
+        The membrane potential of each unit.
+
+    """
+    mask = (-1e-6 < act_ext) & (act_ext < 1e-6)
+    return torch.where(mask, torch.full_like(act_ext, spec.e_rev_l),
+                       spec.spk_thr + act_ext / spec.act_gain)
+
+
 class UnitGroup:
     """A group of computational units (aka neurons.)
 
@@ -105,15 +161,17 @@ class UnitGroup:
         spec: The specification for the unit.
 
     """
-    nxx1_xs, nxx1_ys = nxx1_table()
-    nxx1_numpy = scipy.interpolate.interp1d(
-        nxx1_xs,
-        nxx1_ys,
-        copy=False,
-        fill_value=(nxx1_ys[0], nxx1_ys[-1]),
-        bounds_error=False)
     loggable_attrs = ("net_raw", "net", "gc_i", "act", "i_net", "i_net_r",
                       "v_m", "v_m_eq", "adapt", "spike")
+    # The tensors that settle within a trial
+    activation_attrs = ("net_raw", "net", "gc_i", "act_nd", "act", "i_net",
+                        "i_net_r", "v_m", "v_m_eq", "adapt", "spike")
+    # The learning averages
+    learning_attrs = ("avg_ss", "avg_s", "avg_m", "avg_l")
+    # While an update of the cycle learning averages is recorded, the
+    # averages of units with zero activity that start from each unit vector
+    # (see cache.start_cycle_averages_update())
+    avgs_probe: Optional[torch.Tensor] = None
 
     def __init__(self, size: int, spec: specs.UnitSpec = None) -> None:
         if size <= 0:
@@ -161,6 +219,99 @@ class UnitGroup:
         # Long learning average
         self.avg_l = torch.Tensor(self.size).zero_()
 
+        # The following are only used if spec.adaptive_integ is True
+
+        # Multiplies spec.integ. The network sets it before each cycle (see
+        # net.Net._run_cycles())
+        self.integ_scale = 1.0
+        # Change of the layer's feedback inhibition in the current cycle. The
+        # layer sets it before the units update (see
+        # layer.Layer._calc_fffb_inhibition())
+        self.inhib_change = 0.0
+        # Largest change of v_m, act or the feedback inhibition in the last
+        # cycle
+        self.change = 0.0
+        # Number of consecutive cycles in which the change was below half of
+        # spec.integ_tol
+        self.num_slow_cycles = 0
+
+    def save_state(self, learning: bool = True) -> Dict[str, torch.Tensor]:
+        """Returns a copy of the dynamic state of the group.
+
+        Args:
+          learning: Whether to include the learning averages.
+
+        """
+        attrs: Tuple[str, ...] = self.activation_attrs
+        if learning:
+            attrs += self.learning_attrs
+        return {attr: getattr(self, attr).clone() for attr in attrs}
+
+    def load_state(self, state: Dict[str, torch.Tensor]) -> None:
+        """Restores a state returned by `save_state()`.
+
+        The state is copied, so it can be loaded again later. The learning
+        averages are only restored if the state includes them.
+
+        """
+        for attr, tensor in state.items():
+            # Some attributes can share a tensor (e.g. act and act_nd after
+            # clamping), so they get new tensors rather than copy_()
+            setattr(self, attr, tensor.clone())
+
+    def reset_state(self) -> None:
+        """Resets the activation state to its initial value (zero).
+
+        The learning averages are kept.
+
+        """
+        for attr in self.activation_attrs:
+            setattr(self, attr, torch.Tensor(self.size).zero_())
+
+    def _integ_step(self) -> float:
+        """Returns the integration time step of the current cycle."""
+        if not self.spec.adaptive_integ:
+            return self.spec.integ
+        return self.spec.integ * self.integ_scale
+
+    def _integ_rate(self, dt: float) -> float:
+        """Returns the rate at which a variable integrates in a cycle.
+
+        Args:
+          dt: The time constant of the variable (e.g. `spec.vm_dt`).
+
+        Returns:
+          The time step times `dt`. In adaptive mode, the rate is capped at
+          1, so a large step never overshoots the target of a variable.
+
+        """
+        if not self.spec.adaptive_integ:
+            return self.spec.integ * dt
+        return min(1.0, self._integ_step() * dt)
+
+    def reset_integ_scale(self) -> None:
+        """Goes back to the fixed integration time step."""
+        self.integ_scale = 1.0
+        self.inhib_change = 0.0
+        self.num_slow_cycles = 0
+
+    def next_integ_scale(self) -> float:
+        """Proposes the integration time scale of the next cycle.
+
+        The scale is halved (down to 1) if v_m, act or the layer's feedback
+        inhibition changed by more than `spec.integ_tol` in the last cycle,
+        and doubled (up to `spec.integ_max_scale`) if they changed by less
+        than half of it in each of the last two cycles. Waiting for two slow
+        cycles gives the inputs of the group, which arrive one cycle late,
+        time to show up.
+
+        """
+        if self.change > self.spec.integ_tol:
+            return max(1.0, self.integ_scale / 2)
+        if self.num_slow_cycles >= 2:
+            return min(self.spec.integ_max_scale, self.integ_scale * 2)
+        return self.integ_scale
+
     def g_i_thr(self, unit_idx: int) -> float:
         """The inhibition that will place a unit at its spike threshold.
 
@@ -200,7 +351,7 @@ class UnitGroup:
 
     def update_net(self) -> None:
         """Calculates the input for the next cycle by integrating over time."""
-        self.net += self.spec.integ * self.spec.net_dt * (
+        self.net += self._integ_rate(self.spec.net_dt) * (
             self.net_raw - self.net)
         self.net_raw.zero_()
 
@@ -220,21 +371,31 @@ class UnitGroup:
         self.i_net = (self.net * (self.spec.e_rev_e - self.v_m) +
                       self.spec.gc_l * (self.spec.e_rev_l - self.v_m) +
                       self.gc_i * (self.spec.e_rev_i - self.v_m))
-        self.v_m += (self.spec.integ * self.spec.vm_dt * (
-            self.i_net - self.adapt)).clamp(-100, 100)
+        vm_rate = self._integ_rate(self.spec.vm_dt)
+        d_v_m = (vm_rate * (self.i_net - self.adapt)).clamp(-100, 100)
+        self.v_m += d_v_m
 
         self.i_net_r = (self.net * (self.spec.e_rev_e - self.v_m_eq) +
                         self.spec.gc_l * (self.spec.e_rev_l - self.v_m_eq) +
                         self.gc_i * (self.spec.e_rev_i - self.v_m_eq))
-        self.v_m_eq += (self.spec.integ * self.spec.vm_dt * (
-            self.i_net - self.adapt)).clamp_(-100, 100)
+        d_v_m_eq = (vm_rate * (self.i_net - self.adapt)).clamp_(-100, 100)
+        self.v_m_eq += d_v_m_eq
         # yapf: enable
+        if self.spec.adaptive_integ:
+            self.change = max(self.inhib_change, d_v_m.abs().max().item())
+            # Activations are very sensitive to v_m_eq near the threshold, so
+            # the step must not grow while any unit could cross it
+            below_thr = self.v_m_eq < self.spec.spk_thr
+            if (self.v_m_eq[below_thr] + 2 * d_v_m_eq[below_thr] >=
+                    self.spec.spk_thr).any():
+                self.change = float("Inf")
 
     def nxx1(self, x: torch.Tensor) -> torch.Tensor:
         """Evaluates the noisy X/(X + 1) function.
 
         This is used to approximate the rate-coded unit response to a given
-        input. This is a function, since interp1d is callable.
+        input. The lookup table is shared by all unit groups with the same
+        xx1_gain, nxx1_std and nxx1_res spec values.
 
         Args:
             x: The value at which to evaluate the noisy X/(X + 1)
@@ -244,7 +405,10 @@ class UnitGroup:
             The value of the noisy X/(X + 1) function at `x`.
 
         """
-        return torch.Tensor(self.nxx1_numpy(x))
+        interpolator = nxx1_interpolator(self.spec.xx1_gain,
+                                         self.spec.nxx1_std,
+                                         self.spec.nxx1_res)
+        return torch.Tensor(interpolator(x))
 
     def update_activation(self) -> None:
         """Updates the unit activation.
@@ -266,36 +430,62 @@ class UnitGroup:
         post_spike = 1 - pre_spike
         act_driver = pre_spike * (self.v_m_eq - self.spec.spk_thr
                                   ) + post_spike * (self.net - g_e_thr)
-        self.act_nd += (self.spec.integ * self.spec.vm_dt *
-                        (self.nxx1(act_driver) - self.act_nd))
+        d_act_nd = (self._integ_rate(self.spec.vm_dt) *
+                    (self.nxx1(act_driver) - self.act_nd))
+        self.act_nd += d_act_nd
 
         self.act = self.act_nd * self.spec.syn_tr
 
-        self.adapt += self.spec.integ * (
+        self.adapt += self._integ_step() * (
             self.spec.adapt_dt * (self.spec.vm_gain *
                                   (self.v_m - self.spec.e_rev_l) - self.adapt)
             + self.spike * self.spec.spike_gain)
 
+        if self.spec.adaptive_integ:
+            self.change = max(self.change,
+                              d_act_nd.abs().max().item() * self.spec.syn_tr)
+            if self.change < self.spec.integ_tol / 2:
+                self.num_slow_cycles += 1
+            else:
+                self.num_slow_cycles = 0
+
     def hard_clamp(self, act_ext: torch.Tensor = torch.zeros(0)) -> None:
         """Sets unit act, v_m, and i_net from external hard clamp."""
         self.act_nd = act_ext
         self.act = act_ext
+        self.v_m = clamped_v_m(self.spec, act_ext)
+        self.i_net = torch.Tensor(self.size).zero_()
 
-        mask = (-1e-6 < act_ext) & (act_ext < 1e-6)
-        self.v_m[mask] = self.spec.e_rev_l
-        self.v_m[~mask] = (
-            self.spec.spk_thr + act_ext[~mask] / self.spec.act_gain)
+    def hard_clamp_prepared(self, act_ext: torch.Tensor,
+                            v_m: torch.Tensor) -> None:
+        """Sets unit act, v_m, and i_net from a prepared hard clamp.
 
-        self.i_net = torch.Tensor(self.size).zero_()
+        The values are copied into the existing tensors, so nothing is
+        allocated.
+
+        Args:
+          act_ext: The clamped activations.
+          v_m: The membrane potentials, as computed by `clamped_v_m()`.
+
+        """
+        self.act_nd.copy_(act_ext)
+        self.act.copy_(act_ext)
+        self.v_m.copy_(v_m)
+        self.i_net.zero_()
 
     def update_cycle_learning_averages(self) -> None:
         """Updates the learning averages computed at the end of each cycle."""
-        self.avg_ss += self.spec.integ * self.spec.ss_dt * (
-            self.act - self.avg_ss)
-        self.avg_s += self.spec.integ * self.spec.s_dt * (
-            self.avg_ss - self.avg_s)
-        self.avg_m += self.spec.integ * self.spec.m_dt * (
-            self.avg_s - self.avg_m)
+        ss_rate = self._integ_rate(self.spec.ss_dt)
+        s_rate = self._integ_rate(self.spec.s_dt)
+        m_rate = self._integ_rate(self.spec.m_dt)
+        self.avg_ss += ss_rate * (self.act - self.avg_ss)
+        self.avg_s += s_rate * (self.avg_ss - self.avg_s)
+        self.avg_m += m_rate * (self.avg_s - self.avg_m)
+        if self.avgs_probe is not None:
+            probe = self.avgs_probe
+            probe[0] -= ss_rate * probe[0]
+            probe[1] += s_rate * (probe[0] - probe[1])
+            probe[2] += m_rate * (probe[1] - probe[2])
 
     def update_trial_learning_averages(self, acts_p_avg_eff: float) -> None:
         """Updates the learning averages computed at the end of each trial.
@@ -327,6 +517,25 @@ class UnitGroup:
         _, indices = torch.topk(self.net, k, largest=True, sorted=True)
         return indices
 
+    def observe_tensor(self, attr: str) -> torch.Tensor:
+        """Observes an attribute as a tensor, without copying it.
+
+        Args:
+          attr: The attr to observe. Can be any specified in
+            Layer.parts_attributes.
+
+        Returns:
+          The tensor holding the attribute for each unit.
+
+        Raises:
+          ValueError: if the attribute is unobservable.
+
+        """
+        if attr not in self.loggable_attrs:
+            raise ValueError(
+                "{0} is not an observable attribute.".format(attr))
+        return getattr(self, attr)
+
     def observe(self, attr: str) -> log.PartsObs:
         """Observes an attribute.
 
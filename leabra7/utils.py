@@ -1,5 +1,11 @@
 """Utilities."""
+from typing import Any
 from typing import Iterable
+from typing import Sequence
+from typing import Union
+
+import numpy as np  # type: ignore
+import torch  # type: ignore
 
 
 def clip_float(low: float, high: float, x: float) -> float:
@@ -30,3 +36,41 @@ def clip_iterable(low: float, high: float,
 
     """
     return [clip_float(low, high, x) for x in xs]
+
+
+def as_acts_tensor(acts: Union[Sequence[float], np.ndarray, torch.Tensor]
+                   ) -> torch.Tensor:
+    """Converts activations to a flat float tensor and checks their range.
+
+    Float32 numpy arrays and tensors are converted without copying.
+
+    Args:
+      acts: The activations.
+
+    Returns:
+      The activations as a one dimensional float tensor.
+
+    Raises:
+      ValueError: If any value of acts is outside the range [0, 1] (or NaN).
+
+    """
+    tensor = torch.as_tensor(acts, dtype=torch.float32).reshape(-1)
+    if not ((tensor >= 0) & (tensor <= 1)).all():
+        raise ValueError("All values of acts must be in [0, 1].")
+    return tensor
+
+
+def tensor_nbytes(obj: Any) -> int:
+    """Counts the bytes held by the tensor attributes of an object.
+
+    Args:
+      obj: The object whose tensor attributes to count.
+
+    Returns:
+      The total number of bytes in the tensors stored directly as attributes
+      of `obj`.
+
+    """
+    return sum(
+        v.element_size() * v.nelement() for v in vars(obj).values()
+        if isinstance(v, torch.Tensor))
@@ -0,0 +1,190 @@
+"""Test buffers.py"""
+import gc
+
+import numpy as np  # type: ignore
+import pandas as pd  # type: ignore
+import pytest
+import torch  # type: ignore
+
+from leabra7 import buffers
+from leabra7 import events
+
+
+# Test buffers.DeltaFrameBuffer
+def test_deltaframebuffer_reconstructs_the_records_exactly() -> None:
+    dfb = buffers.DeltaFrameBuffer(keyframe_interval=2, tol=0.0)
+    records = [[0.5, 0.3, 0.1], [0.5, 0.4, 0.1], [0.6, 0.4, 0.1],
+               [0.6, 0.4, 0.2]]
+    for acts in records:
+        dfb.append(pd.DataFrame({"unit": [0, 1, 2], "act": acts}))
+    dfb.increment_time()
+    dfb.append(pd.DataFrame({"unit": [0, 1, 2], "act": [0.0, 0.0, 0.0]}))
+    expected = pd.DataFrame({
+        "unit": [0, 1, 2] * 5,
+        "act": [a for acts in records for a in acts] + [0.0, 0.0, 0.0],
+        "time": [0] * 3 + [1] * 3 + [2] * 3 + [3] * 3 + [5] * 3
+    })
+    assert dfb.to_df().equals(expected)
+
+
+def test_deltaframebuffer_reconstructs_a_time_range() -> None:
+    dfb = buffers.DeltaFrameBuffer(keyframe_interval=3, tol=0.0)
+    for i in range(8):
+        dfb.append(pd.DataFrame({"unit": [0, 1], "act": [i % 2, 0.5]}))
+    for start, stop in ((4, 6), (0, 1), (5, None), (None, 2)):
+        expected = dfb.to_df()
+        expected = expected[(expected["time"] >= (start or 0))
+                            & (expected["time"] < (stop or 8))]
+        assert dfb.to_df(start, stop).equals(
+            expected.reset_index(drop=True))
+
+
+def test_deltaframebuffer_only_stores_rows_that_changed() -> None:
+    dfb = buffers.DeltaFrameBuffer(keyframe_interval=10, tol=0.01)
+    dfb.append(pd.DataFrame({"unit": [0, 1], "act": [0.5, 0.3]}))
+    dfb.append(pd.DataFrame({"unit": [0, 1], "act": [0.505, 0.4]}))
+    dfb.append(pd.DataFrame({"unit": [0, 1], "act": [0.512, 0.4]}))
+    assert [len(rows) for _, _, rows in dfb.buffer] == [2, 1, 1]
+    assert np.allclose(dfb.to_df()["act"], [0.5, 0.3, 0.5, 0.4, 0.512, 0.4])
+
+
+def test_deltaframebuffer_reconstructs_values_within_tolerance() -> None:
+    dfb = buffers.DeltaFrameBuffer(keyframe_interval=20, tol=0.01)
+    rng = np.random.RandomState(0)
+    wts = rng.rand(2, 5)
+    records = []
+    for _ in range(20):
+        wts = wts + rng.normal(scale=0.005, size=wts.shape)
+        records.append(pd.DataFrame({"wt": wts[0], "fwt": wts[1]}))
+        dfb.append(records[-1])
+    expected = pd.concat(records, ignore_index=True)
+    actual = dfb.to_df()
+    assert np.abs(actual["wt"] - expected["wt"]).max() <= 0.01
+    assert np.abs(actual["fwt"] - expected["fwt"]).max() <= 0.01
+
+
+def test_deltaframebuffer_stores_a_keyframe_if_the_rows_change() -> None:
+    dfb = buffers.DeltaFrameBuffer(keyframe_interval=10, tol=0.0)
+    dfb.append(pd.DataFrame({"unit": [0, 1], "act": [0.5, 0.3]}))
+    dfb.append(pd.DataFrame({"unit": [0], "act": [0.5]}))
+    assert dfb.to_df().equals(
+        pd.DataFrame({
+            "unit": [0, 1, 0],
+            "act": [0.5, 0.3, 0.5],
+            "time": [0, 0, 1]
+        }))
+
+
+# Test buffers.RingFrameBuffer
+def test_ringframebuffer_keeps_the_last_records_in_time_order() -> None:
+    rfb = buffers.RingFrameBuffer(capacity=2)
+    for i in range(3):
+        rfb.append(pd.DataFrame({"unit": [0, 1], "act": [i, i + 0.5]}))
+    rfb.increment_time()
+    rfb.append(pd.DataFrame({"unit": [0, 1], "act": [3.0, 3.5]}))
+    expected = pd.DataFrame({
+        "unit": [0, 1, 0, 1],
+        "act": [2.0, 2.5, 3.0, 3.5],
+        "time": [2, 2, 4, 4]
+    })
+    assert rfb.to_df().equals(expected)
+
+
+def test_ringframebuffer_can_return_a_time_range() -> None:
+    rfb = buffers.RingFrameBuffer(capacity=3)
+    for i in range(5):
+        rfb.append(pd.DataFrame({"act": [i]}))
+    assert rfb.oldest_time() == 2
+    assert list(rfb.to_df(start=3)["act"]) == [3, 4]
+    assert list(rfb.to_df(start=0, stop=4)["act"]) == [2, 3]
+
+
+def test_ringframebuffer_uses_constant_memory() -> None:
+    rfb = buffers.RingFrameBuffer(capacity=3)
+    rfb.append(pd.DataFrame({"act": [0.5, 0.3]}))
+    nbytes = rfb.nbytes()
+    for _ in range(10):
+        rfb.append(pd.DataFrame({"act": [0.5, 0.3]}))
+    assert rfb.nbytes() == nbytes
+
+
+def test_ringframebuffer_checks_the_shape_of_the_records() -> None:
+    rfb = buffers.RingFrameBuffer(capacity=3)
+    rfb.append(pd.DataFrame({"act": [0.5, 0.3]}))
+    with pytest.raises(ValueError):
+        rfb.append(pd.DataFrame({"act": [0.5]}))
+    with pytest.raises(ValueError):
+        rfb.append(pd.DataFrame({"net": [0.5, 0.3]}))
+
+
+# Test buffers.Clock
+def test_clock_counts_the_periods_run() -> None:
+    clock = buffers.Clock()
+    for event in (events.Cycle(), events.Cycle(), events.EndTrial(),
+                  events.EndEpoch(), events.EndBatch(), events.Learn()):
+        clock.handle(event)
+    assert clock.counts == {"cycle": 2, "trial": 1, "epoch": 1, "batch": 1}
+
+
+# Test buffers.LogWriter
+def test_logwriter_runs_tasks_in_order() -> None:
+    writer = buffers.LogWriter(max_queue=2)
+    results = []
+    for i in range(10):
+        writer.submit(results.append, i)
+    writer.flush()
+    assert results == list(range(10))
+
+
+def test_logwriter_reraises_task_errors() -> None:
+    writer = buffers.LogWriter()
+
+    def fail() -> None:
+        raise RuntimeError("whales")
+
+    writer.submit(fail)
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    writer.flush()
+
+
+def test_logwriter_close_runs_pending_tasks_and_stops_the_thread() -> None:
+    writer = buffers.LogWriter()
+    results = []
+    writer.submit(results.append, 0)
+    thread = writer._thread
+    writer.close()
+    assert results == [0]
+    assert not thread.is_alive()
+    writer.close()
+    writer.submit(results.append, 1)
+    writer.flush()
+    assert results == [0, 1]
+    writer.close()
+
+
+def test_logwriter_thread_stops_when_the_writer_is_collected() -> None:
+    writer = buffers.LogWriter()
+    writer.submit(lambda: None)
+    writer.flush()
+    thread = writer._thread
+    del writer
+    gc.collect()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_logwriter_checks_the_queue_size() -> None:
+    with pytest.raises(ValueError):
+        buffers.LogWriter(max_queue=0)
+
+
+# Test buffers.SnapshotPool
+def test_snapshot_pool_reuses_released_tensors() -> None:
+    pool = buffers.SnapshotPool()
+    snapshot = pool.copy(torch.Tensor([1, 2]))
+    pool.release(snapshot)
+    assert pool.nbytes() == 8
+    assert pool.copy(torch.Tensor([3, 4])) is snapshot
+    assert snapshot.tolist() == [3, 4]
+    assert pool.copy(torch.Tensor([3, 4])) is not snapshot
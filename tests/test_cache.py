@@ -0,0 +1,76 @@
+"""Test cache.py"""
+import pytest
+import torch  # type: ignore
+
+from leabra7 import cache
+from leabra7 import layer as lr
+from leabra7 import projn as pr
+
+
+def make_objs():
+    layers = {"in": lr.Layer("in", 2), "out": lr.Layer("out", 2)}
+    projns = {"projn": pr.Projn("projn", layers["in"], layers["out"])}
+    return layers, projns
+
+
+def key(layers, projns, inputs=None, cycles=(50, 25)) -> bytes:
+    if inputs is None:
+        inputs = {"in": torch.Tensor([1, 0])}
+    return cache.settle_key(layers, projns, inputs, {}, *cycles)
+
+
+def test_settle_key_is_the_same_for_the_same_trial() -> None:
+    assert key(*make_objs()) == key(*make_objs())
+
+
+def test_settle_key_depends_on_everything_a_trial_depends_on() -> None:
+    layers, projns = make_objs()
+    base = key(layers, projns)
+    assert key(layers, projns, {"in": torch.Tensor([0, 1])}) != base
+    assert key(layers, projns, cycles=(50, 20)) != base
+    projns["projn"].wt_version += 1
+    assert key(layers, projns) != base
+
+    layers, projns = make_objs()
+    layers["out"].spec.gi = 2.0
+    assert key(layers, projns) != base
+
+    layers, projns = make_objs()
+    layers["out"].units.v_m += 0.1
+    assert key(layers, projns) != base
+
+
+def test_settle_key_ignores_state_that_does_not_affect_settling() -> None:
+    layers, projns = make_objs()
+    base = key(layers, projns)
+    layers["out"].units.avg_l += 0.1
+    layers["out"].acts_p += 0.1
+    layers["out"].act_ext += 0.1
+    assert key(layers, projns) == base
+
+
+def test_settle_cache_counts_hits_and_misses() -> None:
+    settle_cache = cache.SettleCache(max_entries=2)
+    assert settle_cache.get(b"a") is None
+    settle_cache.put(
+        b"a",
+        cache.SettleResult({"in": {"x": torch.zeros(3)}},
+                           {"in": (torch.eye(3), torch.zeros(3, 3))}, 75))
+    assert settle_cache.get(b"a") is not None
+    assert (settle_cache.hits, settle_cache.misses) == (1, 1)
+    assert settle_cache.nbytes() == (3 + 9 + 9) * 4
+
+
+def test_settle_cache_evicts_the_least_recently_used_trial() -> None:
+    settle_cache = cache.SettleCache(max_entries=2)
+    result = cache.SettleResult({}, {}, 75)
+    settle_cache.put(b"a", result)
+    settle_cache.put(b"b", result)
+    settle_cache.get(b"a")
+    settle_cache.put(b"c", result)
+    assert list(settle_cache.entries) == [b"a", b"c"]
+
+
+def test_settle_cache_checks_its_size() -> None:
+    with pytest.raises(ValueError):
+        cache.SettleCache(max_entries=0)
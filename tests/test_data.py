@@ -0,0 +1,68 @@
+"""Test data.py"""
+import contextlib
+
+import numpy as np
+import pytest
+
+from leabra7 import data
+from leabra7 import rand
+
+
+def test_iter_rows_iterates_over_arrays_in_order() -> None:
+    dataset = np.arange(6).reshape(3, 2)
+    rows = list(data.iter_rows(dataset, shuffle=False))
+    assert [r.tolist() for r in rows] == [[0, 1], [2, 3], [4, 5]]
+
+
+def test_iter_rows_can_shuffle_arrays() -> None:
+    dataset = np.arange(20)
+    rows = list(data.iter_rows(dataset, shuffle=True, gen=rand.generator(0)))
+    assert sorted(rows) == list(range(20))
+    assert rows != list(range(20))
+
+
+def test_iter_rows_iterates_over_generators() -> None:
+    dataset = (i for i in range(3))
+    assert list(data.iter_rows(dataset, shuffle=False)) == [0, 1, 2]
+
+
+def test_iter_rows_cannot_shuffle_generators() -> None:
+    with pytest.raises(ValueError):
+        list(data.iter_rows((i for i in range(3)), shuffle=True))
+
+
+def test_prepare_pattern_selects_tiles_and_clips() -> None:
+    row = np.array([0.0, 1.0, 0.5, 0.2])
+    actual = data.prepare_pattern(row, slice(0, 2), size=5, clamp_max=0.95)
+    assert np.allclose(actual, [0, 0.95, 0, 0.95, 0])
+
+
+def test_prepare_pattern_checks_the_range_of_the_acts() -> None:
+    with pytest.raises(ValueError):
+        data.prepare_pattern([0.5, 2], slice(None), size=2, clamp_max=0.95)
+
+
+def test_prepare_pattern_checks_the_selection_is_not_empty() -> None:
+    with pytest.raises(ValueError):
+        data.prepare_pattern([0.5, 1], slice(0, 0), size=2, clamp_max=0.95)
+
+
+def test_prefetch_prepares_every_item_in_order() -> None:
+    assert list(data.prefetch(range(10), lambda x: 2 * x, depth=2)) == [
+        2 * i for i in range(10)
+    ]
+
+
+def test_prefetch_reraises_errors_in_the_consuming_thread() -> None:
+    def prepare(x: int) -> int:
+        if x == 3:
+            raise KeyError("whales")
+        return x
+
+    with pytest.raises(KeyError):
+        list(data.prefetch(range(10), prepare, depth=2))
+
+
+def test_prefetch_can_be_closed_early() -> None:
+    with contextlib.closing(data.prefetch(range(1000), abs, depth=1)) as xs:
+        assert next(xs) == 0
@@ -1,8 +1,11 @@
 """Tests events.py"""
+import math
+
 from hypothesis import example
 from hypothesis import given
 import hypothesis.strategies as st
 import pytest
+import torch  # type: ignore
 
 from leabra7 import events as ev
 
@@ -12,6 +15,23 @@ def test_clamp_checks_if_acts_contains_values_outside_0_1() -> None:
         ev.HardClamp(layer_name="lr1", acts=(1, 2))
 
 
+def test_clamp_rejects_nan_acts() -> None:
+    with pytest.raises(ValueError):
+        ev.HardClamp(layer_name="lr1", acts=torch.Tensor([0.5, math.nan]))
+
+
+def test_clamp_does_not_copy_float32_tensors() -> None:
+    acts = torch.Tensor([0.2, 0.4])
+    clamp = ev.HardClamp(layer_name="lr1", acts=acts)
+    assert clamp.acts.data_ptr() == acts.data_ptr()
+
+
+def test_prepared_clamp_does_not_check_the_acts_again() -> None:
+    acts = torch.Tensor([0.2, 0.4])
+    clamp = ev.HardClamp(layer_name="lr1", acts=acts, prepared=True)
+    assert clamp.acts is acts
+
+
 def test_pause_logging_checks_for_valid_frequency_name() -> None:
     with pytest.raises(ValueError):
         ev.PauseLogging(freq_name="whales")
@@ -27,6 +47,42 @@ def test_initializing_frequency_with_incorrect_type_raises_error() -> None:
         ev.Frequency(name="cycle", end_event_type=ev.Cycle())
 
 
+def test_frequencies_can_end_on_several_event_types() -> None:
+    freq = ev.Frequency(
+        name="phase", end_event_type=(ev.EndMinusPhase, ev.EndPlusPhase))
+    try:
+        assert isinstance(ev.EndMinusPhase(), freq.end_event_type)
+        assert isinstance(ev.EndPlusPhase(), freq.end_event_type)
+    finally:
+        ev.Frequency.unregister("phase")
+
+
+def test_you_can_unregister_user_defined_frequencies() -> None:
+    ev.Frequency(name="cycle_10", end_event_type=ev.Cycle, stride=10)
+    ev.Frequency.unregister("cycle_10")
+    assert "cycle_10" not in ev.Frequency.names()
+    with pytest.raises(ValueError):
+        ev.Frequency.unregister("cycle_10")
+    with pytest.raises(ValueError):
+        ev.Frequency.unregister("trial")
+    assert "trial" in ev.Frequency.names()
+
+
+def test_frequency_checks_its_stride_and_aggregate() -> None:
+    with pytest.raises(ValueError):
+        ev.Frequency(name="whales", end_event_type=ev.Cycle, stride=0)
+    with pytest.raises(ValueError):
+        ev.Frequency(
+            name="whales", end_event_type=ev.Cycle, aggregate="median")
+    with pytest.raises(TypeError):
+        ev.Frequency(
+            name="whales",
+            end_event_type=ev.Cycle,
+            aggregate="mean",
+            sample_event_type=ev.Cycle())
+    assert "whales" not in ev.Frequency.names()
+
+
 def test_you_can_get_the_names_of_all_defined_frequencies() -> None:
     actual = set(ev.Frequency.names())
     expected = set(("cycle", "trial", "epoch", "batch"))
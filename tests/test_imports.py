@@ -0,0 +1,38 @@
+"""Test that importing leabra7 stays cheap."""
+import subprocess
+import sys
+from typing import List
+
+
+def imported_modules_after(statement: str) -> List[str]:
+    """Runs a statement in a fresh interpreter and returns sys.modules."""
+    code = "import sys\n{0}\nprint(' '.join(sys.modules))".format(statement)
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True)
+    return result.stdout.split()
+
+
+def test_importing_leabra7_does_not_import_pandas() -> None:
+    assert "pandas" not in imported_modules_after("import leabra7")
+
+
+def test_importing_leabra7_does_not_import_scipy() -> None:
+    assert "scipy" not in imported_modules_after("import leabra7")
+
+
+def test_building_a_network_does_not_import_pandas() -> None:
+    statement = ("import leabra7 as lb\n"
+                 "n = lb.Net()\n"
+                 "n.new_layer('lr1', 3)\n"
+                 "n.new_layer('lr2', 3)\n"
+                 "n.new_projn('proj', 'lr1', 'lr2')\n")
+    assert "pandas" not in imported_modules_after(statement)
+
+
+def test_importing_leabra7_does_not_build_the_nxx1_table() -> None:
+    statement = ("from leabra7 import unit\n"
+                 "assert unit.nxx1_interpolator.cache_info().currsize == 0")
+    imported_modules_after(statement)
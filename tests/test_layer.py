@@ -49,6 +49,20 @@ def test_layer_should_be_able_to_compute_its_average_net_input() -> None:
     assert layer.avg_net == 0.5
 
 
+def test_layer_computes_trial_error_metrics() -> None:
+    layer = lr.Layer(name="in", size=3, spec=sp.LayerSpec(err_tol=0.5))
+    layer.acts_m = torch.Tensor([0.85, 0.6, 0.95])
+    layer.units.act = torch.Tensor([0.95, 0.0, 0.95])
+    layer.handle(ev.EndPlusPhase())
+    assert math.isclose(layer.sse, 0.01 + 0.36, rel_tol=1e-5)
+    assert layer.cnt_err == 1
+    assert layer.err == 1.0
+    layer.acts_m = torch.Tensor([0.95, 0.4, 0.95])
+    layer.handle(ev.EndPlusPhase())
+    assert layer.cnt_err == 0
+    assert layer.err == 0.0
+
+
 @given(
     n=st.integers(min_value=0, max_value=10),
     d=st.integers(min_value=1, max_value=10))
@@ -64,27 +78,46 @@ def test_layer_can_add_input(n, d) -> None:
 def test_layer_should_be_able_to_update_its_units_net_input(mocker) -> None:
     layer = lr.Layer(name="in", size=3)
     layer.units = mocker.Mock()
-    layer.update_net()
+    layer._update_net()
     layer.units.update_net.assert_called_once()
 
 
 def test_layer_should_be_able_to_update_its_units_fffb_inhibition() -> None:
     layer_spec = sp.LayerSpec(inhibition_type="fffb")
     layer = lr.Layer(name="in", size=3, spec=layer_spec)
-    layer.update_inhibition()
+    layer._update_inhibition()
+
+
+def test_layer_integrates_feedback_inhibition_with_the_adaptive_step(
+) -> None:
+    unit_spec = sp.UnitSpec(adaptive_integ=True)
+    layer = lr.Layer(
+        name="in", size=3, spec=sp.LayerSpec(unit_spec=unit_spec))
+    layer.units.act = torch.Tensor([0.5, 0.5, 0.5])
+    target = layer.spec.fb * layer.avg_act
+    layer._calc_fffb_inhibition()
+    assert layer.fbi == pytest.approx(layer.spec.fb_dt * target)
+    assert layer.units.inhib_change == pytest.approx(layer.fbi)
+
+    layer.fbi = 0.0
+    layer.units.integ_scale = 4.0
+    layer._calc_fffb_inhibition()
+    # The rate is capped at 1, so the step does not overshoot
+    assert layer.fbi == pytest.approx(target)
+    assert layer.units.inhib_change == pytest.approx(target)
 
 
 def test_layer_should_be_able_to_update_its_units_kwta_inhibition() -> None:
     layer_spec = sp.LayerSpec(inhibition_type="kwta")
     layer = lr.Layer(name="in", size=3, spec=layer_spec)
-    layer.update_inhibition()
+    layer._update_inhibition()
 
 
 def test_layer_should_be_able_to_update_its_units_kwta_avg_inhibition(
 ) -> None:
     layer_spec = sp.LayerSpec(inhibition_type="kwta_avg")
     layer = lr.Layer(name="in", size=3, spec=layer_spec)
-    layer.update_inhibition()
+    layer._update_inhibition()
 
 
 def test_layer_should_be_able_to_do_an_activation_cycle() -> None:
@@ -105,6 +138,45 @@ def test_layer_should_be_able_to_observe_parts_attributes() -> None:
     }
 
 
+def test_layer_only_observes_the_units_to_log() -> None:
+    for log_units in ([3, 1], [False, True, False, True]):
+        layer = lr.Layer(
+            name="in", size=4, spec=sp.LayerSpec(log_units=log_units))
+        layer.units.act = torch.Tensor([0.1, 0.2, 0.3, 0.4])
+        expected_units = [3, 1] if log_units == [3, 1] else [1, 3]
+        expected = [layer.units.act[i].item() for i in expected_units]
+        observation = layer.observe_parts_attr("unit_act")
+        assert observation["unit"].tolist() == expected_units
+        assert observation["act"].tolist() == expected
+        assert layer.observe_parts_tensor("unit_act").tolist() == expected
+
+
+def test_layer_reuses_the_unit_index_of_parts_observations() -> None:
+    layer = lr.Layer(name="in", size=3)
+    first = layer.parts_obs_from_tensor("unit_act", torch.Tensor([1, 2, 3]))
+    second = layer.parts_obs_from_tensor("unit_act", torch.Tensor([4, 5, 6]))
+    assert second["unit"] is first["unit"]
+    assert first["unit"].tolist() == [0, 1, 2]
+    assert second["act"].tolist() == [4, 5, 6]
+    with pytest.raises(ValueError):
+        first["unit"][0] = 3
+
+
+def test_layer_can_log_units_from_numpy_indices_or_masks() -> None:
+    mask = np.array([False, True, False, True])
+    for log_units, expected in ((np.array([3, 1]), [3, 1]), (mask, [1, 3])):
+        layer = lr.Layer(
+            name="in", size=4, spec=sp.LayerSpec(log_units=log_units))
+        assert layer.log_index.tolist() == expected
+
+
+def test_layer_checks_the_units_to_log_fit_the_layer() -> None:
+    with pytest.raises(ValueError):
+        lr.Layer(name="in", size=3, spec=sp.LayerSpec(log_units=[3]))
+    with pytest.raises(ValueError):
+        lr.Layer(name="in", size=3, spec=sp.LayerSpec(log_units=[True]))
+
+
 def test_observing_invalid_parts_attribute_should_raise_error() -> None:
     layer = lr.Layer(name="in", size=3)
     with pytest.raises(ValueError):
@@ -113,7 +185,7 @@ def test_observing_invalid_parts_attribute_should_raise_error() -> None:
 
 def test_layer_can_update_learning_averages_when_hard_clamped(mocker) -> None:
     layer = lr.Layer(name="layer1", size=3)
-    mocker.spy(layer, "update_trial_learning_averages")
+    mocker.spy(layer, "_update_trial_learning_averages")
     mocker.spy(layer.units, "update_cycle_learning_averages")
 
     layer.hard_clamp([1.0])
@@ -121,7 +193,7 @@ def test_layer_can_update_learning_averages_when_hard_clamped(mocker) -> None:
     layer.handle(ev.EndPlusPhase())
 
     layer.units.update_cycle_learning_averages.assert_called_once()
-    layer.update_trial_learning_averages.assert_called_once()
+    layer._update_trial_learning_averages.assert_called_once()
 
 
 def test_layer_hard_clamping_should_change_the_unit_activations() -> None:
@@ -150,10 +222,151 @@ def test_layer_hard_clamping_respects_clamp_max() -> None:
         assert math.isclose(layer.units.act[i], expected[i], abs_tol=1e-6)
 
 
+def test_layer_can_be_hard_clamped_to_arrays_and_tensors() -> None:
+    for acts in (np.array([0, 1]), torch.Tensor([0, 1])):
+        layer = lr.Layer(name="in", size=3)
+        layer.hard_clamp(acts)
+        assert torch.allclose(layer.units.act, torch.Tensor([0, 0.95, 0]))
+
+
+def test_layer_hard_clamping_does_not_modify_the_input_tensor() -> None:
+    layer = lr.Layer(name="in", size=2)
+    acts = torch.Tensor([1, 1])
+    layer.hard_clamp(acts)
+    layer.activation_cycle()
+    assert (acts == 1).all()
+
+
+def test_layer_keeps_prepared_clamp_tensors_as_they_are() -> None:
+    layer = lr.Layer(name="in", size=3)
+    acts = torch.Tensor([0, 0.95, 0])
+    layer.handle(ev.HardClamp(layer_name="in", acts=acts, prepared=True))
+    assert layer.act_ext.data_ptr() == acts.data_ptr()
+    assert torch.allclose(layer.units.act, acts)
+
+
+def test_layer_hard_clamping_checks_for_empty_patterns() -> None:
+    layer = lr.Layer(name="in", size=2)
+    with pytest.raises(ValueError):
+        layer.hard_clamp([])
+
+
+def test_layer_can_clamp_a_registered_pattern() -> None:
+    expected = lr.Layer(name="in", size=4)
+    expected.hard_clamp([0, 1])
+    layer = lr.Layer(name="in", size=4)
+    layer.register_pattern("a", [0, 1])
+    layer.handle(ev.ClampPattern(layer_name="in", key="a"))
+    assert layer.clamped
+    assert not layer.hidden
+    for attr in ("act", "act_nd", "v_m", "i_net"):
+        assert torch.equal(
+            getattr(layer.units, attr), getattr(expected.units, attr))
+
+
+def test_clamping_a_pattern_does_not_modify_the_cached_pattern() -> None:
+    layer = lr.Layer(name="in", size=2)
+    layer.register_pattern("a", [1, 1])
+    layer.handle(ev.ClampPattern(layer_name="in", key="a"))
+    layer.handle(ev.Unclamp(layer_name="in"))
+    layer.activation_cycle()
+    layer.handle(ev.ClampPattern(layer_name="in", key="a"))
+    assert (layer.units.act == 0.95).all()
+
+
+def test_layer_evicts_the_least_recently_used_pattern() -> None:
+    layer = lr.Layer(
+        name="in", size=2, spec=sp.LayerSpec(pattern_cache_size=2))
+    layer.register_pattern("a", [0])
+    layer.register_pattern("b", [1])
+    layer.handle(ev.ClampPattern(layer_name="in", key="a"))
+    layer.register_pattern("c", [1])
+    assert list(layer.patterns) == ["a", "c"]
+    with pytest.raises(ValueError):
+        layer.handle(ev.ClampPattern(layer_name="in", key="b"))
+
+
+def test_layer_reports_the_memory_used_by_patterns() -> None:
+    layer = lr.Layer(name="in", size=3)
+    assert layer.memory_usage()["patterns"] == 0
+    layer.register_pattern("a", [1])
+    assert layer.memory_usage()["patterns"] == 2 * 3 * 4
+
+
+def test_layer_can_save_and_load_its_state() -> None:
+    layer = lr.Layer(name="in", size=3)
+    layer.add_input(torch.Tensor([0.5, 0.3, 0.1]))
+    layer.activation_cycle()
+    state = layer.save_state()
+    fbi = layer.fbi
+    v_m = layer.units.v_m.clone()
+    layer.hard_clamp([1, 0, 1])
+    layer.activation_cycle()
+    layer.load_state(state)
+    assert not layer.clamped
+    assert layer.fbi == fbi
+    assert torch.equal(layer.units.v_m, v_m)
+
+
+def test_layer_can_keep_its_clamp_when_loading_a_state() -> None:
+    layer = lr.Layer(name="in", size=2)
+    layer.hard_clamp([1, 0])
+    state = layer.save_state()
+    layer.hard_clamp([0, 1])
+    layer.load_state(state, keep_clamp=True)
+    assert layer.clamped
+    assert torch.allclose(layer.units.act, torch.Tensor([0, 0.95]))
+    layer.handle(ev.Unclamp(layer_name="in"))
+    layer.load_state(state, keep_clamp=True)
+    assert not layer.clamped
+    assert torch.allclose(layer.units.act, torch.Tensor([0.95, 0]))
+
+
+def test_layer_states_can_leave_out_the_learning_averages() -> None:
+    layer = lr.Layer(name="in", size=2)
+    state = layer.save_state(learning=False)
+    assert "cos_diff_avg" not in state
+    assert "avg_l" not in state["units"]
+    layer.units.avg_l.fill_(0.3)
+    layer.load_state(state)
+    assert (layer.units.avg_l == 0.3).all()
+
+
+def test_layer_reset_keeps_the_clamp() -> None:
+    layer = lr.Layer(name="in", size=2)
+    layer.add_input(torch.Tensor([0.5, 0.3]))
+    layer.activation_cycle()
+    layer.reset_state()
+    assert layer.fbi == 0.0
+    assert (layer.units.v_m == 0).all()
+    layer.hard_clamp([1, 0])
+    layer.reset_state()
+    assert torch.allclose(layer.units.act, torch.Tensor([0.95, 0]))
+
+
+def test_layer_can_compare_a_pattern_to_a_saved_clamp() -> None:
+    layer = lr.Layer(name="in", size=2)
+    assert lr.clamp_distance(layer, layer.save_state(), [1, 0]) == math.inf
+    layer.hard_clamp([1, 0])
+    state = layer.save_state()
+    assert lr.clamp_distance(layer, state, [1, 0]) == 0
+    assert math.isclose(
+        lr.clamp_distance(layer, state, [0, 0]), 0.95**2, rel_tol=1e-6)
+
+
+def test_clamp_pattern_event_clamps_a_layer_if_the_names_match() -> None:
+    layer = lr.Layer("lr1", 3)
+    layer.register_pattern("a", [0.7])
+    layer.handle(ev.ClampPattern(layer_name="WHALES", key="a"))
+    assert not layer.clamped
+    layer.handle(ev.ClampPattern(layer_name="lr1", key="a"))
+    assert layer.clamped
+
+
 def test_layer_can_unclamp() -> None:
     layer = lr.Layer(name="in", size=4)
     layer.hard_clamp([0, 1])
-    layer.unclamp()
+    layer.handle(ev.Unclamp(layer_name="in"))
     assert not layer.clamped
     assert list(layer.units.act) == [0, 0.95, 0, 0.95]
 
@@ -1,9 +1,12 @@
 """Test log.py"""
 from typing import Any
 
+import numpy as np  # type: ignore
 import pandas as pd  # type: ignore
 import pytest
+import torch  # type: ignore
 
+from leabra7 import buffers
 from leabra7 import events
 from leabra7 import log
 from leabra7 import specs
@@ -22,6 +25,16 @@ def test_dataframebuffer_can_record_observations() -> None:
     assert dfb.to_df().equals(expected)
 
 
+def test_dataframebuffer_can_return_a_time_range() -> None:
+    dfb = log.DataFrameBuffer()
+    for i in range(3):
+        dfb.append(pd.DataFrame({"act": [i]}))
+        dfb.increment_time()
+    assert list(dfb.to_df(start=1)["time"]) == [2, 4]
+    assert list(dfb.to_df(start=1, stop=4)["time"]) == [2]
+    assert dfb.to_df(start=5).empty
+
+
 def test_dataframebuffer_can_increment_time() -> None:
     dfb = log.DataFrameBuffer()
     assert dfb.time == 0
@@ -55,6 +68,17 @@ class ObjToLog(log.ObservableMixin):
         else:
             return {"unit": self.unit, "act": self.acts}
 
+    def observe_parts_tensor(self, attr: str) -> torch.Tensor:
+        if attr != "unit_act":
+            raise ValueError("{0} is not a parts attr.".format(attr))
+        return torch.Tensor(self.acts)
+
+    def parts_obs_from_tensor(self, attr: str,
+                              values: torch.Tensor) -> log.PartsObs:
+        if attr != "unit_act":
+            raise ValueError("{0} is not a parts attr.".format(attr))
+        return {"unit": self.unit, "act": values.tolist()}
+
 
 # Test log.ObservableMixin
 def test_observable_has_whole_attrs() -> None:
@@ -132,6 +156,27 @@ def test_observing_an_invalid_attribute_raises_value_error() -> None:
         obj.observe("whales")
 
 
+def test_you_can_observe_attributes_as_read_only_arrays() -> None:
+    obj = ObjToLog("obj")
+    acts = obj.observe_array("unit_act")
+    assert np.allclose(acts, [0.3, 0.5])
+    assert not acts.flags.writeable
+    assert np.isclose(obj.observe_array("avg_act"), 0.4)
+
+
+def test_you_can_observe_attributes_as_tensors() -> None:
+    obj = ObjToLog("obj")
+    assert torch.allclose(
+        obj.observe_array("unit_act", as_tensor=True),
+        torch.Tensor([0.3, 0.5]))
+
+
+def test_observing_an_invalid_attribute_as_an_array_raises_error() -> None:
+    obj = ObjToLog("obj")
+    with pytest.raises(ValueError):
+        obj.observe_array("whales")
+
+
 # Test log.merge_parts_observations()
 def test_you_can_merge_parts_observations() -> None:
     obs1 = {"unit": [0, 1], "act": [0.2, 0.3]}
@@ -189,3 +234,59 @@ def test_logger_can_pause_logging() -> None:
     whole_obs, parts_obs = logger.to_logs()
     assert list(whole_obs["time"]) == [0, 2]
     assert list(parts_obs.loc[parts_obs["unit"] == 0]["time"]) == [0, 2]
+
+
+def test_logger_with_a_writer_records_the_same_logs() -> None:
+    sync_logger = log.Logger(
+        ObjToLog("obj"), ["avg_act", "unit_act"], events.CycleFreq)
+    async_logger = log.Logger(
+        ObjToLog("obj"), ["avg_act", "unit_act"],
+        events.CycleFreq,
+        writer=buffers.LogWriter(max_queue=1))
+    for logger in (sync_logger, async_logger):
+        logger.handle(events.Cycle())
+        logger.handle(events.PauseLogging("cycle"))
+        logger.handle(events.Cycle())
+        logger.handle(events.ResumeLogging("cycle"))
+        logger.handle(events.Cycle())
+    expected = sync_logger.to_logs()
+    actual = async_logger.to_logs()
+    pd.util.testing.assert_frame_equal(expected.whole, actual.whole)
+    pd.util.testing.assert_frame_equal(expected.parts, actual.parts)
+
+
+def test_logger_can_query_a_slice_of_the_logs() -> None:
+    clock = buffers.Clock()
+    logger = log.Logger(
+        ObjToLog("obj"), ["avg_act", "unit_act"],
+        events.CycleFreq,
+        clock=clock)
+    for _ in range(3):
+        logger.handle(events.Cycle())
+        clock.handle(events.Cycle())
+        clock.handle(events.EndTrial())
+    whole, parts = logger.query(["unit_act"], (1, 3), index="trial", units=[1])
+    assert list(whole.columns) == [
+        "time", "cycle", "trial", "epoch", "batch"
+    ]
+    assert list(parts["unit"]) == [1, 1]
+    assert list(parts["trial"]) == [1, 2]
+    assert "act" in parts.columns
+
+
+def test_logger_memory_usage_counts_the_stamps() -> None:
+    clock = buffers.Clock()
+    logger = log.Logger(
+        ObjToLog("obj"), ["avg_act"], events.CycleFreq, clock=clock)
+    for _ in range(1000):
+        logger.handle(events.Cycle())
+        clock.handle(events.Cycle())
+    assert logger.memory_usage()["stamps"] == 1000 * 4 * 8
+
+
+def test_logger_query_checks_its_arguments() -> None:
+    logger = log.Logger(ObjToLog("obj"), ["avg_act"], events.CycleFreq)
+    with pytest.raises(ValueError):
+        logger.query(["unit_act"])
+    with pytest.raises(ValueError):
+        logger.query(["avg_act"], index="trial")
@@ -0,0 +1,31 @@
+"""Test memory.py"""
+from leabra7 import memory
+
+
+def make_report() -> memory.MemoryReport:
+    return memory.MemoryReport([
+        memory.MemoryRecord("lr1", "layer", "units", 100),
+        memory.MemoryRecord("proj", "projn", "wts", 400),
+        memory.MemoryRecord("proj", "projn", "mask", 100),
+    ])
+
+
+def test_memory_reports_have_a_total() -> None:
+    assert make_report().total == 600
+
+
+def test_memory_reports_can_total_by_object() -> None:
+    assert make_report().totals_by_obj() == {"lr1": 100, "proj": 500}
+
+
+def test_memory_reports_can_total_by_kind() -> None:
+    assert make_report().totals_by_kind() == {"layer": 100, "projn": 500}
+
+
+def test_memory_reports_can_be_converted_to_dataframes() -> None:
+    df = make_report().to_df()
+    assert list(df["nbytes"]) == [100, 400, 100]
+
+
+def test_memory_reports_can_be_printed() -> None:
+    assert "total projn" in str(make_report())
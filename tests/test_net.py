@@ -1,4 +1,5 @@
 """Test net.py"""
+import json
 import math
 
 import numpy as np
@@ -8,9 +9,26 @@ import torch
 
 from leabra7 import events
 from leabra7 import net
+from leabra7 import rand
 from leabra7 import specs
 
 
+@pytest.fixture
+def custom_freqs():
+    """Defines custom frequencies, and removes them after the test."""
+    freqs = [
+        events.Frequency("cycle_10", events.Cycle, stride=10),
+        events.Frequency("phase",
+                         (events.EndMinusPhase, events.EndPlusPhase)),
+        events.Frequency("trial_mean", events.EndPlusPhase,
+                         aggregate="mean"),
+        events.Frequency("trial_max", events.EndPlusPhase, aggregate="max")
+    ]
+    yield freqs
+    for freq in freqs:
+        events.Frequency.unregister(freq.name)
+
+
 def test_network_can_be_saved() -> None:
     n = net.Net()
     location = "tests/mynet.pkl"
@@ -139,6 +157,36 @@ def test_clamping_a_layer_validates_its_name() -> None:
         net.Net().clamp_layer("abcd", [0])
 
 
+def test_clamping_a_registered_pattern_matches_clamping_the_acts() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 4)
+    n.register_pattern("layer1", "a", np.array([0.0, 1.0]))
+    n.clamp_pattern("layer1", "a")
+    n.cycle()
+    expected = [0, 0.95, 0, 0.95]
+    for i in range(4):
+        assert math.isclose(
+            n.objs["layer1"].units.act[i], expected[i], abs_tol=1e-6)
+
+
+def test_registering_a_pattern_checks_the_range_of_the_acts() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 4)
+    with pytest.raises(ValueError):
+        n.register_pattern("layer1", "a", [0, 2])
+
+
+def test_clamping_a_pattern_validates_the_layer_name_and_key() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 4)
+    with pytest.raises(ValueError):
+        n.register_pattern("abcd", "a", [0])
+    with pytest.raises(ValueError):
+        n.clamp_pattern("abcd", "a")
+    with pytest.raises(ValueError):
+        n.clamp_pattern("layer1", "a")
+
+
 def test_unclamping_a_layer_validates_its_name() -> None:
     with pytest.raises(ValueError):
         net.Net().unclamp_layer("abcd")
@@ -264,6 +312,42 @@ def test_observing_unlogged_attr_checks_whether_obj_exists() -> None:
         n.observe("layer1", "avg_act")
 
 
+def test_observing_an_array_matches_the_dataframe_observation() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 3)
+    n.new_layer("layer2", 2)
+    n.new_projn("projn1", "layer1", "layer2")
+    n.clamp_layer("layer1", [0, 1])
+    n.cycle()
+    for name, attr, column in (("layer1", "unit_act", "act"),
+                               ("projn1", "conn_wt", "conn_wt"),
+                               ("layer1", "avg_act", "avg_act")):
+        expected = n.observe(name, attr)[column].values
+        assert np.allclose(n.observe_array(name, attr), expected)
+
+
+def test_observing_an_array_returns_a_read_only_view_or_a_clone() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 3)
+    acts = n.observe_array("layer1", "unit_v_m")
+    assert not acts.flags.writeable
+    clone = n.observe_array("layer1", "unit_v_m", as_tensor=True)
+    clone += 1
+    assert (n.layers["layer1"].units.v_m == 0).all()
+
+
+def test_you_can_observe_several_arrays_at_once() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 3)
+    observations = n.observe_arrays("layer1", ["unit_act", "avg_act"])
+    assert set(observations) == {"unit_act", "avg_act"}
+    assert observations["unit_act"].shape == (3, )
+    with pytest.raises(ValueError):
+        n.observe_arrays("layer1", ["whales"])
+    with pytest.raises(ValueError):
+        n.observe_array("layer2", "unit_act")
+
+
 def test_net_logs_checks_whether_the_frequency_name_is_valid() -> None:
     n = net.Net()
     with pytest.raises(ValueError):
@@ -293,6 +377,261 @@ def test_you_can_retrieve_the_logs_for_a_layer() -> None:
         assert "avg_act" in n.logs(freq, "layer1").whole.columns
 
 
+def test_ring_buffer_logs_keep_the_last_records() -> None:
+    n = net.Net()
+    n.new_layer(
+        "layer1",
+        2,
+        spec=specs.LayerSpec(
+            log_on_cycle=("unit_act", "avg_act"), log_ring_size=3))
+    for _ in range(10):
+        n.cycle()
+    whole, parts = n.logs("cycle", "layer1")
+    assert list(whole["time"]) == [7, 8, 9]
+    assert list(parts["time"]) == [7, 7, 8, 8, 9, 9]
+    assert list(parts["unit"]) == [0, 1, 0, 1, 0, 1]
+
+
+def test_you_can_log_trial_error_metrics() -> None:
+    n = net.Net(seed=0)
+    n.new_layer("input", 2)
+    n.new_layer(
+        "output",
+        2,
+        spec=specs.LayerSpec(
+            log_on_trial=("sse", "cnt_err", "err", "cos_diff")))
+    n.new_projn("projn1", "input", "output")
+    for _ in range(2):
+        n.clamp_layer("input", [1, 0])
+        n.minus_phase_cycle(10)
+        n.clamp_layer("output", [0, 1])
+        n.plus_phase_cycle(10)
+        n.unclamp_layer("output")
+    whole = n.logs("trial", "output").whole
+    assert list(whole.columns) == ["sse", "cnt_err", "err", "cos_diff", "time"]
+    assert len(whole) == 2
+    output = n.layers["output"]
+    last = whole.iloc[-1]
+    assert math.isclose(last["sse"], output.sse, rel_tol=1e-6)
+    assert last["cnt_err"] == output.cnt_err
+    assert last["err"] == output.err
+    assert last["cos_diff"] == output.cos_diff
+    assert whole["cos_diff"].dtype == np.float64
+
+
+def test_you_can_query_a_slice_of_the_logs() -> None:
+    n = net.Net()
+    n.new_layer(
+        "layer1",
+        3,
+        spec=specs.LayerSpec(
+            log_on_cycle=("unit_act", "unit_net", "avg_act"),
+            log_on_trial=("avg_act", )))
+    for _ in range(3):
+        n.minus_phase_cycle(2)
+        n.plus_phase_cycle(2)
+    whole, parts = n.query_logs(
+        "cycle", "layer1", ["unit_act"], (1, 2), index="trial", units=[0, 2])
+    _, all_parts = n.logs("cycle", "layer1")
+    expected = all_parts[(all_parts["time"] >= 4) & (all_parts["time"] < 8)
+                         & (all_parts["unit"] != 1)]
+    assert list(parts["act"]) == list(expected["act"])
+    assert list(parts["cycle"]) == list(expected["time"])
+    assert "net" not in parts.columns
+    assert list(whole["cycle"]) == [4, 5, 6, 7]
+
+    trial_whole, _ = n.query_logs("trial", "layer1", ["avg_act"])
+    assert list(trial_whole["trial"]) == [0, 1, 2]
+    assert list(trial_whole["cycle"]) == [4, 8, 12]
+
+
+def test_log_stamps_count_the_periods_before_the_record() -> None:
+    n = net.Net()
+    n.new_layer(
+        "layer1",
+        1,
+        spec=specs.LayerSpec(
+            log_on_cycle=("avg_act", ),
+            log_on_trial=("avg_act", ),
+            log_on_epoch=("avg_act", )))
+    for _ in range(2):
+        n.minus_phase_cycle(2)
+        n.plus_phase_cycle(1)
+    n.end_epoch()
+    cycle_whole, _ = n.query_logs("cycle", "layer1", ["avg_act"])
+    assert list(cycle_whole["cycle"]) == list(range(6))
+    assert list(cycle_whole["trial"]) == [0, 0, 0, 1, 1, 1]
+    trial_whole, _ = n.query_logs("trial", "layer1", ["avg_act"])
+    assert list(trial_whole["trial"]) == [0, 1]
+    assert list(trial_whole["cycle"]) == [3, 6]
+    epoch_whole, _ = n.query_logs("epoch", "layer1", ["avg_act"])
+    assert list(epoch_whole["epoch"]) == [0]
+    assert list(epoch_whole["trial"]) == [2]
+
+
+def test_querying_logs_checks_the_arguments() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 3, spec=specs.LayerSpec(log_on_cycle=("avg_act", )))
+    n.new_layer("layer2", 3)
+    n.new_projn(
+        "projn1",
+        "layer1",
+        "layer2",
+        spec=specs.ProjnSpec(log_on_cycle=("conn_wt", )))
+    n.cycle()
+    with pytest.raises(ValueError):
+        n.query_logs("cycle", "layer2", ["avg_act"])
+    with pytest.raises(ValueError):
+        n.query_logs("cycle", "layer1", ["unit_act"])
+    with pytest.raises(ValueError):
+        n.query_logs("cycle", "layer1", ["avg_act"], index="whales")
+    with pytest.raises(ValueError):
+        n.query_logs("cycle", "projn1", ["conn_wt"], units=[0])
+
+
+def test_ring_buffer_logs_can_be_queried_by_cycle() -> None:
+    n = net.Net()
+    n.new_layer(
+        "layer1",
+        2,
+        spec=specs.LayerSpec(log_on_cycle=("avg_act", ), log_ring_size=3))
+    for _ in range(5):
+        n.cycle()
+    n.pause_logging("cycle")
+    for _ in range(5):
+        n.cycle()
+    n.resume_logging("cycle")
+    n.cycle()
+    whole, _ = n.query_logs("cycle", "layer1", ["avg_act"], (3, None),
+                            index="cycle")
+    assert list(whole["cycle"]) == [3, 4, 10]
+
+
+def test_async_logging_records_the_same_logs_as_sync_logging() -> None:
+    nets = [net.Net(seed=0), net.Net(seed=0, async_logging=True)]
+    for n in nets:
+        n.new_layer(
+            "layer1",
+            2,
+            spec=specs.LayerSpec(
+                log_on_cycle=("unit_act", "avg_act"),
+                log_on_trial=("unit_act", )))
+        n.new_layer("layer2", 2)
+        n.new_projn(
+            "projn1",
+            "layer1",
+            "layer2",
+            spec=specs.ProjnSpec(log_on_trial=("conn_wt", )))
+        n.clamp_layer("layer1", [1, 0])
+        for _ in range(3):
+            n.minus_phase_cycle(2)
+            n.plus_phase_cycle(2)
+            n.learn()
+    logs = [("cycle", "layer1"), ("trial", "layer1"), ("trial", "projn1")]
+    for freq, name in logs:
+        expected = nets[0].logs(freq, name)
+        actual = nets[1].logs(freq, name)
+        pd.util.testing.assert_frame_equal(expected.whole, actual.whole)
+        pd.util.testing.assert_frame_equal(expected.parts, actual.parts)
+
+
+def test_networks_saved_without_a_seed_can_be_loaded(tmpdir) -> None:
+    n = net.Net(seed=3)
+    del n.seed
+    location = str(tmpdir.join("mynet.pkl"))
+    n.save(location)
+    m = net.Net(seed=4)
+    m.load(filename=location)
+    assert m.seed is None
+
+
+def test_networks_saved_without_an_epoch_count_can_be_loaded(tmpdir) -> None:
+    n = net.Net()
+    del n.num_epochs_run
+    location = str(tmpdir.join("mynet.pkl"))
+    n.save(location)
+    m = net.Net()
+    m.num_epochs_run = 2
+    m.load(filename=location)
+    assert m.num_epochs_run == 0
+
+
+def test_closing_a_network_stops_its_log_writer() -> None:
+    n = net.Net(async_logging=True)
+    n.new_layer("layer1", 2, spec=specs.LayerSpec(log_on_cycle=("avg_act", )))
+    n.cycle()
+    thread = n.log_writer._thread
+    n.close()
+    assert not thread.is_alive()
+    assert len(n.logs("cycle", "layer1").whole) == 1
+    n.cycle()
+    assert len(n.logs("cycle", "layer1").whole) == 2
+    n.close()
+
+
+def test_async_logging_networks_can_be_saved_and_loaded(tmpdir) -> None:
+    n = net.Net(async_logging=True)
+    n.new_layer("layer1", 2, spec=specs.LayerSpec(log_on_cycle=("avg_act", )))
+    n.cycle()
+    location = str(tmpdir.join("mynet.pkl"))
+    n.save(location)
+    m = net.Net()
+    m.load(filename=location)
+    m.cycle()
+    assert list(m.logs("cycle", "layer1").whole["time"]) == [0, 1]
+
+
+def test_you_can_log_at_custom_frequencies(custom_freqs) -> None:
+    n = net.Net()
+    n.new_layer(
+        "layer1",
+        2,
+        spec=specs.LayerSpec(
+            log_on_cycle=("unit_act", "avg_act"),
+            log_on_custom={
+                freq.name: ("unit_act", "avg_act")
+                for freq in custom_freqs
+            }))
+    n.clamp_layer("layer1", [0.3, 0.6])
+    n.minus_phase_cycle(num_cycles=20)
+    n.clamp_layer("layer1", [0.9, 0.0])
+    n.plus_phase_cycle(num_cycles=10)
+
+    cycle = n.logs("cycle", "layer1")
+    strided = n.logs("cycle_10", "layer1")
+    assert list(strided.whole["time"]) == [0, 1, 2]
+    assert np.allclose(strided.whole["avg_act"],
+                       cycle.whole["avg_act"][[9, 19, 29]])
+
+    phase = n.logs("phase", "layer1")
+    assert np.allclose(phase.whole["avg_act"],
+                       cycle.whole["avg_act"][[19, 29]])
+
+    mean = n.logs("trial_mean", "layer1")
+    assert len(mean.whole) == 1
+    assert np.isclose(mean.whole["avg_act"][0], cycle.whole["avg_act"].mean())
+    assert np.allclose(mean.parts["act"],
+                       cycle.parts.groupby("unit")["act"].mean())
+    assert list(mean.parts["unit"]) == [0, 1]
+
+    maximum = n.logs("trial_max", "layer1")
+    assert np.allclose(maximum.parts["act"],
+                       cycle.parts.groupby("unit")["act"].max())
+
+
+def test_layers_only_log_the_units_to_log() -> None:
+    n = net.Net()
+    n.new_layer(
+        "layer1",
+        100,
+        spec=specs.LayerSpec(log_on_cycle=("unit_act", ), log_units=[7, 42]))
+    n.cycle()
+    n.cycle()
+    parts = n.logs("cycle", "layer1").parts
+    assert list(parts["unit"]) == [7, 42, 7, 42]
+    assert n.observe_array("layer1", "unit_act").shape == (2, )
+
+
 def test_net_can_pause_and_resume_logging() -> None:
     n = net.Net()
     n.new_layer(
@@ -446,3 +785,412 @@ def test_you_can_signal_the_end_of_a_batch(mocker) -> None:
     mocker.spy(n, "handle")
     n.end_batch()
     assert isinstance(n.handle.call_args_list[0][0][0], events.EndBatch)
+
+
+def test_seeded_projns_do_not_depend_on_creation_order() -> None:
+    spec = specs.ProjnSpec(dist=rand.Gaussian(0.5, 0.1), sparsity=0.5)
+    nets = [net.Net(seed=42), net.Net(seed=42)]
+    for n in nets:
+        for name in ("layer1", "layer2"):
+            n.new_layer(name, 4)
+    nets[0].new_projn("proj1", "layer1", "layer2", spec)
+    nets[0].new_projn("proj2", "layer2", "layer1", spec)
+    nets[1].new_projn("proj2", "layer2", "layer1", spec)
+    nets[1].new_projn("proj1", "layer1", "layer2", spec)
+    for name in ("proj1", "proj2"):
+        assert (nets[0].projns[name].wts == nets[1].projns[name].wts).all()
+        assert (nets[0].projns[name].mask == nets[1].projns[name].mask).all()
+
+
+def test_you_can_profile_the_network() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 3)
+    n.new_layer("layer2", 3, spec=specs.LayerSpec(log_on_cycle=("avg_act", )))
+    n.new_projn("projn1", "layer1", "layer2")
+    with n.profile() as prof:
+        n.minus_phase_cycle(num_cycles=3)
+        n.plus_phase_cycle(num_cycles=2)
+        n.learn()
+    report = prof.report()
+    calls = {(r.obj, r.method): r.calls for r in report.records}
+    assert calls[("layer1", "activation_cycle")] == 5
+    assert calls[("projn1", "flush")] == 5
+    assert calls[("projn1", "learn")] == 1
+    assert calls[("layer2_cycle_logger", "record")] == 5
+    assert report.num_cycles == 5
+    assert report.num_trials == 1
+
+
+def test_profiling_is_removed_after_the_with_block() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 3)
+    with n.profile():
+        n.cycle()
+    assert "handle" not in n.__dict__
+    assert "activation_cycle" not in n.layers["layer1"].__dict__
+
+
+def test_the_network_cannot_be_profiled_twice_at_once() -> None:
+    n = net.Net()
+    with n.profile():
+        with pytest.raises(RuntimeError):
+            with n.profile():
+                pass
+
+
+def test_you_can_trace_the_network(tmpdir) -> None:
+    n = net.Net()
+    n.new_layer("layer1", 3, spec=specs.LayerSpec(log_on_cycle=("avg_act", )))
+    filename = str(tmpdir.join("trace.json"))
+    with n.trace(filename):
+        n.minus_phase_cycle(num_cycles=2)
+        n.logs("cycle", "layer1")
+    with open(filename) as f:
+        names = [e["name"] for e in json.load(f)["traceEvents"]]
+    assert names.count("layer1.activation_cycle") == 2
+    assert names.count("layer1_cycle_logger.record") == 2
+    assert names.count("minus_phase") == 2
+    assert "net.logs" in names
+    assert "logs" not in n.__dict__
+
+
+def test_you_can_get_a_memory_report() -> None:
+    n = net.Net()
+    n.new_layer("layer1", 2, spec=specs.LayerSpec(log_on_cycle=("unit_act", )))
+    n.new_layer("layer2", 3)
+    n.new_projn("projn1", "layer1", "layer2")
+    n.cycle()
+    nbytes = {(r.obj, r.component): r.nbytes
+              for r in n.memory_report().records}
+    assert nbytes[("projn1", "wts")] == 2 * 3 * 4
+    assert nbytes[("projn1", "mask")] == 2 * 3
+    assert nbytes[("layer1", "units")] > 0
+    assert nbytes[("layer1_cycle_logger", "parts_buffer")] > 0
+
+
+def make_settle_net() -> net.Net:
+    n = net.Net(seed=3)
+    n.new_layer("input", 3)
+    n.new_layer(
+        "output", 3, spec=specs.LayerSpec(log_on_trial=("avg_act", "sse")))
+    n.new_projn("projn", "input", "output")
+    return n
+
+
+def test_a_trial_is_a_minus_and_a_plus_phase() -> None:
+    expected = make_settle_net()
+    expected.clamp_layer("input", [1, 0, 1])
+    expected.minus_phase_cycle(10)
+    expected.clamp_layer("output", [0, 1, 0])
+    expected.plus_phase_cycle(5)
+    expected.unclamp_layer("output")
+    n = make_settle_net()
+    n.trial({"input": [1, 0, 1]}, {"output": [0, 1, 0]}, 10, 5)
+    assert not n.layers["output"].clamped
+    for name in ("input", "output"):
+        for attr in ("acts_m", "acts_p"):
+            assert torch.equal(
+                getattr(n.layers[name], attr),
+                getattr(expected.layers[name], attr))
+    pd.testing.assert_frame_equal(
+        n.logs("trial", "output").whole,
+        expected.logs("trial", "output").whole)
+
+
+def test_trial_checks_its_arguments() -> None:
+    n = make_settle_net()
+    with pytest.raises(ValueError):
+        n.trial({"whales": [1]})
+    with pytest.raises(ValueError):
+        n.trial({"input": [1]}, minus_cycles=0)
+
+
+def test_the_settle_cache_reuses_the_end_state_of_repeated_trials() -> None:
+    n = make_settle_net()
+    n.enable_settle_cache()
+    start = {name: lr.save_state() for name, lr in n.layers.items()}
+    for _ in range(2):
+        for name, state in start.items():
+            n.layers[name].load_state(state)
+        n.trial({"input": [1, 0, 1]}, {"output": [0, 1, 0]}, 10, 5)
+    assert (n.settle_cache.hits, n.settle_cache.misses) == (1, 1)
+    assert n.clock.counts["cycle"] == 30
+    expected = make_settle_net()
+    expected.trial({"input": [1, 0, 1]}, {"output": [0, 1, 0]}, 10, 5)
+    assert torch.equal(n.layers["output"].acts_m,
+                       expected.layers["output"].acts_m)
+    logs = n.logs("trial", "output").whole
+    assert len(logs) == 2
+    assert logs["sse"][0] == logs["sse"][1]
+
+
+def test_settle_cache_hits_update_the_learning_averages() -> None:
+    nets = [make_settle_net(), make_settle_net()]
+    nets[0].enable_settle_cache()
+    for n in nets:
+        for _ in range(3):
+            n.trial({"input": [1, 0, 1]}, {"output": [0, 1, 0]},
+                    10,
+                    5,
+                    start="reset")
+    assert nets[0].settle_cache.hits == 2
+    for name in ("input", "output"):
+        cached, expected = (n.layers[name] for n in nets)
+        assert cached.cos_diff_avg == pytest.approx(expected.cos_diff_avg)
+        for attr in cached.units.learning_attrs:
+            assert torch.allclose(
+                getattr(cached.units, attr),
+                getattr(expected.units, attr),
+                atol=1e-6)
+
+
+def test_learning_and_spec_changes_invalidate_the_settle_cache() -> None:
+    n = make_settle_net()
+    n.enable_settle_cache(max_entries=4)
+    start = {name: lr.save_state() for name, lr in n.layers.items()}
+
+    def run() -> None:
+        for name, state in start.items():
+            n.layers[name].load_state(state)
+        n.trial({"input": [1, 0, 1]}, {"output": [0, 1, 0]}, 10, 5)
+
+    run()
+    n.learn()
+    assert not n.settle_cache.entries
+    run()
+    n.layers["output"].spec.gi = 2.0
+    run()
+    assert n.settle_cache.hits == 0
+    assert n.memory_report().totals_by_obj()["settle_cache"] > 0
+    n.disable_settle_cache()
+    assert n.settle_cache is None
+
+
+def test_resetting_the_state_makes_trials_independent() -> None:
+    expected = make_settle_net()
+    expected.trial({"input": [0, 1, 1]}, {"output": [1, 0, 0]}, 10, 5)
+    n = make_settle_net()
+    n.trial({"input": [1, 0, 1]}, {"output": [0, 1, 0]}, 10, 5)
+    assert not torch.equal(n.layers["output"].units.v_m,
+                           make_settle_net().layers["output"].units.v_m)
+    n.trial({"input": [0, 1, 1]}, {"output": [1, 0, 0]}, 10, 5, "reset")
+    assert torch.equal(n.layers["output"].acts_m,
+                       expected.layers["output"].acts_m)
+
+
+def test_reset_trials_can_be_served_from_the_settle_cache() -> None:
+    n = make_settle_net()
+    n.enable_settle_cache()
+    for _ in range(2):
+        n.trial({"input": [1, 0, 1]}, start="reset")
+    assert n.settle_cache.hits == 1
+
+
+def test_you_can_save_and_load_named_states() -> None:
+    n = make_settle_net()
+    n.trial({"input": [1, 0, 1]}, {"output": [0, 1, 0]}, 10, 5)
+    n.save_state("a")
+    v_m = n.layers["output"].units.v_m.clone()
+    n.reset_state()
+    n.load_state("a")
+    assert torch.equal(n.layers["output"].units.v_m, v_m)
+    assert n.memory_report().totals_by_obj()["saved_states"] > 0
+    n.delete_state("a")
+    with pytest.raises(ValueError):
+        n.load_state("a")
+    with pytest.raises(ValueError):
+        n.delete_state("a")
+
+
+def test_trials_can_warm_start_from_the_nearest_saved_state() -> None:
+    n = make_settle_net()
+    assert n.nearest_state({"input": [1, 0, 1]}) is None
+    for name, acts in (("a", [1, 0, 1]), ("b", [0, 1, 0])):
+        n.trial({"input": acts}, start="reset")
+        n.save_state(name)
+    assert n.nearest_state({"input": [1, 0, 0.8]}) == "a"
+    assert n.nearest_state({"input": [0, 0.9, 0]}) == "b"
+
+    expected = make_settle_net()
+    expected.trial({"input": [1, 0, 1]}, start="reset")
+    expected.trial({"input": [1, 0, 0.8]})
+    n.trial({"input": [1, 0, 0.8]}, start="nearest")
+    assert torch.equal(n.layers["output"].acts_m,
+                       expected.layers["output"].acts_m)
+
+
+def test_loading_a_state_keeps_the_current_clamps() -> None:
+    n = make_settle_net()
+    n.clamp_layer("input", [1, 0, 1])
+    n.minus_phase_cycle(10)
+    n.clamp_layer("output", [0, 1, 0])
+    n.plus_phase_cycle(5)
+    n.save_state("plus")
+    n.unclamp_layer("output")
+    n.clamp_layer("input", [0, 1, 0])
+    n.load_state("plus")
+    assert not n.layers["output"].clamped
+    assert n.layers["input"].clamped
+    assert torch.allclose(n.layers["input"].units.act,
+                          torch.Tensor([0, 0.95, 0]))
+    assert n.nearest_state({"input": [1, 0, 1]}) == "plus"
+
+
+def test_trial_checks_where_it_starts() -> None:
+    n = make_settle_net()
+    with pytest.raises(ValueError):
+        n.trial({"input": [1]}, start="whales")
+
+
+def make_adaptive_net(adaptive: bool, weight: float) -> net.Net:
+    unit_spec = specs.UnitSpec(adaptive_integ=adaptive, integ_tol=0.02)
+    n = net.Net(seed=0)
+    for name in ("input", "hidden", "output"):
+        n.new_layer(name, 10, spec=specs.LayerSpec(unit_spec=unit_spec))
+    projn_spec = specs.ProjnSpec(dist=rand.Uniform(0.0, weight))
+    n.new_projn("projn1", "input", "hidden", spec=projn_spec)
+    n.new_projn("projn2", "hidden", "output", spec=projn_spec)
+    return n
+
+
+def test_adaptive_integration_stays_close_to_the_fixed_step() -> None:
+    for weight in (0.05, 0.5):
+        fixed = make_adaptive_net(False, weight)
+        adaptive = make_adaptive_net(True, weight)
+        for n in (fixed, adaptive):
+            n.trial({"input": [1, 0, 1, 0, 0]}, {"output": [0, 1]}, 50, 25)
+        for name in ("hidden", "output"):
+            for attr in ("acts_m", "acts_p"):
+                assert torch.allclose(
+                    getattr(fixed.layers[name], attr),
+                    getattr(adaptive.layers[name], attr),
+                    atol=0.02)
+        assert adaptive.clock.counts["cycle"] <= 75
+
+
+def test_adaptive_integration_runs_fewer_cycles_when_nothing_spikes(
+) -> None:
+    n = make_adaptive_net(True, 0.05)
+    n.trial({"input": [1, 0, 1, 0, 0]}, {"output": [0, 1]}, 50, 25)
+    assert n.clock.counts["cycle"] < 75
+    assert all(lr.units.integ_scale == 1.0 for lr in n.layers.values())
+
+
+def test_adaptive_integration_must_be_set_for_every_layer() -> None:
+    n = make_adaptive_net(True, 0.05)
+    n.new_layer("other", 2)
+    with pytest.raises(ValueError):
+        n.minus_phase_cycle(5)
+
+
+def test_adaptive_integration_is_checked_before_the_phase_begins(
+        monkeypatch) -> None:
+    n = make_adaptive_net(True, 0.05)
+    n.new_layer("other", 2)
+    handled = []
+    monkeypatch.setattr(n, "handle", handled.append)
+    with pytest.raises(ValueError):
+        n.minus_phase_cycle(5)
+    with pytest.raises(ValueError):
+        n.plus_phase_cycle(5)
+    assert handled == []
+
+
+def make_run_epoch_net() -> net.Net:
+    n = net.Net(seed=1)
+    n.new_layer("input", 2)
+    n.new_layer(
+        "output", 2, spec=specs.LayerSpec(log_on_trial=("avg_act", )))
+    n.new_projn("projn", "input", "output")
+    return n
+
+
+RUN_EPOCH_PATTERNS = np.array([[1, 0, 0, 1], [0, 1, 1, 0], [1, 1, 0, 0]])
+
+
+def test_you_can_run_an_epoch_from_an_array() -> None:
+    n = make_run_epoch_net()
+    num_trials = n.run_epoch(
+        RUN_EPOCH_PATTERNS,
+        input_map={"input": slice(0, 2)},
+        target_map={"output": slice(2, 4)},
+        spec=specs.EpochSpec(shuffle=False, minus_cycles=3, plus_cycles=2))
+    assert num_trials == 3
+    assert len(n.logs("trial", "output").whole) == 3
+    assert (n.layers["input"].act_ext == torch.Tensor([0.95, 0.95])).all()
+    assert (n.layers["output"].acts_p == torch.Tensor([0, 0])).all()
+    assert not n.layers["output"].clamped
+    assert n.num_epochs_run == 1
+
+
+def test_you_can_run_an_epoch_from_a_memmap(tmpdir) -> None:
+    filename = str(tmpdir.join("patterns.npy"))
+    np.save(filename, RUN_EPOCH_PATTERNS.astype(np.float32))
+    n = make_run_epoch_net()
+    num_trials = n.run_epoch(
+        np.load(filename, mmap_mode="r"),
+        input_map={"input": slice(0, 2)},
+        target_map={"output": [2, 3]},
+        spec=specs.EpochSpec(minus_cycles=3, plus_cycles=2))
+    assert num_trials == 3
+
+
+def test_you_can_run_an_epoch_from_a_generator() -> None:
+    n = make_run_epoch_net()
+    num_trials = n.run_epoch(
+        (row for row in RUN_EPOCH_PATTERNS),
+        input_map={"input": slice(0, 2)},
+        spec=specs.EpochSpec(
+            shuffle=False, minus_cycles=3, plus_cycles=2, learn=False))
+    assert num_trials == 3
+
+
+def test_run_epoch_matches_trials_with_the_same_patterns() -> None:
+    n = make_run_epoch_net()
+    n.run_epoch(
+        RUN_EPOCH_PATTERNS,
+        input_map={"input": slice(0, 2)},
+        target_map={"output": slice(2, 4)},
+        spec=specs.EpochSpec(
+            shuffle=False, minus_cycles=3, plus_cycles=2, start="reset"))
+    expected = make_run_epoch_net()
+    for row in RUN_EPOCH_PATTERNS:
+        expected.trial({"input": row[:2]}, {"output": row[2:]}, 3, 2,
+                       "reset")
+        expected.learn()
+    pd.testing.assert_frame_equal(
+        n.logs("trial", "output").whole,
+        expected.logs("trial", "output").whole)
+
+
+def test_run_epoch_validates_its_spec() -> None:
+    n = make_run_epoch_net()
+    with pytest.raises(specs.ValidationError):
+        n.run_epoch(
+            RUN_EPOCH_PATTERNS,
+            input_map={"input": slice(0, 2)},
+            spec=specs.EpochSpec(minus_cycles=0))
+
+
+def test_run_epoch_checks_the_layer_names() -> None:
+    n = make_run_epoch_net()
+    with pytest.raises(ValueError):
+        n.run_epoch(RUN_EPOCH_PATTERNS, input_map={"whales": slice(0, 2)})
+
+
+def test_run_epoch_reraises_invalid_pattern_errors() -> None:
+    n = make_run_epoch_net()
+    with pytest.raises(ValueError):
+        n.run_epoch(np.array([[2, 0]]), input_map={"input": slice(0, 2)})
+
+
+def test_seeded_run_epoch_shuffles_reproducibly() -> None:
+    acts = []
+    for _ in range(2):
+        n = make_run_epoch_net()
+        n.run_epoch(
+            RUN_EPOCH_PATTERNS,
+            input_map={"input": slice(0, 2)},
+            spec=specs.EpochSpec(minus_cycles=3, plus_cycles=2))
+        acts.append(n.logs("trial", "output").whole["avg_act"].tolist())
+    assert acts[0] == acts[1]
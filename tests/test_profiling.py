@@ -0,0 +1,131 @@
+"""Test profiling.py"""
+import json
+
+import pytest
+
+from leabra7 import events as ev
+from leabra7 import profiling
+
+
+class Obj:
+    """A dummy class to profile."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def work(self, x: int) -> int:
+        self.calls += 1
+        return 2 * x
+
+    def handle(self, event: ev.Event) -> None:
+        pass
+
+
+def test_profiler_times_instrumented_methods() -> None:
+    obj = Obj()
+    profiler = profiling.Profiler()
+    profiler.instrument(obj, "obj", "work")
+    assert obj.work(2) == 4
+    obj.work(3)
+    record = profiler.report().records[0]
+    assert record.obj == "obj"
+    assert record.method == "work"
+    assert record.calls == 2
+    assert record.total >= 0
+    assert obj.calls == 2
+
+
+def test_profiler_can_restore_instrumented_methods() -> None:
+    obj = Obj()
+    profiler = profiling.Profiler()
+    profiler.instrument(obj, "obj", "work")
+    profiler.restore()
+    assert "work" not in obj.__dict__
+    obj.work(1)
+    assert profiler.report().records[0].calls == 0
+
+
+def test_profiler_counts_cycles_and_trials() -> None:
+    obj = Obj()
+    profiler = profiling.Profiler()
+    profiler.watch_events(obj)
+    obj.handle(ev.Cycle())
+    obj.handle(ev.Cycle())
+    obj.handle(ev.EndTrial())
+    report = profiler.report()
+    assert report.num_cycles == 2
+    assert report.num_trials == 1
+
+
+def make_report() -> profiling.ProfileReport:
+    records = [
+        profiling.ProfileRecord("a", "flush", 2, 3.0, 1.5),
+        profiling.ProfileRecord("b", "learn", 4, 1.0, 0.25)
+    ]
+    return profiling.ProfileReport(
+        records, wall_time=2.0, num_cycles=10, num_trials=1)
+
+
+def test_profile_reports_can_be_sorted() -> None:
+    report = make_report()
+    assert [r.obj for r in report.sorted("calls").records] == ["b", "a"]
+    assert [r.obj for r in report.sorted("total").records] == ["a", "b"]
+    ascending = report.sorted("total", descending=False)
+    assert [r.obj for r in ascending.records] == ["b", "a"]
+
+
+def test_profile_reports_check_the_sort_field() -> None:
+    with pytest.raises(ValueError):
+        make_report().sorted("whales")
+
+
+def test_profile_reports_compute_throughput() -> None:
+    report = make_report()
+    assert report.cycles_per_sec == 5
+    assert report.trials_per_sec == 0.5
+
+
+def test_profile_reports_can_be_converted_to_dataframes() -> None:
+    df = make_report().to_df()
+    assert list(df["obj"]) == ["a", "b"]
+    assert "mean" in df.columns
+
+
+def test_profile_reports_can_be_printed() -> None:
+    assert "flush" in str(make_report())
+
+
+# Test profiling.Tracer
+def test_tracer_records_instrumented_methods_as_complete_spans() -> None:
+    obj = Obj()
+    tracer = profiling.Tracer()
+    tracer.instrument(obj, "obj", "work")
+    obj.work(1)
+    event = tracer.trace_events[0]
+    assert event["name"] == "obj.work"
+    assert event["ph"] == "X"
+    assert event["dur"] >= 0
+
+
+def test_tracer_records_phases_as_begin_and_end_spans() -> None:
+    obj = Obj()
+    tracer = profiling.Tracer()
+    tracer.watch_events(obj)
+    obj.handle(ev.BeginMinusPhase())
+    obj.handle(ev.Cycle())
+    obj.handle(ev.EndMinusPhase())
+    names_and_phases = [(e["name"], e["ph"]) for e in tracer.trace_events]
+    assert names_and_phases == [("minus_phase", "B"), ("Cycle", "X"),
+                                ("minus_phase", "E")]
+
+
+def test_tracer_writes_chrome_trace_event_json(tmpdir) -> None:
+    obj = Obj()
+    tracer = profiling.Tracer()
+    tracer.instrument(obj, "obj", "work")
+    obj.work(1)
+    filename = str(tmpdir.join("trace.json"))
+    tracer.save(filename)
+    with open(filename) as f:
+        trace = json.load(f)
+    assert trace["traceEvents"] == tracer.trace_events
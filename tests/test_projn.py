@@ -1,6 +1,11 @@
 """Test projn.py"""
+from typing import Any
+from typing import Dict
+from typing import List
+
 from hypothesis import given
 import hypothesis.strategies as st
+import numpy as np
 import pytest
 import torch  # type: ignore
 
@@ -102,6 +107,16 @@ def test_tile_can_tile_an_iterable() -> None:
     assert pr.tile(4, xs) == [0, 1, 0, 1]
 
 
+def test_tile_mask_can_tile_a_mask() -> None:
+    actual = pr.tile_mask(5, (True, False))
+    assert actual.dtype == torch.bool
+    assert actual.tolist() == [True, False, True, False, True]
+
+
+def test_tile_mask_truncates_masks_that_are_too_long() -> None:
+    assert pr.tile_mask(2, (True, False, True)).tolist() == [True, False]
+
+
 def test_expand_layer_mask_full_has_the_correct_connectivity_pattern() -> None:
     pre_mask = [True, False, True, True]
     post_mask = [True, True, True, False]
@@ -158,6 +173,60 @@ def test_sparsify_can_make_a_matrix_sparse() -> None:
     assert sparse.shape == original.shape
 
 
+def test_sparsify_only_keeps_true_values() -> None:
+    original = torch.rand(20, 20) > 0.5
+    sparse, _ = pr.sparsify(0.5, original)
+    assert not (sparse & ~original).any()
+
+
+@given(st.sampled_from([0.0, 1.0]))
+def test_sparsify_handles_the_extreme_sparsities(sparsity) -> None:
+    original = torch.ByteTensor([0, 1, 1, 0, 1])
+    sparse, num_nonzero = pr.sparsify(sparsity, original)
+    assert num_nonzero == 3 * sparsity
+    assert sparse.sum() == num_nonzero
+
+
+@given(
+    chunk_size=st.integers(min_value=1, max_value=50),
+    num_threads=st.integers(min_value=1, max_value=4))
+def test_fill_masked_only_fills_the_masked_elements(chunk_size,
+                                                    num_threads) -> None:
+    tensor = torch.Tensor(7, 5)
+    mask = torch.rand(7, 5) > 0.5
+    pr.fill_masked(tensor, mask, rn.Scalar(3), chunk_size, num_threads)
+    assert (tensor[mask] == 3).all()
+    assert (tensor[~mask] == 0).all()
+
+
+def test_projn_can_initialize_weights_in_chunks_with_threads() -> None:
+    pre = lr.Layer("lr1", size=10)
+    post = lr.Layer("lr2", size=10)
+    spec = sp.ProjnSpec(
+        dist=rn.Uniform(0.2, 0.4),
+        sparsity=0.5,
+        init_chunk_size=15,
+        init_threads=3)
+    projn = pr.Projn("proj", pre, post, spec)
+    assert ((projn.wts[projn.mask] >= 0.2) &
+            (projn.wts[projn.mask] <= 0.4)).all()
+    assert (projn.wts[~projn.mask] == 0).all()
+
+
+def test_seeded_projn_weights_do_not_depend_on_the_thread_count() -> None:
+    pre = lr.Layer("lr1", size=10)
+    post = lr.Layer("lr2", size=10)
+    wts = []
+    for num_threads in (1, 4):
+        spec = sp.ProjnSpec(
+            dist=rn.Uniform(0, 1),
+            sparsity=0.5,
+            init_chunk_size=10,
+            init_threads=num_threads)
+        wts.append(pr.Projn("proj", pre, post, spec, seed=7).wts)
+    assert (wts[0] == wts[1]).all()
+
+
 def test_projn_post_mask_tiles_if_it_is_too_short() -> None:
     pre = lr.Layer("lr1", size=2)
     post = lr.Layer("lr2", size=4)
@@ -263,6 +332,10 @@ def test_projn_can_handle_learn_events(mocker) -> None:
     projn.learn.assert_called_once()
 
 
+def as_lists(observation: Dict[str, Any]) -> Dict[str, List[Any]]:
+    return {key: value.tolist() for key, value in observation.items()}
+
+
 def test_you_can_log_projection_weights() -> None:
     pre = lr.Layer("lr1", size=2)
     post = lr.Layer("lr2", size=2)
@@ -272,7 +345,7 @@ def test_you_can_log_projection_weights() -> None:
         post,
         spec=sp.ProjnSpec(projn_type="one_to_one", dist=rn.Scalar(0.5)))
     expected = {"pre_unit": [0, 1], "post_unit": [0, 1], "conn_wt": [0.5, 0.5]}
-    assert projn.observe_parts_attr("conn_wt") == expected
+    assert as_lists(projn.observe_parts_attr("conn_wt")) == expected
 
 
 def test_you_can_log_projection_fast_weights() -> None:
@@ -288,7 +361,62 @@ def test_you_can_log_projection_fast_weights() -> None:
         "post_unit": [0, 1],
         "conn_fwt": [0.5, 0.5]
     }
-    assert projn.observe_parts_attr("conn_fwt") == expected
+    assert as_lists(projn.observe_parts_attr("conn_fwt")) == expected
+
+
+def test_projn_observations_reuse_the_cached_connection_index() -> None:
+    pre = lr.Layer("lr1", size=3)
+    post = lr.Layer("lr2", size=2)
+    projn = pr.Projn("proj", pre, post, spec=sp.ProjnSpec(sparsity=0.5))
+    assert projn.memory_usage()["conn_cache"] == 0
+    first = projn.observe_parts_attr("conn_wt")
+    with pytest.raises(ValueError):
+        first["pre_unit"][0] = 99
+    projn.wts += 0.25
+    second = projn.observe_parts_attr("conn_wt")
+    assert second["pre_unit"] is first["pre_unit"]
+    num_conns = len(first["pre_unit"])
+    assert projn.memory_usage()["conn_cache"] == num_conns * (8 + 8)
+    indices = torch.nonzero(projn.mask)
+    assert second["pre_unit"].tolist() == indices[:, 1].tolist()
+    assert second["post_unit"].tolist() == indices[:, 0].tolist()
+    assert np.array_equal(second["conn_wt"], first["conn_wt"] + 0.25)
+
+
+def test_projn_can_observe_dense_weight_snapshots() -> None:
+    pre = lr.Layer("lr1", size=2)
+    post = lr.Layer("lr2", size=2)
+    projn = pr.Projn(
+        "proj",
+        pre,
+        post,
+        spec=sp.ProjnSpec(
+            projn_type="one_to_one",
+            dist=rn.Scalar(0.5),
+            conn_log_format="dense"))
+    observation = projn.observe_parts_attr("conn_wt")
+    assert list(observation) == ["conn_wt"]
+    assert np.allclose(
+        observation["conn_wt"][0], [[0.5, np.nan], [np.nan, 0.5]],
+        equal_nan=True)
+
+
+def test_projn_can_build_observations_from_tensors() -> None:
+    pre = lr.Layer("lr1", size=2)
+    post = lr.Layer("lr2", size=2)
+    spec = sp.ProjnSpec(projn_type="one_to_one")
+    projn = pr.Projn("proj", pre, post, spec=spec)
+    values = torch.Tensor([0.25, 0.75])
+    assert as_lists(projn.parts_obs_from_tensor("conn_wt", values)) == {
+        "pre_unit": [0, 1],
+        "post_unit": [0, 1],
+        "conn_wt": [0.25, 0.75]
+    }
+    spec.conn_log_format = "dense"
+    dense = projn.parts_obs_from_tensor("conn_fwt", values)["conn_fwt"][0]
+    assert np.allclose(dense, [[0.25, np.nan], [np.nan, 0.75]], equal_nan=True)
+    with pytest.raises(ValueError):
+        projn.parts_obs_from_tensor("whales", values)
 
 
 def test_observing_invalid_parts_attr_raises_value_error() -> None:
@@ -297,3 +425,12 @@ def test_observing_invalid_parts_attr_raises_value_error() -> None:
     projn = pr.Projn("proj", pre, post)
     with pytest.raises(ValueError):
         projn.observe_parts_attr("whales")
+
+
+def test_projn_fast_weights_use_no_memory_until_learning() -> None:
+    pre = lr.Layer("lr1", size=2)
+    post = lr.Layer("lr2", size=3)
+    projn = pr.Projn("proj", pre, post)
+    assert projn.memory_usage()["fwts"] == 0
+    projn.learn()
+    assert projn.memory_usage()["fwts"] == 2 * 3 * 4
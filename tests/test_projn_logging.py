@@ -1,6 +1,7 @@
 """Integration tests projection logging."""
 from typing import Iterable
 
+import numpy as np
 import pandas as pd
 
 import leabra7 as lb
@@ -37,3 +38,43 @@ def test_you_can_log_projection_weights() -> None:
     })
 
     pd.util.testing.assert_frame_equal(part_logs, expected, check_like=True)
+
+
+def test_you_can_log_dense_projection_weight_snapshots() -> None:
+    network = lb.Net()
+    network.new_layer("input", size=2)
+    network.new_layer("output", size=3)
+    projn_spec = lb.ProjnSpec(
+        log_on_trial=["conn_wt"], conn_log_format="dense")
+    network.new_projn(
+        "input_to_output", pre="input", post="output", spec=projn_spec)
+
+    trial(network, (1, 0), (0, 1))
+    network.learn()
+    trial(network, (1, 0), (0, 1))
+
+    _, part_logs = network.logs(freq="trial", name="input_to_output")
+
+    assert list(part_logs["time"]) == [0, 1]
+    assert part_logs["conn_wt"][0].shape == (3, 2)
+    assert not np.allclose(part_logs["conn_wt"][0], part_logs["conn_wt"][1])
+
+
+def test_delta_compressed_weight_logs_match_full_logs() -> None:
+    logs = []
+    for interval in (1, 5):
+        network = lb.Net(seed=0)
+        network.new_layer("input", size=4)
+        network.new_layer("output", size=4)
+        projn_spec = lb.ProjnSpec(
+            log_on_trial=["conn_wt"],
+            dist=lb.Uniform(0.2, 0.8),
+            log_keyframe_interval=interval)
+        network.new_projn(
+            "input_to_output", pre="input", post="output", spec=projn_spec)
+        for _ in range(7):
+            trial(network, (1, 0), (0, 1))
+            network.learn()
+        logs.append(network.logs(freq="trial", name="input_to_output").parts)
+
+    pd.util.testing.assert_frame_equal(logs[0], logs[1], check_like=True)
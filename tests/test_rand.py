@@ -56,3 +56,26 @@ def test_exponential_can_be_used() -> None:
     dist = rn.Exponential(3)
     x = torch.Tensor(10)
     dist.fill(x)
+
+
+def test_derived_seeds_are_deterministic() -> None:
+    assert rn.derive_seed(1, "proj") == rn.derive_seed(1, "proj")
+
+
+def test_derived_seeds_depend_on_the_seed_and_the_name() -> None:
+    assert rn.derive_seed(1, "proj") != rn.derive_seed(2, "proj")
+    assert rn.derive_seed(1, "proj") != rn.derive_seed(1, "proj2")
+
+
+@pytest.mark.parametrize("dist", [
+    rn.Uniform(0, 1),
+    rn.Gaussian(0, 1),
+    rn.LogNormal(0, 1),
+    rn.Exponential(1)
+])
+def test_distributions_can_draw_from_a_seeded_generator(dist) -> None:
+    x = torch.Tensor(10)
+    y = torch.Tensor(10)
+    dist.fill(x, rn.generator(3))
+    dist.fill(y, rn.generator(3))
+    assert (x == y).all()
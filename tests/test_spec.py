@@ -2,6 +2,7 @@
 from hypothesis import example
 from hypothesis import given
 import hypothesis.strategies as st
+import numpy as np
 import pytest
 
 from leabra7 import events as ev
@@ -36,6 +37,40 @@ def test_spec_supports_equality_comparison() -> None:
     assert a != b
 
 
+def test_spec_can_list_its_parameter_values() -> None:
+    values = sp.LayerSpec(gi=2.0).param_values()
+    assert values["gi"] == 2.0
+    assert values["unit_spec.spk_thr"] == sp.UnitSpec().spk_thr
+    assert values["log_on_trial"] == repr(sp.LayerSpec().log_on_trial)
+    assert sp.ProjnSpec().param_values()["dist"] == "Scalar(value=0.5)"
+
+
+def test_spec_param_values_see_reassigned_parameters() -> None:
+    spec = sp.LayerSpec(gi=2.0, unit_spec=sp.UnitSpec())
+    first = spec.param_values()
+    spec.gi = 3.0
+    spec.unit_spec.spk_thr = 0.7
+    values = spec.param_values()
+    assert values["gi"] == 3.0
+    assert values["unit_spec.spk_thr"] == 0.7
+    assert first["gi"] == 2.0
+
+
+def test_spec_param_values_are_memoized() -> None:
+    spec = sp.LayerSpec()
+    spec.param_values()
+    memo = spec.__dict__[sp.Spec._PARAM_VALUES_MEMO]
+    spec.param_values()["gi"] = 100.0
+    assert spec.__dict__[sp.Spec._PARAM_VALUES_MEMO] is memo
+    assert spec.param_values()["gi"] == sp.LayerSpec().gi
+
+
+def test_spec_equality_ignores_the_param_values_memo() -> None:
+    a = sp.LayerSpec()
+    a.param_values()
+    assert a == sp.LayerSpec()
+
+
 def test_spec_can_check_if_an_attribute_is_in_range() -> None:
     a = Foo()
     a.assert_in_range("a", low=0, high=4)
@@ -199,6 +234,38 @@ def test_it_should_validate_l_up_inc(f) -> None:
         sp.UnitSpec(l_up_inc=f).validate()
 
 
+@given(float_outside_range(0, float("Inf")))
+def test_it_should_validate_xx1_gain(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.UnitSpec(xx1_gain=f).validate()
+
+
+@given(float_outside_range(1e-3, float("Inf")))
+def test_it_should_validate_nxx1_std(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.UnitSpec(nxx1_std=f).validate()
+
+
+@given(float_outside_range(0, 0.04))
+@example(0)
+def test_it_should_validate_nxx1_res(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.UnitSpec(nxx1_std=0.01, nxx1_res=f).validate()
+
+
+@given(float_outside_range(0, float("Inf")))
+@example(0)
+def test_it_should_validate_integ_tol(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.UnitSpec(integ_tol=f).validate()
+
+
+@given(float_outside_range(1, float("Inf")))
+def test_it_should_validate_integ_max_scale(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.UnitSpec(integ_max_scale=f).validate()
+
+
 # Test LayerSpec validation
 @given(st.text())
 @example("kwta")
@@ -255,6 +322,11 @@ def test_it_should_validate_global_inhibition_multiplier(f) -> None:
         sp.LayerSpec(gi=f).validate()
 
 
+def test_it_should_validate_the_error_tolerance() -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.LayerSpec(err_tol=-0.1).validate()
+
+
 def test_it_should_validate_the_unit_spec() -> None:
     with pytest.raises(sp.ValidationError):
         sp.LayerSpec(unit_spec=sp.UnitSpec(vm_dt=-1)).validate()
@@ -293,6 +365,24 @@ def test_it_should_check_for_invalid_clamp_max(f) -> None:
         sp.LayerSpec(clamp_max=f).validate()
 
 
+@given(float_outside_range(1, float("Inf")))
+def test_it_should_check_for_invalid_pattern_cache_size(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.LayerSpec(pattern_cache_size=f).validate()
+
+
+def test_log_units_can_be_numpy_indices_or_masks() -> None:
+    for log_units in (np.array([3, 1]), np.array([True, False]),
+                      [np.int64(2)], [np.bool_(True)], []):
+        sp.LayerSpec(log_units=log_units).validate()
+
+
+def test_it_should_check_for_invalid_log_units() -> None:
+    for log_units in ([-1], [0.5], ["whales"]):
+        with pytest.raises(sp.ValidationError):
+            sp.LayerSpec(log_units=log_units).validate()
+
+
 # Test ProjnSpec validation
 @given(float_outside_range(0, float("Inf")))
 def test_projn_spec_validates_integ(f) -> None:
@@ -358,6 +448,89 @@ def test_projn_spec_validates_thr_l_mix(f) -> None:
         sp.ProjnSpec(thr_l_mix=f).validate()
 
 
+@given(float_outside_range(1, float("Inf")))
+def test_projn_spec_validates_init_chunk_size(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.ProjnSpec(init_chunk_size=f).validate()
+
+
+@given(float_outside_range(1, float("Inf")))
+def test_projn_spec_validates_init_threads(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.ProjnSpec(init_threads=f).validate()
+
+
+def test_projn_spec_init_chunk_size_must_be_an_integer() -> None:
+    for value in (1.5, 2.0, True):
+        with pytest.raises(sp.ValidationError):
+            sp.ProjnSpec(init_chunk_size=value).validate()
+
+
+def test_projn_spec_init_threads_must_be_an_integer() -> None:
+    for value in (1.5, 2.0, True):
+        with pytest.raises(sp.ValidationError):
+            sp.ProjnSpec(init_threads=value).validate()
+
+
+def test_projn_spec_validates_conn_log_format() -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.ProjnSpec(conn_log_format="whales").validate()
+
+
+def test_projn_spec_cannot_delta_compress_dense_conn_logs() -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.ProjnSpec(
+            conn_log_format="dense", log_keyframe_interval=10).validate()
+
+
+@given(float_outside_range(1, float("Inf")))
+def test_observable_spec_validates_log_keyframe_interval(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.ProjnSpec(log_keyframe_interval=f).validate()
+
+
+@given(float_outside_range(0, float("Inf")))
+def test_observable_spec_validates_log_delta_tol(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.LayerSpec(log_delta_tol=f).validate()
+
+
+@given(float_outside_range(0, float("Inf")))
+def test_observable_spec_validates_log_ring_size(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.LayerSpec(log_ring_size=f).validate()
+
+
+def test_observable_spec_cannot_delta_compress_ring_buffer_logs() -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.LayerSpec(log_ring_size=10, log_keyframe_interval=10).validate()
+
+
+def test_observable_spec_validates_custom_frequencies() -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.LayerSpec(log_on_custom={"whales": ("avg_act", )}).validate()
+    with pytest.raises(sp.ValidationError):
+        sp.LayerSpec(log_on_custom={"cycle": ("avg_act", )}).validate()
+    freq = ev.Frequency("cycle_10", ev.Cycle, stride=10)
+    try:
+        sp.LayerSpec(log_on_custom={"cycle_10": ("avg_act", )}).validate()
+        with pytest.raises(sp.ValidationError):
+            sp.LayerSpec(log_on_custom={"cycle_10": ("whales", )}).validate()
+        assert sp.LayerSpec().attrs_to_log(freq) == ()
+    finally:
+        ev.Frequency.unregister("cycle_10")
+
+
+def test_observable_specs_do_not_share_custom_frequencies() -> None:
+    log_on_custom = {"cycle_10": ("avg_act", )}
+    spec = sp.LayerSpec(log_on_custom=log_on_custom)
+    spec.log_on_custom["trial_10"] = ("avg_act", )
+    assert log_on_custom == {"cycle_10": ("avg_act", )}
+    assert sp.LayerSpec().log_on_custom == {}
+    with pytest.raises(TypeError):
+        sp.ObservableSpec.log_on_custom["cycle_10"] = ("avg_act", )
+
+
 def test_projn_spec_validates_attrs_to_log() -> None:
     with pytest.raises(sp.ValidationError):
         sp.ProjnSpec(log_on_cycle=("whales", )).validate()
@@ -373,3 +546,34 @@ def test_attrs_to_log_gets_the_attrs_to_log_by_frequency() -> None:
     assert spec.attrs_to_log(ev.TrialFreq) == ("unit_v_m", )
     assert spec.attrs_to_log(ev.EpochFreq) == ("unit_spike", )
     assert spec.attrs_to_log(ev.BatchFreq) == ("unit_i_net", )
+
+
+@given(float_outside_range(1, float("Inf")))
+def test_epoch_spec_validates_minus_cycles(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.EpochSpec(minus_cycles=f).validate()
+
+
+@given(float_outside_range(1, float("Inf")))
+def test_epoch_spec_validates_plus_cycles(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.EpochSpec(plus_cycles=f).validate()
+
+
+@given(float_outside_range(1, float("Inf")))
+def test_epoch_spec_validates_prefetch(f) -> None:
+    with pytest.raises(sp.ValidationError):
+        sp.EpochSpec(prefetch=f).validate()
+
+
+def test_epoch_spec_cycles_must_be_integers() -> None:
+    for attr in ("minus_cycles", "plus_cycles", "prefetch"):
+        with pytest.raises(sp.ValidationError):
+            sp.EpochSpec(**{attr: 2.0}).validate()
+
+
+def test_epoch_spec_validates_start() -> None:
+    for start in (None, "reset", "nearest"):
+        sp.EpochSpec(start=start).validate()
+    with pytest.raises(sp.ValidationError):
+        sp.EpochSpec(start="whales").validate()
@@ -0,0 +1,98 @@
+"""Test store.py"""
+import pytest
+
+from leabra7 import net
+from leabra7 import specs
+from leabra7 import store
+
+
+def make_net(gi: float) -> net.Net:
+    n = net.Net(seed=0)
+    n.new_layer("input", 2)
+    n.new_layer(
+        "output",
+        2,
+        spec=specs.LayerSpec(gi=gi, log_on_trial=("sse", ),
+                             log_on_epoch=("avg_act", "err")))
+    n.new_projn("projn1", "input", "output")
+    return n
+
+
+def test_topology_hash_ignores_the_specs() -> None:
+    assert store.topology_hash(make_net(1.0)) == store.topology_hash(
+        make_net(2.0))
+    n = make_net(1.0)
+    n.new_layer("hidden", 2)
+    assert store.topology_hash(n) != store.topology_hash(make_net(1.0))
+
+
+def test_store_records_the_spec_values_of_runs(tmpdir) -> None:
+    with store.ExperimentStore(str(tmpdir.join("runs.db"))) as db:
+        run_id = db.add_run(make_net(1.5), name="a")
+        params = db.query(
+            "SELECT param, value FROM params WHERE run_id = ? AND obj = ?",
+            (run_id, "output"))
+        values = dict(zip(params["param"], params["value"]))
+        assert values["gi"] == 1.5
+        assert values["unit_spec.spk_thr"] == specs.UnitSpec().spk_thr
+        dist = db.query("SELECT value FROM params WHERE param = 'dist'")
+        assert dist["value"][0] == "Scalar(value=0.5)"
+
+
+def test_store_finds_the_final_metrics_of_runs(tmpdir) -> None:
+    filename = str(tmpdir.join("runs.db"))
+    with store.ExperimentStore(filename) as db:
+        for gi in (1.0, 2.0):
+            n = make_net(gi)
+            run_id = db.add_run(n)
+            for _ in range(3):
+                n.minus_phase_cycle(1)
+                n.plus_phase_cycle(1)
+                n.end_epoch()
+                db.log_metrics(run_id, n, "epoch")
+            db.log_metrics(run_id, n, "trial")
+            db.add_checkpoint(run_id, n, str(tmpdir.join(
+                "{0}.pkl".format(run_id))))
+
+    with store.ExperimentStore(filename) as db:
+        final = db.final_metrics("output", "err", params=["output.gi"])
+        assert list(final["output.gi"]) == [1.0, 2.0]
+        assert list(final["time"]) == [2, 2]
+        trials = db.query("SELECT COUNT(*) AS n FROM metrics WHERE freq = ?",
+                          ("trial", ))
+        assert trials["n"][0] == 6
+        assert db.checkpoints(1) == [(3, str(tmpdir.join("1.pkl")))]
+        m = net.Net()
+        m.load(db.checkpoints(2)[0][1])
+        assert m.clock.counts["epoch"] == 3
+
+
+def test_store_only_reads_the_new_metrics(tmpdir) -> None:
+    with store.ExperimentStore(str(tmpdir.join("runs.db"))) as db:
+        n = make_net(1.0)
+        run_id = db.add_run(n)
+        for num_values in (2, 2, 0):
+            if num_values > 0:
+                n.minus_phase_cycle(1)
+                n.plus_phase_cycle(1)
+                n.end_epoch()
+            assert db.log_metrics(run_id, n, "epoch") == num_values
+        final = db.final_metrics("output", "avg_act")
+        assert list(final["time"]) == [1]
+
+
+def test_store_quotes_parameter_names(tmpdir) -> None:
+    with store.ExperimentStore(str(tmpdir.join("runs.db"))) as db:
+        n = net.Net()
+        n.new_layer('out"put', 2, spec=specs.LayerSpec(log_on_epoch=("err", )))
+        run_id = db.add_run(n)
+        n.end_epoch()
+        db.log_metrics(run_id, n)
+        final = db.final_metrics('out"put', "err", params=['out"put.gi'])
+        assert list(final['out"put.gi']) == [specs.LayerSpec().gi]
+
+
+def test_store_checks_the_parameter_names(tmpdir) -> None:
+    with store.ExperimentStore(str(tmpdir.join("runs.db"))) as db:
+        with pytest.raises(ValueError):
+            db.final_metrics("output", "err", params=["gi"])
@@ -72,6 +72,21 @@ def test_nxx1_equals_the_max_value_outside_the_max_bound(nxx1_table) -> None:
     assert unit.nxx1(xs[-1] + 1) == conv[-1]
 
 
+def test_nxx1_interpolators_are_memoized_by_their_parameters() -> None:
+    a = un.nxx1_interpolator(40, 0.01, 0.001)
+    assert un.nxx1_interpolator(40, 0.01, 0.001) is a
+    assert un.nxx1_interpolator(80, 0.01, 0.001) is not a
+
+
+def test_nxx1_uses_the_table_parameters_in_the_unit_spec() -> None:
+    default = un.UnitGroup(size=1)
+    steep = un.UnitGroup(size=1, spec=sp.UnitSpec(xx1_gain=80))
+    noisy = un.UnitGroup(size=1, spec=sp.UnitSpec(nxx1_std=0.05))
+    xs = torch.Tensor([0.01])
+    assert float(steep.nxx1(xs)) > float(default.nxx1(xs))
+    assert float(noisy.nxx1(xs)) != float(default.nxx1(xs))
+
+
 @given(
     vals=st.lists(
         elements=st.floats(min_value=0.0, max_value=1.0),
@@ -158,3 +173,72 @@ def test_unitgroup_can_return_the_top_k_net_input_values() -> None:
     group = un.UnitGroup(size=10)
     group.net = torch.Tensor([9, 8, 7, 6, 5, 4, 3, 2, 1, 0])
     assert (group.top_k_net_indices(3) == torch.Tensor([0, 1, 2]).long()).all()
+
+
+def test_unitgroup_can_save_and_load_its_state() -> None:
+    group = un.UnitGroup(size=3)
+    group.add_input(torch.Tensor([0.5, 0.3, 0.1]))
+    group.update_net()
+    group.update_membrane_potential()
+    group.update_activation()
+    state = group.save_state()
+    expected = {attr: getattr(group, attr).clone() for attr in state}
+    for _ in range(3):
+        group.update_membrane_potential()
+        group.update_activation()
+    group.load_state(state)
+    for attr, tensor in expected.items():
+        assert torch.equal(getattr(group, attr), tensor)
+    group.v_m += 1
+    assert torch.equal(state["v_m"], expected["v_m"])
+
+
+def test_unitgroup_can_reset_its_activation_state() -> None:
+    group = un.UnitGroup(size=3)
+    group.add_input(torch.Tensor([0.5, 0.3, 0.1]))
+    group.update_net()
+    group.update_membrane_potential()
+    group.update_activation()
+    group.avg_l.fill_(0.3)
+    group.reset_state()
+    for attr in group.activation_attrs:
+        assert (getattr(group, attr) == 0).all()
+    assert (group.avg_l == 0.3).all()
+
+
+def test_unitgroup_caps_the_adaptive_integration_rate() -> None:
+    group = un.UnitGroup(size=3, spec=sp.UnitSpec(integ=0.5))
+    group.integ_scale = 4.0
+    assert group._integ_rate(0.5) == 0.25
+    group.spec.adaptive_integ = True
+    assert group._integ_rate(0.1) == 0.2
+    assert group._integ_rate(0.5) == 1.0
+
+
+def test_unitgroup_adapts_its_integration_time_scale() -> None:
+    group = un.UnitGroup(
+        size=3,
+        spec=sp.UnitSpec(
+            adaptive_integ=True, integ_tol=0.01, integ_max_scale=4))
+    group.integ_scale = 2.0
+    group.change = 0.02
+    assert group.next_integ_scale() == 1.0
+    group.change = 0.001
+    assert group.next_integ_scale() == 2.0
+    group.num_slow_cycles = 2
+    assert group.next_integ_scale() == 4.0
+    group.integ_scale = 4.0
+    assert group.next_integ_scale() == 4.0
+    group.reset_integ_scale()
+    assert group.integ_scale == 1.0
+    assert group.num_slow_cycles == 0
+
+
+def test_unitgroup_tracks_how_fast_it_changes() -> None:
+    group = un.UnitGroup(size=3, spec=sp.UnitSpec(adaptive_integ=True))
+    group.add_input(torch.Tensor([0.5, 0.3, 0.1]))
+    group.update_net()
+    group.update_membrane_potential()
+    group.update_activation()
+    assert group.change > group.spec.integ_tol
+    assert group.num_slow_cycles == 0
@@ -1,4 +1,10 @@
 """Test utils.py"""
+import math
+
+import numpy as np
+import pytest
+import torch  # type: ignore
+
 from leabra7 import utils as ut
 
 
@@ -16,3 +22,14 @@ def test_clip_float_returns_the_upper_bound_if_x_is_above_it() -> None:
 
 def test_clip_iterable_clips_iterables_to_range() -> None:
     assert ut.clip_iterable(low=0.0, high=0.5, xs=[0, 1, 0]) == [0, 0.5, 0]
+
+
+def test_as_acts_tensor_converts_sequences_and_arrays() -> None:
+    for acts in ([0, 1], np.array([[0.0], [1.0]])):
+        assert torch.equal(ut.as_acts_tensor(acts), torch.Tensor([0, 1]))
+
+
+def test_as_acts_tensor_checks_the_range_of_the_acts() -> None:
+    for acts in ([0, 2], [-1], [math.nan]):
+        with pytest.raises(ValueError):
+            ut.as_acts_tensor(acts)